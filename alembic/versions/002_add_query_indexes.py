@@ -0,0 +1,54 @@
+"""Add indexes for order, analytics and catalog queries
+
+Revision ID: 002
+Revises: 001
+Create Date: 2026-10-17 00:00:00.000000
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+# revision identifiers, used by Alembic.
+revision = '002'
+down_revision = '001'
+branch_labels = None
+depends_on = None
+
+# name, table, columns, partial index condition
+INDEXES = [
+    ('ix_orders_user_id_created_at', 'orders', ['user_id', 'created_at', 'id'], None),
+    ('ix_orders_created_at_id', 'orders', ['created_at', 'id'], None),
+    ('ix_orders_status_created_at', 'orders', ['status', 'created_at', 'id'], None),
+    ('ix_orders_paid_created_at', 'orders', ['created_at'], "payment_status = 'SUCCEEDED'"),
+    ('ix_orders_payment_id', 'orders', ['payment_id'], 'payment_id IS NOT NULL'),
+    ('ix_order_items_order_id', 'order_items', ['order_id'], None),
+    ('ix_order_items_product_id', 'order_items', ['product_id'], None),
+    ('ix_product_media_product_id', 'product_media', ['product_id'], None),
+    ('ix_products_listing', 'products', ['is_archived', 'is_active', 'id'], None),
+]
+
+
+def upgrade() -> None:
+    # CREATE INDEX CONCURRENTLY does not block writes but cannot run in a transaction
+    with op.get_context().autocommit_block():
+        for name, table, columns, where in INDEXES:
+            op.create_index(
+                name,
+                table,
+                columns,
+                unique=False,
+                if_not_exists=True,
+                postgresql_concurrently=True,
+                postgresql_where=sa.text(where) if where else None
+            )
+
+
+def downgrade() -> None:
+    with op.get_context().autocommit_block():
+        for name, table, columns, where in reversed(INDEXES):
+            op.drop_index(
+                name,
+                table_name=table,
+                if_exists=True,
+                postgresql_concurrently=True
+            )
@@ -0,0 +1,78 @@
+"""Add daily analytics rollup tables
+
+Revision ID: 003
+Revises: 002
+Create Date: 2026-10-17 00:00:00.000000
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+# revision identifiers, used by Alembic.
+revision = '003'
+down_revision = '002'
+branch_labels = None
+depends_on = None
+
+# Indexes the rollup refresh uses to find changed rows
+INDEXES = [
+    ('ix_orders_updated_at', 'orders', ['updated_at']),
+    ('ix_users_updated_at', 'users', ['updated_at']),
+]
+
+
+def upgrade() -> None:
+    # Create daily_order_stats table
+    op.create_table(
+        'daily_order_stats',
+        sa.Column('day', sa.Date(), nullable=False),
+        sa.Column('revenue', sa.Float(), nullable=False),
+        sa.Column('paid_orders', sa.Integer(), nullable=False),
+        sa.Column('products_sold', sa.Integer(), nullable=False),
+        sa.Column('orders_with_promo', sa.Integer(), nullable=False),
+        sa.Column('orders_without_promo', sa.Integer(), nullable=False),
+        sa.Column('discount_total', sa.Float(), nullable=False),
+        sa.Column('preorders', sa.Integer(), nullable=False),
+        sa.Column('new_customers', sa.Integer(), nullable=False),
+        sa.Column('new_buyers', sa.Integer(), nullable=False),
+        sa.Column('refreshed_at', sa.DateTime(), nullable=False),
+        sa.PrimaryKeyConstraint('day')
+    )
+
+    # Create daily_preorder_stats table
+    op.create_table(
+        'daily_preorder_stats',
+        sa.Column('id', sa.Integer(), nullable=False),
+        sa.Column('day', sa.Date(), nullable=False),
+        sa.Column('wave', sa.Integer(), nullable=False),  # 0 for items without a wave
+        sa.Column('preorders', sa.Integer(), nullable=False),
+        sa.PrimaryKeyConstraint('id')
+    )
+    op.create_index('ix_daily_preorder_stats_day_wave', 'daily_preorder_stats', ['day', 'wave'], unique=True)
+
+    # CREATE INDEX CONCURRENTLY does not block writes but cannot run in a transaction
+    with op.get_context().autocommit_block():
+        for name, table, columns in INDEXES:
+            op.create_index(
+                name,
+                table,
+                columns,
+                unique=False,
+                if_not_exists=True,
+                postgresql_concurrently=True
+            )
+
+
+def downgrade() -> None:
+    with op.get_context().autocommit_block():
+        for name, table, columns in reversed(INDEXES):
+            op.drop_index(
+                name,
+                table_name=table,
+                if_exists=True,
+                postgresql_concurrently=True
+            )
+
+    op.drop_index('ix_daily_preorder_stats_day_wave', table_name='daily_preorder_stats')
+    op.drop_table('daily_preorder_stats')
+    op.drop_table('daily_order_stats')
@@ -0,0 +1,49 @@
+"""Add product search indexes
+
+Revision ID: 004
+Revises: 003
+Create Date: 2026-10-17 00:00:00.000000
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+# revision identifiers, used by Alembic.
+revision = '004'
+down_revision = '003'
+branch_labels = None
+depends_on = None
+
+# name, index method, expressions; must match the indexes of app/models/product.py
+INDEXES = [
+    (
+        'ix_products_search_document',
+        'gin',
+        "to_tsvector('russian'::regconfig, coalesce(name, '') || ' ' || coalesce(description, ''))"
+    ),
+    ('ix_products_article_trgm', 'gin', 'article gin_trgm_ops'),
+    ('ix_products_sizes', 'gin', 'CAST(sizes AS JSONB) jsonb_path_ops'),
+    ('ix_products_price', 'btree', 'price'),
+]
+
+
+def upgrade() -> None:
+    op.execute('CREATE EXTENSION IF NOT EXISTS pg_trgm')
+
+    # CREATE INDEX CONCURRENTLY does not block writes but cannot run in a transaction
+    with op.get_context().autocommit_block():
+        for name, method, expressions in INDEXES:
+            op.execute(sa.text(
+                f'CREATE INDEX CONCURRENTLY IF NOT EXISTS {name} ON products USING {method} ({expressions})'
+            ))
+
+
+def downgrade() -> None:
+    with op.get_context().autocommit_block():
+        for name, method, expressions in reversed(INDEXES):
+            op.drop_index(
+                name,
+                table_name='products',
+                if_exists=True,
+                postgresql_concurrently=True
+            )
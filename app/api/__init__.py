@@ -1,5 +1,5 @@
 from fastapi import APIRouter
-from app.api.endpoints import auth, users, products, orders, promo_codes, pages, analytics, payment
+from app.api.endpoints import auth, users, products, orders, promo_codes, pages, analytics, payment, metrics
 
 api_router = APIRouter()
 
@@ -12,3 +12,4 @@ api_router.include_router(promo_codes.router, prefix="/promo-codes", tags=["Prom
 api_router.include_router(pages.router, prefix="/pages", tags=["Pages"])
 api_router.include_router(analytics.router, prefix="/analytics", tags=["Analytics"])
 api_router.include_router(payment.router, prefix="/payment", tags=["Payment"])
+api_router.include_router(metrics.router, prefix="/metrics", tags=["Metrics"])
@@ -1,75 +1,99 @@
-from fastapi import APIRouter, Depends, Query
-from sqlalchemy.orm import Session
-from sqlalchemy import func, and_
+from fastapi import APIRouter, Depends, Query, Request
+from sqlalchemy.ext.asyncio import AsyncSession
+from sqlalchemy import select
 from datetime import datetime, timedelta
 from typing import Optional
-import csv
-import io
 
 from fastapi.responses import StreamingResponse
 
-from app.core.database import get_db
+from app.core.database import get_read_db
 from app.core.security import get_current_admin
-from app.models.order import Order, OrderItem, OrderStatus, PaymentStatus
+from app.models.order import Order, OrderItem
 from app.models.user import User
 from app.models.product import Product
+from app.utils.timeseries import GROUP_BY_PATTERN, format_period
+from app.services.rollups import rollup_service
+from app.services.analytics_cache import analytics_cache
+from app.services.cohorts import cohort_service, DEFAULT_MONTHS, MAX_MONTHS
+from app.services.product_analytics import (
+    product_analytics_service, SORT_REVENUE, SORT_PATTERN, DEFAULT_LIMIT, MAX_LIMIT
+)
+from app.services.export import (
+    export_service, accepts_gzip, MEDIA_TYPES, EXPORT_FORMAT_PATTERN,
+    FORMAT_CSV, FORMAT_CSV_GZIP
+)
 
 router = APIRouter()
 
 
+def _exclusive_end(end_date: Optional[datetime]) -> Optional[datetime]:
+    # Periods include end_date, rollup ranges are half-open
+    return end_date + timedelta(microseconds=1) if end_date else None
+
+
 @router.get("/sales")
 async def get_sales_statistics(
     start_date: Optional[datetime] = None,
     end_date: Optional[datetime] = None,
-    db: Session = Depends(get_db),
+    group_by: Optional[str] = Query(None, pattern=GROUP_BY_PATTERN),
+    db: AsyncSession = Depends(get_read_db),
     current_admin = Depends(get_current_admin)
 ):
     """
     Статистика продаж за период
     """
+    cache_key = await analytics_cache.key("sales", start_date, end_date, group_by)
+    cached = await analytics_cache.get(cache_key)
+    if cached is not None:
+        return cached
+    
     if not start_date:
         start_date = datetime.utcnow() - timedelta(days=30)
     if not end_date:
         end_date = datetime.utcnow()
     
-    # Total sales
-    total_sales = db.query(func.sum(Order.final_amount)).filter(
-        and_(
-            Order.created_at >= start_date,
-            Order.created_at <= end_date,
-            Order.payment_status == PaymentStatus.SUCCEEDED
-        )
-    ).scalar() or 0
-    
-    # Orders count
-    orders_count = db.query(func.count(Order.id)).filter(
-        and_(
-            Order.created_at >= start_date,
-            Order.created_at <= end_date,
-            Order.payment_status == PaymentStatus.SUCCEEDED
-        )
-    ).scalar() or 0
-    
-    # Average order value
-    avg_order_value = total_sales / orders_count if orders_count > 0 else 0
+    # Whole days from daily rollups, partial days from paid orders, one statement
+    parts = rollup_service.sales_parts(db.bind.dialect.name, start_date, _exclusive_end(end_date), group_by)
+    query = rollup_service.combine(
+        parts, ['total_sales', 'orders_count', 'products_sold'], 'period' if group_by else None
+    )
     
-    # Products sold
-    products_sold = db.query(func.sum(OrderItem.quantity)).join(Order).filter(
-        and_(
-            Order.created_at >= start_date,
-            Order.created_at <= end_date,
-            Order.payment_status == PaymentStatus.SUCCEEDED
+    if group_by:
+        result = await db.execute(query)
+        series = [
+            {"period": format_period(row.period), **_sales_metrics(row.total_sales, row.orders_count, row.products_sold)}
+            for row in result.all()
+        ]
+        totals = _sales_metrics(
+            sum(point["total_sales"] for point in series),
+            sum(point["orders_count"] for point in series),
+            sum(point["products_sold"] for point in series)
         )
-    ).scalar() or 0
+    else:
+        result = await db.execute(query)
+        row = result.one()
+        totals = _sales_metrics(row.total_sales, row.orders_count, row.products_sold)
     
-    return {
+    response = {
         "period": {
             "start": start_date,
             "end": end_date
         },
+        **totals
+    }
+    if group_by:
+        response["group_by"] = group_by
+        response["series"] = series
+    
+    await analytics_cache.set(cache_key, response)
+    return response
+
+
+def _sales_metrics(total_sales, orders_count: int, products_sold) -> dict:
+    return {
         "total_sales": total_sales,
         "orders_count": orders_count,
-        "average_order_value": avg_order_value,
+        "average_order_value": total_sales / orders_count if orders_count > 0 else 0,
         "products_sold": products_sold
     }
 
@@ -78,199 +102,353 @@ async def get_sales_statistics(
 async def get_preorders_statistics(
     start_date: Optional[datetime] = None,
     end_date: Optional[datetime] = None,
-    db: Session = Depends(get_db),
+    db: AsyncSession = Depends(get_read_db),
     current_admin = Depends(get_current_admin)
 ):
     """
     Статистика предзаказов за период
     """
+    cache_key = await analytics_cache.key("preorders", start_date, end_date)
+    cached = await analytics_cache.get(cache_key)
+    if cached is not None:
+        return cached
+    
     if not start_date:
         start_date = datetime.utcnow() - timedelta(days=30)
     if not end_date:
         end_date = datetime.utcnow()
     
-    # Total preorders
-    preorders_count = db.query(func.count(OrderItem.id)).join(Order).filter(
-        and_(
-            Order.created_at >= start_date,
-            Order.created_at <= end_date,
-            OrderItem.is_preorder == True
-        )
-    ).scalar() or 0
+    # Preorders by wave; the total is their sum
+    parts = rollup_service.preorder_parts(start_date, _exclusive_end(end_date))
+    result = await db.execute(rollup_service.combine(parts, ['count'], 'wave'))
+    preorders_by_wave = result.all()
     
-    # Preorders by wave
-    preorders_by_wave = db.query(
-        OrderItem.preorder_wave,
-        func.count(OrderItem.id).label('count')
-    ).join(Order).filter(
-        and_(
-            Order.created_at >= start_date,
-            Order.created_at <= end_date,
-            OrderItem.is_preorder == True
-        )
-    ).group_by(OrderItem.preorder_wave).all()
-    
-    return {
+    response = {
         "period": {
             "start": start_date,
             "end": end_date
         },
-        "total_preorders": preorders_count,
+        "total_preorders": sum(count for wave, count in preorders_by_wave),
         "preorders_by_wave": [
             {"wave": wave, "count": count}
             for wave, count in preorders_by_wave
         ]
     }
+    
+    await analytics_cache.set(cache_key, response)
+    return response
 
 
 @router.get("/customers")
 async def get_customers_statistics(
-    db: Session = Depends(get_db),
+    db: AsyncSession = Depends(get_read_db),
     current_admin = Depends(get_current_admin)
 ):
     """
     Статистика клиентов
     """
-    # Total customers
-    total_customers = db.query(func.count(User.id)).filter(User.is_admin == False).scalar() or 0
+    cache_key = await analytics_cache.key("customers")
+    cached = await analytics_cache.get(cache_key)
+    if cached is not None:
+        return cached
     
-    # Customers with orders
-    customers_with_orders = db.query(func.count(func.distinct(Order.user_id))).scalar() or 0
+    # Registered customers and customers with orders, summed over daily rollups
+    parts = rollup_service.customer_parts(db.bind.dialect.name)
+    result = await db.execute(rollup_service.combine(parts, ['total_customers', 'customers_with_orders']))
+    row = result.one()
+    total_customers = row.total_customers
+    customers_with_orders = row.customers_with_orders
     
     # Customers without orders
     customers_without_orders = total_customers - customers_with_orders
     
-    return {
+    response = {
         "total_customers": total_customers,
         "customers_with_orders": customers_with_orders,
         "customers_without_orders": customers_without_orders,
         "conversion_rate": (customers_with_orders / total_customers * 100) if total_customers > 0 else 0
     }
+    
+    await analytics_cache.set(cache_key, response)
+    return response
+
+
+@router.get("/cohorts")
+async def get_cohorts_statistics(
+    months: int = Query(DEFAULT_MONTHS, ge=1, le=MAX_MONTHS),
+    cohorts: Optional[int] = Query(None, ge=1),
+    db: AsyncSession = Depends(get_read_db),
+    current_admin = Depends(get_current_admin)
+):
+    """
+    Когорты клиентов по месяцу первой покупки: удержание, LTV, повторные покупки
+    """
+    cache_key = await analytics_cache.key("cohorts", months, cohorts)
+    cached = await analytics_cache.get(cache_key)
+    if cached is not None:
+        return cached
+    
+    response = await cohort_service.get_cohorts(db, months, cohorts)
+    
+    await analytics_cache.set(cache_key, response)
+    return response
+
+
+@router.get("/products")
+async def get_products_statistics(
+    start_date: Optional[datetime] = None,
+    end_date: Optional[datetime] = None,
+    sort_by: str = Query(SORT_REVENUE, pattern=SORT_PATTERN),
+    limit: int = Query(DEFAULT_LIMIT, ge=1, le=MAX_LIMIT),
+    db: AsyncSession = Depends(get_read_db),
+    current_admin = Depends(get_current_admin)
+):
+    """
+    Топ товаров по выручке или количеству: продажи по размерам, sell-through, заполненность волн предзаказа
+    """
+    cache_key = await analytics_cache.key("products", start_date, end_date, sort_by, limit)
+    cached = await analytics_cache.get(cache_key)
+    if cached is not None:
+        return cached
+    
+    # Grouping, product totals and ranking in one statement
+    products = await product_analytics_service.get_top_products(
+        db, start_date, _exclusive_end(end_date), sort_by, limit
+    )
+    
+    response = {
+        "period": {
+            "start": start_date,
+            "end": end_date
+        },
+        "sort_by": sort_by,
+        "products": products
+    }
+    
+    await analytics_cache.set(cache_key, response)
+    return response
 
 
 @router.get("/promo-codes")
 async def get_promo_codes_statistics(
-    db: Session = Depends(get_db),
+    start_date: Optional[datetime] = None,
+    end_date: Optional[datetime] = None,
+    group_by: Optional[str] = Query(None, pattern=GROUP_BY_PATTERN),
+    db: AsyncSession = Depends(get_read_db),
     current_admin = Depends(get_current_admin)
 ):
     """
     Статистика использования промокодов
     """
-    # Orders with promo codes
-    orders_with_promo = db.query(func.count(Order.id)).filter(
-        Order.promo_code_id.isnot(None)
-    ).scalar() or 0
+    cache_key = await analytics_cache.key("promo-codes", start_date, end_date, group_by)
+    cached = await analytics_cache.get(cache_key)
+    if cached is not None:
+        return cached
     
-    # Orders without promo codes
-    orders_without_promo = db.query(func.count(Order.id)).filter(
-        Order.promo_code_id.is_(None)
-    ).scalar() or 0
+    # Orders with and without promo codes and total discount in one statement
+    parts = rollup_service.promo_code_parts(db.bind.dialect.name, start_date, _exclusive_end(end_date), group_by)
+    query = rollup_service.combine(
+        parts, ['orders_with_promo', 'orders_without_promo', 'total_discount_given'], 'period' if group_by else None
+    )
     
-    # Total discount given
-    total_discount = db.query(func.sum(Order.discount_amount)).scalar() or 0
+    if group_by:
+        result = await db.execute(query)
+        series = [
+            {"period": format_period(row.period), **_promo_code_metrics(row)}
+            for row in result.all()
+        ]
+        response = {
+            "orders_with_promo": sum(point["orders_with_promo"] for point in series),
+            "orders_without_promo": sum(point["orders_without_promo"] for point in series),
+            "total_discount_given": sum(point["total_discount_given"] for point in series),
+            "group_by": group_by,
+            "series": series
+        }
+    else:
+        result = await db.execute(query)
+        response = _promo_code_metrics(result.one())
     
+    await analytics_cache.set(cache_key, response)
+    return response
+
+
+def _promo_code_metrics(row) -> dict:
     return {
-        "orders_with_promo": orders_with_promo,
-        "orders_without_promo": orders_without_promo,
-        "total_discount_given": total_discount
+        "orders_with_promo": row.orders_with_promo,
+        "orders_without_promo": row.orders_without_promo,
+        "total_discount_given": row.total_discount_given
     }
 
 
+CUSTOMERS_CSV_HEADER = [
+    'ID', 'Телефон', 'ФИО', 'Email', 'Telegram', 'VK',
+    'Адрес', 'Пункт СДЭК', 'Дата регистрации'
+]
+
+ORDERS_CSV_HEADER = [
+    'Номер заказа', 'Клиент', 'Сумма', 'Скидка', 'Итого',
+    'Статус', 'Статус оплаты', 'Трек-номер', 'Дата создания', 'Дата оплаты'
+]
+
+ORDER_ITEMS_CSV_HEADER = ORDERS_CSV_HEADER + [
+    'Артикул', 'Товар', 'Размер', 'Количество', 'Цена', 'Предзаказ', 'Волна'
+]
+
+
+def _format_datetime(value: Optional[datetime]) -> str:
+    return value.strftime('%Y-%m-%d %H:%M:%S') if value else ''
+
+
+def _format_customer_row(row) -> list:
+    return [
+        row.id,
+        row.phone,
+        row.full_name or '',
+        row.email or '',
+        row.telegram or '',
+        row.vk or '',
+        row.address or '',
+        row.cdek_point or '',
+        _format_datetime(row.created_at)
+    ]
+
+
+def _format_order_row(row) -> list:
+    return [
+        row.order_number,
+        row.phone,
+        row.total_amount,
+        row.discount_amount,
+        row.final_amount,
+        row.status.value,
+        row.payment_status.value,
+        row.tracking_number or '',
+        _format_datetime(row.created_at),
+        _format_datetime(row.paid_at)
+    ]
+
+
+def _format_order_item_row(row) -> list:
+    return _format_order_row(row) + [
+        row.article or '',
+        row.name or '',
+        row.size or '',
+        row.quantity or '',
+        row.price or '',
+        'да' if row.is_preorder else '',
+        row.preorder_wave or ''
+    ]
+
+
+def _export_response(
+    request: Request,
+    query,
+    header: list,
+    format_row,
+    filename: str,
+    export_format: str
+) -> StreamingResponse:
+    headers = {
+        "Content-Disposition": f"attachment; filename={filename}_{datetime.utcnow().strftime('%Y%m%d')}.{export_format}"
+    }
+    
+    if export_format == FORMAT_CSV:
+        chunks = export_service.stream_csv(query, header, format_row)
+        # Compress on the wire when the client allows it
+        headers["Vary"] = "Accept-Encoding"
+        if accepts_gzip(request.headers.get("accept-encoding")):
+            chunks = export_service.stream_gzip(chunks)
+            headers["Content-Encoding"] = "gzip"
+    elif export_format == FORMAT_CSV_GZIP:
+        chunks = export_service.stream_gzip(export_service.stream_csv(query, header, format_row))
+    else:
+        # Typed columns named after the query columns
+        chunks = export_service.stream_columnar(query, export_format)
+    
+    return StreamingResponse(chunks, media_type=MEDIA_TYPES[export_format], headers=headers)
+
+
 @router.get("/export/customers")
 async def export_customers(
-    db: Session = Depends(get_db),
+    request: Request,
+    export_format: str = Query(FORMAT_CSV, alias="format", pattern=EXPORT_FORMAT_PATTERN),
     current_admin = Depends(get_current_admin)
 ):
     """
-    Экспорт списка клиентов в CSV
+    Экспорт списка клиентов (CSV, CSV.GZ, Parquet или Arrow)
     """
-    customers = db.query(User).filter(User.is_admin == False).all()
+    # Only the exported columns, streamed in batches
+    query = select(
+        User.id,
+        User.phone,
+        User.full_name,
+        User.email,
+        User.telegram,
+        User.vk,
+        User.address,
+        User.cdek_point,
+        User.created_at
+    ).where(User.is_admin == False).order_by(User.id)
     
-    # Create CSV
-    output = io.StringIO()
-    writer = csv.writer(output)
-    
-    # Headers
-    writer.writerow([
-        'ID', 'Телефон', 'ФИО', 'Email', 'Telegram', 'VK',
-        'Адрес', 'Пункт СДЭК', 'Дата регистрации'
-    ])
-    
-    # Data
-    for customer in customers:
-        writer.writerow([
-            customer.id,
-            customer.phone,
-            customer.full_name or '',
-            customer.email or '',
-            customer.telegram or '',
-            customer.vk or '',
-            customer.address or '',
-            customer.cdek_point or '',
-            customer.created_at.strftime('%Y-%m-%d %H:%M:%S')
-        ])
-    
-    output.seek(0)
-    
-    return StreamingResponse(
-        iter([output.getvalue()]),
-        media_type="text/csv",
-        headers={
-            "Content-Disposition": f"attachment; filename=customers_{datetime.utcnow().strftime('%Y%m%d')}.csv"
-        }
+    return _export_response(
+        request, query, CUSTOMERS_CSV_HEADER, _format_customer_row, "customers", export_format
     )
 
 
 @router.get("/export/orders")
 async def export_orders(
+    request: Request,
     start_date: Optional[datetime] = None,
     end_date: Optional[datetime] = None,
-    db: Session = Depends(get_db),
+    items: bool = False,
+    export_format: str = Query(FORMAT_CSV, alias="format", pattern=EXPORT_FORMAT_PATTERN),
     current_admin = Depends(get_current_admin)
 ):
     """
-    Экспорт заказов в CSV
+    Экспорт заказов (CSV, CSV.GZ, Parquet или Arrow)
     """
-    query = db.query(Order)
+    # One joined column projection, streamed in batches
+    columns = [
+        Order.order_number,
+        User.phone,
+        Order.total_amount,
+        Order.discount_amount,
+        Order.final_amount,
+        Order.status,
+        Order.payment_status,
+        Order.tracking_number,
+        Order.created_at,
+        Order.paid_at
+    ]
+    order_by = [Order.id]
+    header, format_row = ORDERS_CSV_HEADER, _format_order_row
     
-    if start_date:
-        query = query.filter(Order.created_at >= start_date)
-    if end_date:
-        query = query.filter(Order.created_at <= end_date)
-    
-    orders = query.all()
-    
-    # Create CSV
-    output = io.StringIO()
-    writer = csv.writer(output)
-    
-    # Headers
-    writer.writerow([
-        'Номер заказа', 'Клиент', 'Сумма', 'Скидка', 'Итого',
-        'Статус', 'Статус оплаты', 'Трек-номер', 'Дата создания', 'Дата оплаты'
-    ])
+    if items:
+        # One row per order item; orders without items are kept
+        columns += [
+            Product.article,
+            Product.name,
+            OrderItem.size,
+            OrderItem.quantity,
+            OrderItem.price,
+            OrderItem.is_preorder,
+            OrderItem.preorder_wave
+        ]
+        order_by.append(OrderItem.id)
+        header, format_row = ORDER_ITEMS_CSV_HEADER, _format_order_item_row
     
-    # Data
-    for order in orders:
-        writer.writerow([
-            order.order_number,
-            order.user.phone,
-            order.total_amount,
-            order.discount_amount,
-            order.final_amount,
-            order.status.value,
-            order.payment_status.value,
-            order.tracking_number or '',
-            order.created_at.strftime('%Y-%m-%d %H:%M:%S'),
-            order.paid_at.strftime('%Y-%m-%d %H:%M:%S') if order.paid_at else ''
-        ])
+    query = select(*columns).join(User, Order.user_id == User.id)
+    if items:
+        query = (
+            query.outerjoin(OrderItem, OrderItem.order_id == Order.id)
+            .outerjoin(Product, Product.id == OrderItem.product_id)
+        )
     
-    output.seek(0)
+    if start_date:
+        query = query.where(Order.created_at >= start_date)
+    if end_date:
+        query = query.where(Order.created_at <= end_date)
     
-    return StreamingResponse(
-        iter([output.getvalue()]),
-        media_type="text/csv",
-        headers={
-            "Content-Disposition": f"attachment; filename=orders_{datetime.utcnow().strftime('%Y%m%d')}.csv"
-        }
+    return _export_response(
+        request, query.order_by(*order_by), header, format_row, "orders", export_format
     )
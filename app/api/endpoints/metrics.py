@@ -0,0 +1,105 @@
+from fastapi import APIRouter, Depends, Query, status
+
+from app.core.database import async_engine, get_pool_stats, replica_set
+from app.core.query_log import query_stats
+from app.core.security import get_current_admin, token_cache, user_cache, password_hash_pool
+from app.services.inventory import inventory_service
+from app.services.rollups import rollup_service
+from app.services.analytics_cache import analytics_cache
+from app.services.catalog import catalog_snapshot
+from app.services.search import product_search_service
+
+router = APIRouter()
+
+
+@router.get("/pool")
+async def get_pool_metrics(current_admin = Depends(get_current_admin)):
+    """
+    Статистика пула соединений с БД (только для администраторов)
+    """
+    return get_pool_stats(async_engine)
+
+
+@router.get("/replicas")
+async def get_replica_metrics(current_admin = Depends(get_current_admin)):
+    """
+    Состояние реплик для чтения и их пулов соединений (только для администраторов)
+    """
+    return replica_set.stats(get_pool_stats)
+
+
+@router.get("/queries")
+async def get_query_metrics(
+    limit: int = Query(50, ge=1, le=500),
+    order_by: str = Query("total_ms", pattern="^(total_ms|count|max_ms|avg_ms)$"),
+    current_admin = Depends(get_current_admin)
+):
+    """
+    Статистика SQL-запросов по нормализованным выражениям (только для администраторов)
+    """
+    return {"statements": query_stats.top(limit=limit, order_by=order_by)}
+
+
+@router.delete("/queries", status_code=status.HTTP_204_NO_CONTENT)
+async def reset_query_metrics(current_admin = Depends(get_current_admin)):
+    """
+    Сбросить статистику SQL-запросов (только для администраторов)
+    """
+    query_stats.reset()
+    return None
+
+
+@router.get("/inventory")
+async def get_inventory_metrics(current_admin = Depends(get_current_admin)):
+    """
+    Состояние резервов остатков в режиме ledger (только для администраторов)
+    """
+    return {"mode": inventory_service.mode, **inventory_service.ledger.snapshot()}
+
+
+@router.get("/auth-cache")
+async def get_auth_cache_metrics(current_admin = Depends(get_current_admin)):
+    """
+    Статистика кэша токенов и пользователей (только для администраторов)
+    """
+    return {"tokens": token_cache.stats(), "users": user_cache.stats()}
+
+
+@router.get("/password-hashing")
+async def get_password_hashing_metrics(current_admin = Depends(get_current_admin)):
+    """
+    Загрузка пула хеширования паролей (только для администраторов)
+    """
+    return password_hash_pool.stats()
+
+
+@router.get("/rollups")
+async def get_rollup_metrics(current_admin = Depends(get_current_admin)):
+    """
+    Состояние дневных агрегатов аналитики (только для администраторов)
+    """
+    return rollup_service.stats()
+
+
+@router.get("/analytics-cache")
+async def get_analytics_cache_metrics(current_admin = Depends(get_current_admin)):
+    """
+    Статистика кэша ответов аналитики (только для администраторов)
+    """
+    return analytics_cache.stats()
+
+
+@router.get("/catalog")
+async def get_catalog_metrics(current_admin = Depends(get_current_admin)):
+    """
+    Состояние снимка каталога в памяти (только для администраторов)
+    """
+    return catalog_snapshot.stats()
+
+
+@router.get("/search")
+async def get_search_metrics(current_admin = Depends(get_current_admin)):
+    """
+    Состояние поискового индекса в памяти (только для администраторов, без PostgreSQL)
+    """
+    return product_search_service.index.stats()
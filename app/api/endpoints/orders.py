@@ -1,5 +1,7 @@
 from fastapi import APIRouter, Depends, HTTPException, status, Query
-from sqlalchemy.orm import Session
+from sqlalchemy import select
+from sqlalchemy.ext.asyncio import AsyncSession
+from sqlalchemy.orm import selectinload
 from typing import Optional
 from datetime import datetime
 import uuid
@@ -8,38 +10,57 @@ from app.core.database import get_db
 from app.core.security import get_current_user, get_current_admin
 from app.models.user import User
 from app.models.order import Order, OrderItem, OrderStatus, PaymentStatus
-from app.models.product import Product, OrderType
+from app.models.product import OrderType
 from app.models.promo_code import PromoCode
 from app.schemas.order import OrderCreate, OrderUpdate, OrderResponse, OrderListResponse
+from app.services.inventory import inventory_service
+from app.services.analytics_cache import analytics_cache
+from app.services.catalog import catalog_snapshot
+from app.utils.pagination import TOTAL_EXACT, TOTAL_MODE_PATTERN, paginate, split_page, count_total
 
 router = APIRouter()
 
 
+async def _get_order(db: AsyncSession, order_id: int) -> Optional[Order]:
+    """Load order with items"""
+    result = await db.execute(
+        select(Order)
+        .options(selectinload(Order.items))
+        .where(Order.id == order_id)
+        .execution_options(populate_existing=True)
+    )
+    return result.scalar_one_or_none()
+
+
 @router.get("/", response_model=OrderListResponse)
 async def get_orders(
     skip: int = Query(0, ge=0),
     limit: int = Query(10, ge=1, le=100),
+    after: Optional[str] = None,
+    total_mode: str = Query(TOTAL_EXACT, pattern=TOTAL_MODE_PATTERN),
     current_user: User = Depends(get_current_user),
-    db: Session = Depends(get_db)
+    db: AsyncSession = Depends(get_db)
 ):
     """
     Получить заказы текущего пользователя
     """
-    from sqlalchemy.orm import joinedload
-    
-    query = db.query(Order).filter(Order.user_id == current_user.id)
+    query = select(Order).where(Order.user_id == current_user.id)
     
-    total = query.count()
+    total = await count_total(db, query, total_mode)
     # Use eager loading to avoid N+1 problem
-    orders = query.options(
-        joinedload(Order.items).joinedload("product")
-    ).order_by(Order.created_at.desc()).offset(skip).limit(limit).all()
+    sort_key = (Order.created_at, Order.id)
+    result = await db.execute(
+        paginate(query, sort_key, skip, limit, after, descending=True)
+        .options(selectinload(Order.items))
+    )
+    orders, next_cursor = split_page(result.scalars().all(), sort_key, limit)
     
     return OrderListResponse(
         orders=orders,
         total=total,
         page=skip // limit + 1,
-        page_size=limit
+        page_size=limit,
+        next_cursor=next_cursor
     )
 
 
@@ -47,16 +68,12 @@ async def get_orders(
 async def get_order(
     order_id: int,
     current_user: User = Depends(get_current_user),
-    db: Session = Depends(get_db)
+    db: AsyncSession = Depends(get_db)
 ):
     """
     Получить заказ по ID
     """
-    from sqlalchemy.orm import joinedload
-    
-    order = db.query(Order).options(
-        joinedload(Order.items).joinedload("product")
-    ).filter(Order.id == order_id).first()
+    order = await _get_order(db, order_id)
     
     if not order:
         raise HTTPException(
@@ -78,142 +95,122 @@ async def get_order(
 async def create_order(
     order_data: OrderCreate,
     current_user: User = Depends(get_current_user),
-    db: Session = Depends(get_db)
+    db: AsyncSession = Depends(get_db)
 ):
     """
     Создать новый заказ
     """
-    from sqlalchemy import select
+    # Look up promo code before taking any row locks
+    promo_code = None
+    if order_data.promo_code:
+        result = await db.execute(
+            select(PromoCode).where(PromoCode.code == order_data.promo_code)
+        )
+        promo_code = result.scalar_one_or_none()
     
-    # Calculate total
-    total_amount = 0
-    order_items_data = []
+    # Load all products with one SELECT (locked FOR UPDATE in lock mode)
+    product_ids = sorted({item_data.product_id for item_data in order_data.items})
+    products = await inventory_service.load_products(db, product_ids)
     
-    for item_data in order_data.items:
-        # Use SELECT FOR UPDATE to lock row and prevent race conditions
-        product = db.query(Product).filter(Product.id == item_data.product_id).with_for_update().first()
-        
-        if not product:
-            raise HTTPException(
-                status_code=status.HTTP_404_NOT_FOUND,
-                detail=f"Товар с ID {item_data.product_id} не найден"
-            )
-        
-        if not product.is_active:
-            raise HTTPException(
-                status_code=status.HTTP_400_BAD_REQUEST,
-                detail=f"Товар {product.name} недоступен для заказа"
-            )
-        
-        # Check availability
-        if product.order_type == OrderType.WAITING:
-            raise HTTPException(
-                status_code=status.HTTP_400_BAD_REQUEST,
-                detail=f"Товар {product.name} в режиме ожидания"
-            )
-        
-        is_preorder = product.order_type == OrderType.PREORDER
-        preorder_wave = None
+    # Generate order number (ledger holds are kept under it)
+    order_number = f"DWC-{datetime.utcnow().strftime('%Y%m%d')}-{uuid.uuid4().hex[:8].upper()}"
+    
+    try:
+        # Calculate total and reserve stock; lines are reserved in product id
+        # order so that concurrent checkouts touch rows in the same order
+        total_amount = 0
+        order_items = [None] * len(order_data.items)
+        lines = sorted(enumerate(order_data.items), key=lambda line: line[1].product_id)
         
-        if is_preorder:
-            # Check preorder availability
-            if product.current_wave > product.preorder_waves_total:
+        for index, item_data in lines:
+            product = products.get(item_data.product_id)
+            
+            if not product:
+                raise HTTPException(
+                    status_code=status.HTTP_404_NOT_FOUND,
+                    detail=f"Товар с ID {item_data.product_id} не найден"
+                )
+            
+            if not product.is_active:
+                raise HTTPException(
+                    status_code=status.HTTP_400_BAD_REQUEST,
+                    detail=f"Товар {product.name} недоступен для заказа"
+                )
+            
+            # Check availability
+            if product.order_type == OrderType.WAITING:
                 raise HTTPException(
                     status_code=status.HTTP_400_BAD_REQUEST,
-                    detail=f"Все волны предзаказа для {product.name} заполнены"
+                    detail=f"Товар {product.name} в режиме ожидания"
                 )
-            preorder_wave = product.current_wave
-        else:
-            # Check stock
-            if product.stock_count < item_data.quantity:
+            
+            is_preorder = product.order_type == OrderType.PREORDER
+            preorder_wave = None
+            
+            if is_preorder:
+                preorder_wave = await inventory_service.reserve_preorder(db, product, item_data.quantity)
+                if preorder_wave is None:
+                    raise HTTPException(
+                        status_code=status.HTTP_400_BAD_REQUEST,
+                        detail=f"Все волны предзаказа для {product.name} заполнены"
+                    )
+            elif not await inventory_service.reserve_stock(
+                db, product, item_data.quantity, hold_key=order_number
+            ):
                 raise HTTPException(
                     status_code=status.HTTP_400_BAD_REQUEST,
                     detail=f"Недостаточно товара {product.name} на складе"
                 )
+            
+            total_amount += product.price * item_data.quantity
+            
+            order_items[index] = OrderItem(
+                product_id=product.id,
+                size=item_data.size,
+                quantity=item_data.quantity,
+                price=product.price,
+                is_preorder=is_preorder,
+                preorder_wave=preorder_wave
+            )
         
-        item_total = product.price * item_data.quantity
-        total_amount += item_total
-        
-        order_items_data.append({
-            "product": product,
-            "size": item_data.size,
-            "quantity": item_data.quantity,
-            "price": product.price,
-            "is_preorder": is_preorder,
-            "preorder_wave": preorder_wave
-        })
-    
-    # Apply promo code
-    discount_amount = 0
-    promo_code = None
-    
-    if order_data.promo_code:
-        promo_code = db.query(PromoCode).filter(
-            PromoCode.code == order_data.promo_code
-        ).first()
+        # Apply promo code
+        discount_amount = 0
         
         if promo_code and promo_code.is_valid():
             if promo_code.discount_percent > 0:
                 discount_amount = total_amount * (promo_code.discount_percent / 100)
             elif promo_code.discount_amount > 0:
                 discount_amount = min(promo_code.discount_amount, total_amount)
-    
-    final_amount = total_amount - discount_amount
-    
-    # Generate order number
-    order_number = f"DWC-{datetime.utcnow().strftime('%Y%m%d')}-{uuid.uuid4().hex[:8].upper()}"
-    
-    # Create order
-    order = Order(
-        user_id=current_user.id,
-        order_number=order_number,
-        total_amount=total_amount,
-        discount_amount=discount_amount,
-        final_amount=final_amount,
-        delivery_address=order_data.delivery_address,
-        cdek_point=order_data.cdek_point,
-        promo_code_id=promo_code.id if promo_code else None
-    )
-    
-    db.add(order)
-    db.commit()
-    db.refresh(order)
-    
-    # Create order items
-    for item_data in order_items_data:
-        order_item = OrderItem(
-            order_id=order.id,
-            product_id=item_data["product"].id,
-            size=item_data["size"],
-            quantity=item_data["quantity"],
-            price=item_data["price"],
-            is_preorder=item_data["is_preorder"],
-            preorder_wave=item_data["preorder_wave"]
+        
+        final_amount = total_amount - discount_amount
+        
+        # Create order with items; everything is flushed and committed at once
+        order = Order(
+            user_id=current_user.id,
+            order_number=order_number,
+            total_amount=total_amount,
+            discount_amount=discount_amount,
+            final_amount=final_amount,
+            delivery_address=order_data.delivery_address,
+            cdek_point=order_data.cdek_point,
+            promo_code_id=promo_code.id if promo_code else None,
+            items=order_items
         )
-        db.add(order_item)
+        db.add(order)
         
-        # Update stock or preorder count
-        product = item_data["product"]
-        if item_data["is_preorder"]:
-            product.current_wave_count += item_data["quantity"]
-            
-            # Check if wave is full
-            if product.current_wave_count >= product.preorder_wave_capacity:
-                product.current_wave += 1
-                product.current_wave_count = 0
-                
-                # Check if all waves are done
-                if product.current_wave > product.preorder_waves_total:
-                    product.order_type = OrderType.WAITING
-        else:
-            product.stock_count -= item_data["quantity"]
-    
-    # Update promo code usage
-    if promo_code:
-        promo_code.current_uses += 1
+        # Update promo code usage
+        if promo_code:
+            promo_code.current_uses = PromoCode.current_uses + 1
+        
+        await db.commit()
+    except Exception:
+        # Return stock held for this checkout
+        inventory_service.release(order_number)
+        raise
     
-    db.commit()
-    db.refresh(order)
+    # Stock and preorder wave counters changed
+    catalog_snapshot.invalidate(product_ids)
+    await analytics_cache.invalidate()
     
     return order
 
@@ -222,13 +219,13 @@ async def create_order(
 async def update_order(
     order_id: int,
     order_data: OrderUpdate,
-    db: Session = Depends(get_db),
+    db: AsyncSession = Depends(get_db),
     current_admin: User = Depends(get_current_admin)
 ):
     """
     Обновить заказ (только для администраторов)
     """
-    order = db.query(Order).filter(Order.id == order_id).first()
+    order = await _get_order(db, order_id)
     
     if not order:
         raise HTTPException(
@@ -245,10 +242,15 @@ async def update_order(
                 order.shipped_at = datetime.utcnow()
         setattr(order, field, value)
     
-    db.commit()
-    db.refresh(order)
+    await db.commit()
     
-    return order
+    # Cancelled unpaid orders give their held stock back
+    if order.status == OrderStatus.CANCELLED:
+        inventory_service.release(order.order_number)
+    
+    await analytics_cache.invalidate()
+    
+    return await _get_order(db, order.id)
 
 
 @router.get("/admin/all", response_model=OrderListResponse)
@@ -256,23 +258,31 @@ async def get_all_orders(
     skip: int = Query(0, ge=0),
     limit: int = Query(10, ge=1, le=100),
     status: Optional[str] = None,
-    db: Session = Depends(get_db),
+    after: Optional[str] = None,
+    total_mode: str = Query(TOTAL_EXACT, pattern=TOTAL_MODE_PATTERN),
+    db: AsyncSession = Depends(get_db),
     current_admin: User = Depends(get_current_admin)
 ):
     """
     Получить все заказы (только для администраторов)
     """
-    query = db.query(Order)
+    query = select(Order)
     
     if status:
-        query = query.filter(Order.status == status)
+        query = query.where(Order.status == status)
     
-    total = query.count()
-    orders = query.order_by(Order.created_at.desc()).offset(skip).limit(limit).all()
+    total = await count_total(db, query, total_mode)
+    sort_key = (Order.created_at, Order.id)
+    result = await db.execute(
+        paginate(query, sort_key, skip, limit, after, descending=True)
+        .options(selectinload(Order.items))
+    )
+    orders, next_cursor = split_page(result.scalars().all(), sort_key, limit)
     
     return OrderListResponse(
         orders=orders,
         total=total,
         page=skip // limit + 1,
-        page_size=limit
+        page_size=limit,
+        next_cursor=next_cursor
     )
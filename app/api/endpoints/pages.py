@@ -1,7 +1,8 @@
 from fastapi import APIRouter, Depends, HTTPException, status
-from sqlalchemy.orm import Session
+from sqlalchemy import select
+from sqlalchemy.ext.asyncio import AsyncSession
 
-from app.core.database import get_db
+from app.core.database import get_db, get_read_db
 from app.core.security import get_current_admin
 from app.models.page import Page
 from app.schemas.page import PageCreate, PageUpdate, PageResponse
@@ -13,21 +14,23 @@ router = APIRouter()
 async def get_pages(
     skip: int = 0,
     limit: int = 100,
-    db: Session = Depends(get_db)
+    db: AsyncSession = Depends(get_read_db)
 ):
     """
     Получить все страницы
     """
-    pages = db.query(Page).offset(skip).limit(limit).all()
+    result = await db.execute(select(Page).offset(skip).limit(limit))
+    pages = result.scalars().all()
     return pages
 
 
 @router.get("/{slug}", response_model=PageResponse)
-async def get_page_by_slug(slug: str, db: Session = Depends(get_db)):
+async def get_page_by_slug(slug: str, db: AsyncSession = Depends(get_read_db)):
     """
     Получить страницу по slug
     """
-    page = db.query(Page).filter(Page.slug == slug).first()
+    result = await db.execute(select(Page).where(Page.slug == slug))
+    page = result.scalar_one_or_none()
     if not page:
         raise HTTPException(
             status_code=status.HTTP_404_NOT_FOUND,
@@ -39,14 +42,15 @@ async def get_page_by_slug(slug: str, db: Session = Depends(get_db)):
 @router.post("/", response_model=PageResponse, status_code=status.HTTP_201_CREATED)
 async def create_page(
     page_data: PageCreate,
-    db: Session = Depends(get_db),
+    db: AsyncSession = Depends(get_db),
     current_admin = Depends(get_current_admin)
 ):
     """
     Создать страницу (только для администраторов)
     """
     # Check if slug already exists
-    existing = db.query(Page).filter(Page.slug == page_data.slug).first()
+    result = await db.execute(select(Page).where(Page.slug == page_data.slug))
+    existing = result.scalar_one_or_none()
     if existing:
         raise HTTPException(
             status_code=status.HTTP_400_BAD_REQUEST,
@@ -55,8 +59,8 @@ async def create_page(
     
     page = Page(**page_data.dict())
     db.add(page)
-    db.commit()
-    db.refresh(page)
+    await db.commit()
+    await db.refresh(page)
     
     return page
 
@@ -65,13 +69,14 @@ async def create_page(
 async def update_page(
     slug: str,
     page_data: PageUpdate,
-    db: Session = Depends(get_db),
+    db: AsyncSession = Depends(get_db),
     current_admin = Depends(get_current_admin)
 ):
     """
     Обновить страницу (только для администраторов)
     """
-    page = db.query(Page).filter(Page.slug == slug).first()
+    result = await db.execute(select(Page).where(Page.slug == slug))
+    page = result.scalar_one_or_none()
     if not page:
         raise HTTPException(
             status_code=status.HTTP_404_NOT_FOUND,
@@ -83,8 +88,8 @@ async def update_page(
     for field, value in update_data.items():
         setattr(page, field, value)
     
-    db.commit()
-    db.refresh(page)
+    await db.commit()
+    await db.refresh(page)
     
     return page
 
@@ -92,20 +97,21 @@ async def update_page(
 @router.delete("/{slug}", status_code=status.HTTP_204_NO_CONTENT)
 async def delete_page(
     slug: str,
-    db: Session = Depends(get_db),
+    db: AsyncSession = Depends(get_db),
     current_admin = Depends(get_current_admin)
 ):
     """
     Удалить страницу (только для администраторов)
     """
-    page = db.query(Page).filter(Page.slug == slug).first()
+    result = await db.execute(select(Page).where(Page.slug == slug))
+    page = result.scalar_one_or_none()
     if not page:
         raise HTTPException(
             status_code=status.HTTP_404_NOT_FOUND,
             detail="Страница не найдена"
         )
     
-    db.delete(page)
-    db.commit()
+    await db.delete(page)
+    await db.commit()
     
     return None
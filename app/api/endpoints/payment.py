@@ -1,33 +1,63 @@
+import asyncio
+
 from fastapi import APIRouter, Depends, HTTPException, status, Request
-from sqlalchemy.orm import Session
+from sqlalchemy import select, update
+from sqlalchemy.ext.asyncio import AsyncSession
+from sqlalchemy.orm import selectinload
 from datetime import datetime
 
 from app.core.database import get_db
 from app.core.security import get_current_user
 from app.models.user import User
-from app.models.order import Order, PaymentStatus, OrderStatus
+from app.models.order import Order, OrderItem, PaymentStatus, OrderStatus
 from app.services.payment import payment_service
+from app.services.inventory import inventory_service
+from app.services.analytics_cache import analytics_cache
 
 router = APIRouter()
 
 
+async def _mark_order_paid(db: AsyncSession, order: Order) -> bool:
+    """
+    Move order to SUCCEEDED once
+
+    The status check and the write are one UPDATE, so of concurrent status
+    polls and webhooks for the same payment only one gets True and settles stock.
+    """
+    paid_at = datetime.utcnow()
+    result = await db.execute(
+        update(Order)
+        .where(Order.id == order.id, Order.payment_status != PaymentStatus.SUCCEEDED)
+        .values(payment_status=PaymentStatus.SUCCEEDED, status=OrderStatus.PAID, paid_at=paid_at)
+        .returning(Order.id)
+        .execution_options(synchronize_session=False)
+    )
+    if result.scalar_one_or_none() is None:
+        return False
+
+    order.payment_status = PaymentStatus.SUCCEEDED
+    order.status = OrderStatus.PAID
+    order.paid_at = paid_at
+    return True
+
+
 @router.post("/create/{order_id}")
 async def create_payment(
     order_id: int,
     current_user: User = Depends(get_current_user),
-    db: Session = Depends(get_db)
+    db: AsyncSession = Depends(get_db)
 ):
     """
     Создать платёж для заказа
     """
-    from sqlalchemy.orm import joinedload
-    from app.models.product import Product
-    
     # Load order with all necessary relationships to avoid lazy loading issues
-    order = db.query(Order).options(
-        joinedload(Order.user),
-        joinedload(Order.items).joinedload("product")
-    ).filter(Order.id == order_id).first()
+    result = await db.execute(
+        select(Order).options(
+            selectinload(Order.user),
+            selectinload(Order.items).selectinload(OrderItem.product)
+        ).where(Order.id == order_id)
+    )
+    order = result.scalar_one_or_none()
     
     if not order:
         raise HTTPException(
@@ -50,15 +80,14 @@ async def create_payment(
         )
     
     try:
-        # Create payment via YooKassa
-        payment_data = payment_service.create_payment(order)
+        # Create payment via YooKassa (blocking HTTP client, kept off the event loop)
+        payment_data = await asyncio.to_thread(payment_service.create_payment, order)
         
         # Update order with payment info
         order.payment_id = payment_data["payment_id"]
         order.payment_url = payment_data["confirmation_url"]
         
-        db.commit()
-        db.refresh(order)
+        await db.commit()
         
         return {
             "payment_id": payment_data["payment_id"],
@@ -76,12 +105,13 @@ async def create_payment(
 async def get_payment_status(
     payment_id: str,
     current_user: User = Depends(get_current_user),
-    db: Session = Depends(get_db)
+    db: AsyncSession = Depends(get_db)
 ):
     """
     Получить статус платежа
     """
-    order = db.query(Order).filter(Order.payment_id == payment_id).first()
+    result = await db.execute(select(Order).where(Order.payment_id == payment_id))
+    order = result.scalar_one_or_none()
     
     if not order:
         raise HTTPException(
@@ -97,15 +127,14 @@ async def get_payment_status(
         )
     
     try:
-        payment_info = payment_service.get_payment(payment_id)
+        payment_info = await asyncio.to_thread(payment_service.get_payment, payment_id)
         
         if payment_info and payment_info["paid"]:
             # Update order status
-            if order.payment_status != PaymentStatus.SUCCEEDED:
-                order.payment_status = PaymentStatus.SUCCEEDED
-                order.status = OrderStatus.PAID
-                order.paid_at = datetime.utcnow()
-                db.commit()
+            if await _mark_order_paid(db, order):
+                await db.commit()
+                await inventory_service.confirm(db, order)
+                await analytics_cache.invalidate()
         
         return payment_info
     except Exception as e:
@@ -116,7 +145,7 @@ async def get_payment_status(
 
 
 @router.post("/webhook")
-async def payment_webhook(request: Request, db: Session = Depends(get_db)):
+async def payment_webhook(request: Request, db: AsyncSession = Depends(get_db)):
     """
     Webhook для получения уведомлений от ЮKassa
     """
@@ -128,21 +157,29 @@ async def payment_webhook(request: Request, db: Session = Depends(get_db)):
         
         # Find order
         payment_id = webhook_data["payment_id"]
-        order = db.query(Order).filter(Order.payment_id == payment_id).first()
+        result = await db.execute(select(Order).where(Order.payment_id == payment_id))
+        order = result.scalar_one_or_none()
         
         if not order:
             return {"status": "ok"}
         
         # Update order status based on payment status
+        paid = False
         if webhook_data["paid"] and webhook_data["status"] == "succeeded":
-            order.payment_status = PaymentStatus.SUCCEEDED
-            order.status = OrderStatus.PAID
-            order.paid_at = datetime.utcnow()
+            paid = await _mark_order_paid(db, order)
         elif webhook_data["status"] == "canceled":
             order.payment_status = PaymentStatus.CANCELLED
             order.status = OrderStatus.CANCELLED
         
-        db.commit()
+        await db.commit()
+        
+        # Settle stock held at checkout
+        if paid:
+            await inventory_service.confirm(db, order)
+        elif order.status == OrderStatus.CANCELLED:
+            inventory_service.release(order.order_number)
+        
+        await analytics_cache.invalidate()
         
         return {"status": "ok"}
     except Exception as e:
@@ -154,12 +191,13 @@ async def payment_webhook(request: Request, db: Session = Depends(get_db)):
 async def cancel_payment(
     payment_id: str,
     current_user: User = Depends(get_current_user),
-    db: Session = Depends(get_db)
+    db: AsyncSession = Depends(get_db)
 ):
     """
     Отменить платёж
     """
-    order = db.query(Order).filter(Order.payment_id == payment_id).first()
+    result = await db.execute(select(Order).where(Order.payment_id == payment_id))
+    order = result.scalar_one_or_none()
     
     if not order:
         raise HTTPException(
@@ -175,12 +213,14 @@ async def cancel_payment(
         )
     
     try:
-        success = payment_service.cancel_payment(payment_id)
+        success = await asyncio.to_thread(payment_service.cancel_payment, payment_id)
         
         if success:
             order.payment_status = PaymentStatus.CANCELLED
             order.status = OrderStatus.CANCELLED
-            db.commit()
+            await db.commit()
+            inventory_service.release(order.order_number)
+            await analytics_cache.invalidate()
             
             return {"status": "cancelled"}
         else:
@@ -1,51 +1,182 @@
-from fastapi import APIRouter, Depends, HTTPException, status, Query
-from sqlalchemy.orm import Session
-from typing import Optional
+from fastapi import APIRouter, Depends, HTTPException, status, Query, Request, Response, UploadFile, File
+from sqlalchemy import select
+from sqlalchemy.ext.asyncio import AsyncSession
+from sqlalchemy.orm import selectinload
+import csv
+import json
+from typing import List, Optional
 
-from app.core.database import get_db
+from app.core.config import settings
+from app.core.database import get_db, open_read_session
+from app.core.replicas import reads_from_primary
 from app.core.security import get_current_admin
 from app.models.product import Product, ProductMedia, OrderType
-from app.schemas.product import ProductCreate, ProductUpdate, ProductResponse, ProductListResponse
+from app.schemas.product import (
+    ProductCreate, ProductUpdate, ProductResponse, ProductListResponse,
+    ProductStaticResponse, ProductAvailabilityResponse, ProductSearchResponse,
+    ProductImportResponse, ProductStockUpdate, ProductStockUpdateResponse
+)
+from app.services.inventory import inventory_service
+from app.services.catalog import catalog_snapshot, etag_matches, make_etag
+from app.services.search import product_search_service, ORDER_TYPE_PATTERN, MAX_QUERY_LENGTH
+from app.services.product_import import (
+    product_import_service, parse_csv, parse_jsonl, FORMAT_CSV, FORMAT_JSONL, FORMAT_PATTERN, STATUS_CREATED, STATUS_UPDATED
+)
+from app.services.stock_sync import stock_sync_service
+from app.utils.pagination import TOTAL_EXACT, TOTAL_MODE_PATTERN, paginate, split_page, count_total
 
 router = APIRouter()
 
 
+async def _get_product(db: AsyncSession, product_id: int) -> Optional[Product]:
+    """Load product with media"""
+    result = await db.execute(
+        select(Product)
+        .options(selectinload(Product.media))
+        .where(Product.id == product_id)
+        .execution_options(populate_existing=True)
+    )
+    return result.scalar_one_or_none()
+
+
+def _snapshot_response(request: Request, body: bytes, etag: str, cache_control: str = "no-cache") -> Response:
+    # Clients and CDNs revalidate with If-None-Match and get 304 while unchanged
+    headers = {"ETag": etag, "Cache-Control": cache_control}
+    if etag_matches(request.headers.get("if-none-match"), etag):
+        return Response(status_code=status.HTTP_304_NOT_MODIFIED, headers=headers)
+    return Response(content=body, media_type="application/json", headers=headers)
+
+
 @router.get("/", response_model=ProductListResponse)
 async def get_products(
+    request: Request,
     skip: int = Query(0, ge=0),
     limit: int = Query(10, ge=1, le=100),
     is_active: Optional[bool] = None,
     is_archived: Optional[bool] = False,
-    db: Session = Depends(get_db)
+    after: Optional[str] = None,
+    total_mode: str = Query(TOTAL_EXACT, pattern=TOTAL_MODE_PATTERN)
 ):
     """
     Получить список товаров
     """
-    query = db.query(Product)
+    # Ready JSON from the in-memory catalog snapshot, no database access
+    if catalog_snapshot.enabled:
+        body, etag = await catalog_snapshot.page(skip, limit, is_active, is_archived, after, total_mode)
+        return _snapshot_response(request, body, etag)
+    
+    query = select(Product)
     
     if is_active is not None:
-        query = query.filter(Product.is_active == is_active)
+        query = query.where(Product.is_active == is_active)
     
     if is_archived is not None:
-        query = query.filter(Product.is_archived == is_archived)
+        query = query.where(Product.is_archived == is_archived)
     
-    total = query.count()
-    products = query.offset(skip).limit(limit).all()
+    async with await open_read_session(primary=reads_from_primary(request)) as db:
+        total = await count_total(db, query, total_mode)
+        sort_key = (Product.id,)
+        result = await db.execute(
+            paginate(query, sort_key, skip, limit, after).options(selectinload(Product.media))
+        )
+        products, next_cursor = split_page(result.scalars().all(), sort_key, limit)
     
     return ProductListResponse(
         products=products,
         total=total,
         page=skip // limit + 1,
-        page_size=limit
+        page_size=limit,
+        next_cursor=next_cursor
+    )
+
+
+@router.get("/availability", response_model=ProductAvailabilityResponse)
+async def get_products_availability(
+    ids: str = Query(..., pattern=r"^\d+(,\d+)*$", description="ID товаров через запятую")
+):
+    """
+    Остатки и счётчики волн предзаказа для нескольких товаров
+    """
+    product_ids = list(dict.fromkeys(int(product_id) for product_id in ids.split(",")))
+    if len(product_ids) > settings.CATALOG_AVAILABILITY_MAX_IDS:
+        raise HTTPException(
+            status_code=status.HTTP_400_BAD_REQUEST,
+            detail=f"Не больше {settings.CATALOG_AVAILABILITY_MAX_IDS} товаров за запрос"
+        )
+    
+    # Counters from the hot cache; ledger holds are applied on every request
+    products = [
+        {**counters, "available": inventory_service.available(counters)}
+        for counters in await catalog_snapshot.product_counters(product_ids)
+    ]
+    
+    # Short shared caching smooths polling during drops
+    max_age = int(settings.CATALOG_AVAILABILITY_TTL_SECONDS)
+    return Response(
+        content=json.dumps({"products": products}, separators=(",", ":")),
+        media_type="application/json",
+        headers={"Cache-Control": f"public, max-age={max_age}" if max_age > 0 else "no-cache"}
+    )
+
+
+@router.get("/search", response_model=ProductSearchResponse)
+async def search_products(
+    request: Request,
+    q: Optional[str] = Query(None, max_length=MAX_QUERY_LENGTH, description="Название, описание или артикул"),
+    sizes: Optional[List[str]] = Query(None, description="Любой из размеров"),
+    min_price: Optional[float] = Query(None, ge=0),
+    max_price: Optional[float] = Query(None, ge=0),
+    order_type: Optional[str] = Query(None, pattern=ORDER_TYPE_PATTERN),
+    skip: int = Query(0, ge=0),
+    limit: int = Query(20, ge=1, le=100)
+):
+    """
+    Поиск активных товаров с фильтрами и фасетами
+    """
+    async with await open_read_session(primary=reads_from_primary(request)) as db:
+        found = await product_search_service.search(
+            db, q, sizes or [], min_price, max_price, order_type, skip, limit
+        )
+        if catalog_snapshot.enabled:
+            bodies = [entry.body for entry in await catalog_snapshot.products(found["ids"])]
+        else:
+            result = await db.execute(
+                select(Product).options(selectinload(Product.media)).where(Product.id.in_(found["ids"]))
+            )
+            products = {product.id: product for product in result.scalars().all()}
+            bodies = [
+                ProductResponse.model_validate(products[product_id]).model_dump_json().encode()
+                for product_id in found["ids"] if product_id in products
+            ]
+    
+    meta = json.dumps({
+        "total": found["total"],
+        "page": skip // limit + 1,
+        "page_size": limit,
+        "facets": found["facets"]
+    })
+    return Response(
+        content=b'{"products":[' + b",".join(bodies) + b"]," + meta[1:].encode(),
+        media_type="application/json"
     )
 
 
 @router.get("/{product_id}", response_model=ProductResponse)
-async def get_product(product_id: int, db: Session = Depends(get_db)):
+async def get_product(product_id: int, request: Request):
     """
     Получить товар по ID
     """
-    product = db.query(Product).filter(Product.id == product_id).first()
+    if catalog_snapshot.enabled:
+        entry = await catalog_snapshot.product(product_id)
+        if not entry:
+            raise HTTPException(
+                status_code=status.HTTP_404_NOT_FOUND,
+                detail="Товар не найден"
+            )
+        return _snapshot_response(request, entry.body, entry.etag)
+    
+    async with await open_read_session(primary=reads_from_primary(request)) as db:
+        product = await _get_product(db, product_id)
     if not product:
         raise HTTPException(
             status_code=status.HTTP_404_NOT_FOUND,
@@ -54,17 +185,44 @@ async def get_product(product_id: int, db: Session = Depends(get_db)):
     return product
 
 
+@router.get("/{product_id}/static", response_model=ProductStaticResponse)
+async def get_product_static(product_id: int, request: Request):
+    """
+    Получить товар без остатков и счётчиков волн (кэшируется надолго)
+    """
+    cache_control = f"public, max-age={settings.CATALOG_STATIC_MAX_AGE_SECONDS}"
+    if catalog_snapshot.enabled:
+        entry = await catalog_snapshot.product(product_id)
+        if not entry:
+            raise HTTPException(
+                status_code=status.HTTP_404_NOT_FOUND,
+                detail="Товар не найден"
+            )
+        return _snapshot_response(request, entry.static_body, entry.static_etag, cache_control)
+    
+    async with await open_read_session(primary=reads_from_primary(request)) as db:
+        product = await _get_product(db, product_id)
+    if not product:
+        raise HTTPException(
+            status_code=status.HTTP_404_NOT_FOUND,
+            detail="Товар не найден"
+        )
+    body = ProductStaticResponse.model_validate(product).model_dump_json().encode()
+    return _snapshot_response(request, body, make_etag(body), cache_control)
+
+
 @router.post("/", response_model=ProductResponse, status_code=status.HTTP_201_CREATED)
 async def create_product(
     product_data: ProductCreate,
-    db: Session = Depends(get_db),
+    db: AsyncSession = Depends(get_db),
     current_admin = Depends(get_current_admin)
 ):
     """
     Создать новый товар (только для администраторов)
     """
     # Check if article already exists
-    existing = db.query(Product).filter(Product.article == product_data.article).first()
+    result = await db.execute(select(Product).where(Product.article == product_data.article))
+    existing = result.scalar_one_or_none()
     if existing:
         raise HTTPException(
             status_code=status.HTTP_400_BAD_REQUEST,
@@ -87,31 +245,104 @@ async def create_product(
     )
     
     db.add(product)
-    db.commit()
-    db.refresh(product)
+    await db.commit()
+    await db.refresh(product)
     
     # Add media
     for idx, url in enumerate(product_data.media_urls):
         media = ProductMedia(product_id=product.id, url=url, order=idx)
         db.add(media)
     
-    db.commit()
-    db.refresh(product)
+    await db.commit()
+    catalog_snapshot.invalidate([product.id])
     
-    return product
+    return await _get_product(db, product.id)
+
+
+@router.post("/bulk", response_model=ProductImportResponse)
+async def bulk_import_products(
+    file: UploadFile = File(..., description="JSON lines или CSV с заголовком"),
+    format: Optional[str] = Query(None, pattern=FORMAT_PATTERN, description="По умолчанию по расширению файла"),
+    db: AsyncSession = Depends(get_db),
+    current_admin = Depends(get_current_admin)
+):
+    """
+    Массовое создание и обновление товаров по артикулу (только для администраторов)
+    """
+    try:
+        text = (await file.read()).decode("utf-8-sig")
+    except UnicodeDecodeError:
+        raise HTTPException(
+            status_code=status.HTTP_400_BAD_REQUEST,
+            detail="Файл должен быть в кодировке UTF-8"
+        )
+    
+    if format is None:
+        format = FORMAT_CSV if (file.filename or "").lower().endswith(".csv") else FORMAT_JSONL
+    try:
+        rows = list(parse_csv(text) if format == FORMAT_CSV else parse_jsonl(text))
+    except csv.Error as e:
+        raise HTTPException(
+            status_code=status.HTTP_400_BAD_REQUEST,
+            detail=f"Некорректный CSV: {e}"
+        )
+    if len(rows) > settings.PRODUCT_IMPORT_MAX_ROWS:
+        raise HTTPException(
+            status_code=status.HTTP_400_BAD_REQUEST,
+            detail=f"Не больше {settings.PRODUCT_IMPORT_MAX_ROWS} строк за загрузку"
+        )
+    
+    # Valid rows are written in one transaction, invalid ones only reported
+    report = await product_import_service.import_products(db, rows, settings.PRODUCT_IMPORT_BATCH_SIZE)
+    await db.commit()
+    
+    updated = [row["id"] for row in report["rows"] if row["status"] == STATUS_UPDATED]
+    catalog_snapshot.invalidate(
+        [row["id"] for row in report["rows"] if row["status"] == STATUS_CREATED] + updated
+    )
+    for product_id in updated:
+        inventory_service.invalidate(product_id)
+    
+    return report
+
+
+@router.patch("/stock", response_model=ProductStockUpdateResponse)
+async def update_products_stock(
+    stock_data: ProductStockUpdate,
+    db: AsyncSession = Depends(get_db),
+    current_admin = Depends(get_current_admin)
+):
+    """
+    Массовое обновление остатков и цен по ID или артикулу (только для администраторов)
+    """
+    if len(stock_data.items) > settings.PRODUCT_STOCK_SYNC_MAX_ITEMS:
+        raise HTTPException(
+            status_code=status.HTTP_400_BAD_REQUEST,
+            detail=f"Не больше {settings.PRODUCT_STOCK_SYNC_MAX_ITEMS} товаров за запрос"
+        )
+    
+    result = await stock_sync_service.apply(db, stock_data.items, stock_data.mode)
+    await db.commit()
+    
+    # Stock set by the warehouse replaces the cached checkout stock
+    catalog_snapshot.invalidate(result["changed_ids"])
+    for product_id in result["changed_ids"]:
+        inventory_service.invalidate(product_id)
+    
+    return result
 
 
 @router.put("/{product_id}", response_model=ProductResponse)
 async def update_product(
     product_id: int,
     product_data: ProductUpdate,
-    db: Session = Depends(get_db),
+    db: AsyncSession = Depends(get_db),
     current_admin = Depends(get_current_admin)
 ):
     """
     Обновить товар (только для администраторов)
     """
-    product = db.query(Product).filter(Product.id == product_id).first()
+    product = await _get_product(db, product_id)
     if not product:
         raise HTTPException(
             status_code=status.HTTP_404_NOT_FOUND,
@@ -125,30 +356,35 @@ async def update_product(
             value = OrderType(value)
         setattr(product, field, value)
     
-    db.commit()
-    db.refresh(product)
+    await db.commit()
+    catalog_snapshot.invalidate([product.id])
     
-    return product
+    # Stock set by admin replaces the cached checkout stock
+    if "stock_count" in update_data:
+        inventory_service.invalidate(product.id)
+    
+    return await _get_product(db, product.id)
 
 
 @router.delete("/{product_id}", status_code=status.HTTP_204_NO_CONTENT)
 async def delete_product(
     product_id: int,
-    db: Session = Depends(get_db),
+    db: AsyncSession = Depends(get_db),
     current_admin = Depends(get_current_admin)
 ):
     """
     Удалить товар (только для администраторов)
     """
-    product = db.query(Product).filter(Product.id == product_id).first()
+    product = await _get_product(db, product_id)
     if not product:
         raise HTTPException(
             status_code=status.HTTP_404_NOT_FOUND,
             detail="Товар не найден"
         )
     
-    db.delete(product)
-    db.commit()
+    await db.delete(product)
+    await db.commit()
+    catalog_snapshot.invalidate([product_id])
     
     return None
 
@@ -156,13 +392,13 @@ async def delete_product(
 @router.post("/{product_id}/archive", response_model=ProductResponse)
 async def archive_product(
     product_id: int,
-    db: Session = Depends(get_db),
+    db: AsyncSession = Depends(get_db),
     current_admin = Depends(get_current_admin)
 ):
     """
     Архивировать товар (только для администраторов)
     """
-    product = db.query(Product).filter(Product.id == product_id).first()
+    product = await _get_product(db, product_id)
     if not product:
         raise HTTPException(
             status_code=status.HTTP_404_NOT_FOUND,
@@ -172,7 +408,7 @@ async def archive_product(
     product.is_archived = True
     product.is_active = False
     
-    db.commit()
-    db.refresh(product)
+    await db.commit()
+    catalog_snapshot.invalidate([product.id])
     
-    return product
+    return await _get_product(db, product.id)
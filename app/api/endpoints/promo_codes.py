@@ -1,41 +1,51 @@
-from fastapi import APIRouter, Depends, HTTPException, status
-from sqlalchemy.orm import Session
+from fastapi import APIRouter, Depends, HTTPException, Query, status, Response
+from sqlalchemy import select
+from sqlalchemy.ext.asyncio import AsyncSession
+from sqlalchemy.orm import selectinload
 from pydantic import BaseModel
-from typing import List
+from typing import List, Optional
 
 from app.core.database import get_db
 from app.core.security import get_current_admin
 from app.models.promo_code import PromoCode
 from app.models.product import Product
 from app.schemas.promo_code import PromoCodeCreate, PromoCodeUpdate, PromoCodeResponse, PromoCodeValidation
+from app.utils.pagination import paginate, split_page
 
 router = APIRouter()
 
 
 @router.get("/", response_model=list[PromoCodeResponse])
 async def get_promo_codes(
-    skip: int = 0,
-    limit: int = 100,
-    db: Session = Depends(get_db),
+    response: Response,
+    skip: int = Query(0, ge=0),
+    limit: int = Query(100, ge=1, le=1000),
+    after: Optional[str] = None,
+    db: AsyncSession = Depends(get_db),
     current_admin = Depends(get_current_admin)
 ):
     """
     Получить все промокоды (только для администраторов)
     """
-    promo_codes = db.query(PromoCode).offset(skip).limit(limit).all()
+    sort_key = (PromoCode.id,)
+    result = await db.execute(paginate(select(PromoCode), sort_key, skip, limit, after))
+    promo_codes, next_cursor = split_page(result.scalars().all(), sort_key, limit)
+    
+    if next_cursor:
+        response.headers["X-Next-Cursor"] = next_cursor
     return promo_codes
 
 
 @router.get("/{promo_code_id}", response_model=PromoCodeResponse)
 async def get_promo_code(
     promo_code_id: int,
-    db: Session = Depends(get_db),
+    db: AsyncSession = Depends(get_db),
     current_admin = Depends(get_current_admin)
 ):
     """
     Получить промокод по ID (только для администраторов)
     """
-    promo_code = db.query(PromoCode).filter(PromoCode.id == promo_code_id).first()
+    promo_code = await db.get(PromoCode, promo_code_id)
     if not promo_code:
         raise HTTPException(
             status_code=status.HTTP_404_NOT_FOUND,
@@ -51,14 +61,17 @@ class PromoCodeValidateRequest(BaseModel):
 @router.post("/validate", response_model=PromoCodeValidation)
 async def validate_promo_code(
     request: PromoCodeValidateRequest,
-    db: Session = Depends(get_db)
+    db: AsyncSession = Depends(get_db)
 ):
     """
     Проверить валидность промокода
     """
     code = request.code
     product_ids = request.product_ids
-    promo_code = db.query(PromoCode).filter(PromoCode.code == code).first()
+    result = await db.execute(
+        select(PromoCode).options(selectinload(PromoCode.products)).where(PromoCode.code == code)
+    )
+    promo_code = result.scalar_one_or_none()
     
     if not promo_code:
         return PromoCodeValidation(
@@ -92,14 +105,15 @@ async def validate_promo_code(
 @router.post("/", response_model=PromoCodeResponse, status_code=status.HTTP_201_CREATED)
 async def create_promo_code(
     promo_data: PromoCodeCreate,
-    db: Session = Depends(get_db),
+    db: AsyncSession = Depends(get_db),
     current_admin = Depends(get_current_admin)
 ):
     """
     Создать промокод (только для администраторов)
     """
     # Check if code already exists
-    existing = db.query(PromoCode).filter(PromoCode.code == promo_data.code).first()
+    result = await db.execute(select(PromoCode).where(PromoCode.code == promo_data.code))
+    existing = result.scalar_one_or_none()
     if existing:
         raise HTTPException(
             status_code=status.HTTP_400_BAD_REQUEST,
@@ -119,12 +133,12 @@ async def create_promo_code(
     
     # Add products
     if promo_data.product_ids:
-        products = db.query(Product).filter(Product.id.in_(promo_data.product_ids)).all()
-        promo_code.products = products
+        result = await db.execute(select(Product).where(Product.id.in_(promo_data.product_ids)))
+        promo_code.products = result.scalars().all()
     
     db.add(promo_code)
-    db.commit()
-    db.refresh(promo_code)
+    await db.commit()
+    await db.refresh(promo_code)
     
     return promo_code
 
@@ -133,13 +147,13 @@ async def create_promo_code(
 async def update_promo_code(
     promo_code_id: int,
     promo_data: PromoCodeUpdate,
-    db: Session = Depends(get_db),
+    db: AsyncSession = Depends(get_db),
     current_admin = Depends(get_current_admin)
 ):
     """
     Обновить промокод (только для администраторов)
     """
-    promo_code = db.query(PromoCode).filter(PromoCode.id == promo_code_id).first()
+    promo_code = await db.get(PromoCode, promo_code_id, options=[selectinload(PromoCode.products)])
     if not promo_code:
         raise HTTPException(
             status_code=status.HTTP_404_NOT_FOUND,
@@ -153,14 +167,14 @@ async def update_promo_code(
     if "product_ids" in update_data:
         product_ids = update_data.pop("product_ids")
         if product_ids is not None:
-            products = db.query(Product).filter(Product.id.in_(product_ids)).all()
-            promo_code.products = products
+            result = await db.execute(select(Product).where(Product.id.in_(product_ids)))
+            promo_code.products = result.scalars().all()
     
     for field, value in update_data.items():
         setattr(promo_code, field, value)
     
-    db.commit()
-    db.refresh(promo_code)
+    await db.commit()
+    await db.refresh(promo_code)
     
     return promo_code
 
@@ -168,13 +182,13 @@ async def update_promo_code(
 @router.delete("/{promo_code_id}", status_code=status.HTTP_204_NO_CONTENT)
 async def delete_promo_code(
     promo_code_id: int,
-    db: Session = Depends(get_db),
+    db: AsyncSession = Depends(get_db),
     current_admin = Depends(get_current_admin)
 ):
     """
     Удалить промокод (только для администраторов)
     """
-    promo_code = db.query(PromoCode).filter(PromoCode.id == promo_code_id).first()
+    promo_code = await db.get(PromoCode, promo_code_id)
     if not promo_code:
         raise HTTPException(
             status_code=status.HTTP_404_NOT_FOUND,
@@ -184,6 +198,6 @@ async def delete_promo_code(
     # Soft delete - deactivate instead of deleting
     promo_code.is_active = False
     
-    db.commit()
+    await db.commit()
     
     return None
@@ -1,10 +1,13 @@
-from fastapi import APIRouter, Depends, HTTPException, status
-from sqlalchemy.orm import Session
+from fastapi import APIRouter, Depends, HTTPException, Query, status, Response
+from typing import Optional
+from sqlalchemy import select
+from sqlalchemy.ext.asyncio import AsyncSession
 
 from app.core.database import get_db
-from app.core.security import get_current_user, get_current_admin
+from app.core.security import get_current_user, get_current_admin, invalidate_user
 from app.models.user import User
 from app.schemas.user import UserResponse, UserUpdate
+from app.utils.pagination import paginate, split_page
 
 router = APIRouter()
 
@@ -21,36 +24,44 @@ async def get_current_user_info(current_user: User = Depends(get_current_user)):
 async def update_current_user(
     user_data: UserUpdate,
     current_user: User = Depends(get_current_user),
-    db: Session = Depends(get_db)
+    db: AsyncSession = Depends(get_db)
 ):
     """
     Обновить профиль текущего пользователя
     """
-    # Merge user into session if not already present
-    user = db.merge(current_user)
+    # current_user is a cached snapshot, load the row to update it
+    user = await db.get(User, current_user.id)
     
     # Update user fields
     update_data = user_data.dict(exclude_unset=True)
     for field, value in update_data.items():
         setattr(user, field, value)
     
-    db.commit()
-    db.refresh(user)
+    await db.commit()
+    await db.refresh(user)
+    invalidate_user(user.id)
     
     return user
 
 
 @router.get("/", response_model=list[UserResponse])
 async def get_all_users(
-    skip: int = 0,
-    limit: int = 100,
+    response: Response,
+    skip: int = Query(0, ge=0),
+    limit: int = Query(100, ge=1, le=1000),
+    after: Optional[str] = None,
     current_admin: User = Depends(get_current_admin),
-    db: Session = Depends(get_db)
+    db: AsyncSession = Depends(get_db)
 ):
     """
     Получить список всех пользователей (только для администраторов)
     """
-    users = db.query(User).offset(skip).limit(limit).all()
+    sort_key = (User.id,)
+    result = await db.execute(paginate(select(User), sort_key, skip, limit, after))
+    users, next_cursor = split_page(result.scalars().all(), sort_key, limit)
+    
+    if next_cursor:
+        response.headers["X-Next-Cursor"] = next_cursor
     return users
 
 
@@ -58,15 +69,56 @@ async def get_all_users(
 async def get_user_by_id(
     user_id: int,
     current_admin: User = Depends(get_current_admin),
-    db: Session = Depends(get_db)
+    db: AsyncSession = Depends(get_db)
 ):
     """
     Получить пользователя по ID (только для администраторов)
     """
-    user = db.query(User).filter(User.id == user_id).first()
+    user = await db.get(User, user_id)
     if not user:
         raise HTTPException(
             status_code=status.HTTP_404_NOT_FOUND,
             detail="Пользователь не найден"
         )
     return user
+
+
+async def _set_user_active(db: AsyncSession, user_id: int, is_active: bool) -> User:
+    """Activate or deactivate user and drop the cached snapshot"""
+    user = await db.get(User, user_id)
+    if not user:
+        raise HTTPException(
+            status_code=status.HTTP_404_NOT_FOUND,
+            detail="Пользователь не найден"
+        )
+    
+    user.is_active = is_active
+    await db.commit()
+    await db.refresh(user)
+    invalidate_user(user.id)
+    
+    return user
+
+
+@router.post("/{user_id}/deactivate", response_model=UserResponse)
+async def deactivate_user(
+    user_id: int,
+    current_admin: User = Depends(get_current_admin),
+    db: AsyncSession = Depends(get_db)
+):
+    """
+    Деактивировать пользователя (только для администраторов)
+    """
+    return await _set_user_active(db, user_id, False)
+
+
+@router.post("/{user_id}/activate", response_model=UserResponse)
+async def activate_user(
+    user_id: int,
+    current_admin: User = Depends(get_current_admin),
+    db: AsyncSession = Depends(get_db)
+):
+    """
+    Активировать пользователя (только для администраторов)
+    """
+    return await _set_user_active(db, user_id, True)
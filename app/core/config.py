@@ -18,10 +18,66 @@ class Settings(BaseSettings):
     POSTGRES_PASSWORD: str = "dwc_password"
     POSTGRES_DB: str = "dwc_shop"
     
+    # Database pool (per worker process)
+    DB_POOL_SIZE: int = 10
+    DB_MAX_OVERFLOW: int = 10
+    DB_POOL_TIMEOUT: float = 30  # Seconds to wait for a free connection
+    DB_POOL_RECYCLE: int = 1800  # Seconds before a connection is replaced
+    DB_POOL_PRE_PING: bool = False  # Ping connection on every checkout
+    
+    # Read replicas (same pool settings as the primary)
+    DATABASE_REPLICA_URLS: List[str] = []  # JSON list, e.g. ["postgresql://...@replica1/dwc_shop"]
+    DB_REPLICA_RETRY_SECONDS: float = 30  # Skip an unreachable replica this long
+    DB_REPLICA_STICKY_SECONDS: float = 10  # Reads go to the primary this long after a client writes
+    
+    # SQL logging
+    DB_ECHO: bool = False  # Echo every statement (local debugging only)
+    SLOW_QUERY_THRESHOLD_MS: float = 200
+    QUERY_LOG_SAMPLE_RATE: float = 0.0  # Fraction of other statements to log
+    QUERY_STATS_MAX_STATEMENTS: int = 500
+    
+    # Catalog
+    CATALOG_SNAPSHOT_TTL_SECONDS: float = 30  # full reload interval of the in-memory catalog, 0 disables it
+    CATALOG_STATIC_MAX_AGE_SECONDS: int = 3600  # Cache-Control max-age of static product data
+    CATALOG_AVAILABILITY_TTL_SECONDS: float = 1.0  # hot cache of stock and wave counters
+    CATALOG_AVAILABILITY_CACHE_SIZE: int = 10000
+    CATALOG_AVAILABILITY_MAX_IDS: int = 200
+    PRODUCT_IMPORT_MAX_ROWS: int = 20000  # rows per POST /products/bulk upload
+    PRODUCT_IMPORT_BATCH_SIZE: int = 500  # products per INSERT ... ON CONFLICT statement
+    PRODUCT_STOCK_SYNC_MAX_ITEMS: int = 10000  # items per PATCH /products/stock request
+    
+    # Product search
+    SEARCH_INDEX_TTL_SECONDS: float = 30  # rebuild interval of the in-memory search index used without PostgreSQL
+    
+    # Pagination
+    PAGINATION_COUNT_CACHE_TTL_SECONDS: float = 30
+    
+    # Export
+    EXPORT_BATCH_SIZE: int = 1000  # rows fetched from the cursor per CSV chunk
+    EXPORT_COLUMNAR_BATCH_SIZE: int = 50000  # rows per Parquet row group / Arrow batch
+    
+    # Analytics
+    ANALYTICS_ROLLUPS_ENABLED: bool = True  # serve past days from daily rollup tables
+    ANALYTICS_ROLLUP_INTERVAL_SECONDS: float = 60
+    ANALYTICS_CACHE_BACKEND: str = "memory"  # memory | redis
+    ANALYTICS_CACHE_REDIS_URL: str = "redis://localhost:6379/0"  # local:// for an in-process stand-in
+    ANALYTICS_CACHE_TTL_SECONDS: float = 30  # 0 disables the cache
+    ANALYTICS_CACHE_SIZE: int = 256
+    
+    # Inventory
+    INVENTORY_RESERVATION_MODE: str = "lock"  # lock | atomic | ledger
+    INVENTORY_HOLD_TTL_SECONDS: int = 900
+    INVENTORY_FLUSH_INTERVAL_SECONDS: float = 1.0
+    
     # Security
     SECRET_KEY: str = "dwc-secret-key-change-this-in-production-12345678"
     ALGORITHM: str = "HS256"
     ACCESS_TOKEN_EXPIRE_HOURS: int = 24
+    AUTH_CACHE_TTL_SECONDS: float = 60  # 0 disables token/user caching
+    AUTH_CACHE_SIZE: int = 10000
+    BCRYPT_ROUNDS: int = 12
+    PASSWORD_HASH_WORKERS: int = 4
+    PASSWORD_HASH_QUEUE_SIZE: int = 32  # waiting hashes above this get 429
     
     # Admin
     ADMIN_PHONE: str = "+79999999999"
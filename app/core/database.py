@@ -1,26 +1,181 @@
-from sqlalchemy import create_engine
+import threading
+import time
+from typing import Dict
+
+from sqlalchemy import create_engine, exc
+from sqlalchemy.engine import make_url
+from sqlalchemy.ext.asyncio import create_async_engine, async_sessionmaker, AsyncEngine, AsyncSession
 from sqlalchemy.ext.declarative import declarative_base
 from sqlalchemy.orm import sessionmaker
+from sqlalchemy.pool import AsyncAdaptedQueuePool
+from starlette.requests import Request
 from app.core.config import settings
+from app.core.metrics import LatencyHistogram
+from app.core.query_log import install_query_logging
+from app.core.replicas import ReplicaSet, reads_from_primary
+
+# Async drivers for the sync URLs used in settings
+ASYNC_DRIVERS = {
+    "postgresql": "postgresql+asyncpg",
+    "postgresql+psycopg2": "postgresql+asyncpg",
+    "sqlite": "sqlite+aiosqlite",
+}
+
+
+def get_async_database_url(database_url: str) -> str:
+    """Convert sync database URL to its async driver equivalent"""
+    url = make_url(database_url)
+    drivername = ASYNC_DRIVERS.get(url.drivername, url.drivername)
+    return url.set(drivername=drivername).render_as_string(hide_password=False)
+
+
+class PoolStats:
+    """Checkout counters for a connection pool"""
+
+    def __init__(self):
+        self.checkout_latency = LatencyHistogram()
+        self.checkouts = 0
+        self.timeouts = 0
+        self.wait_seconds_total = 0.0
+        self._lock = threading.Lock()
+
+    def observe_checkout(self, seconds: float, timed_out: bool = False) -> None:
+        """Record one checkout attempt"""
+        with self._lock:
+            self.checkouts += 1
+            self.wait_seconds_total += seconds
+            if timed_out:
+                self.timeouts += 1
+        self.checkout_latency.observe(seconds * 1000)
+
+
+class InstrumentedAsyncPool(AsyncAdaptedQueuePool):
+    """Queue pool that measures how long each checkout waits for a connection"""
+
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        self.stats = PoolStats()
+
+    def _do_get(self):
+        start = time.perf_counter()
+        timed_out = False
+        try:
+            return super()._do_get()
+        except exc.TimeoutError:
+            timed_out = True
+            raise
+        finally:
+            self.stats.observe_checkout(time.perf_counter() - start, timed_out)
+
+    def recreate(self):
+        # Keep counters when the engine is disposed
+        pool = super().recreate()
+        pool.stats = self.stats
+        return pool
+
+
+def get_pool_stats(engine: AsyncEngine) -> Dict:
+    """Get pool usage and checkout statistics for async engine"""
+    pool = engine.sync_engine.pool
+    info = {
+        "pool_size": pool.size(),
+        "max_overflow": settings.DB_MAX_OVERFLOW,
+        "checked_out": pool.checkedout(),
+        "checked_in": pool.checkedin(),
+        "overflow_in_use": max(pool.overflow(), 0),
+    }
+
+    stats = getattr(pool, "stats", None)
+    if stats is not None:
+        info.update({
+            "checkouts": stats.checkouts,
+            "timeouts": stats.timeouts,
+            "wait_seconds_total": round(stats.wait_seconds_total, 6),
+            "checkout_latency": stats.checkout_latency.snapshot(),
+        })
 
-# Create SQLAlchemy engine
+    return info
+
+
+# Create SQLAlchemy engine (used by scripts and init_db)
 engine = create_engine(
     settings.DATABASE_URL,
     pool_pre_ping=True,
-    echo=settings.DEBUG
+    echo=settings.DB_ECHO
 )
 
 # Create SessionLocal class
 SessionLocal = sessionmaker(autocommit=False, autoflush=False, bind=engine)
 
+
+
+def create_instrumented_async_engine(database_url: str) -> AsyncEngine:
+    """Create async engine with the configured pool and query logging"""
+    async_engine = create_async_engine(
+        get_async_database_url(database_url),
+        poolclass=InstrumentedAsyncPool,
+        pool_size=settings.DB_POOL_SIZE,
+        max_overflow=settings.DB_MAX_OVERFLOW,
+        pool_timeout=settings.DB_POOL_TIMEOUT,
+        pool_recycle=settings.DB_POOL_RECYCLE,
+        pool_pre_ping=settings.DB_POOL_PRE_PING,
+        echo=settings.DB_ECHO
+    )
+    install_query_logging(async_engine.sync_engine)
+    return async_engine
+
+
+# Create async engine (used by API endpoints)
+async_engine = create_instrumented_async_engine(settings.DATABASE_URL)
+
+# Create AsyncSessionLocal class
+AsyncSessionLocal = async_sessionmaker(
+    bind=async_engine,
+    class_=AsyncSession,
+    autoflush=False,
+    expire_on_commit=False
+)
+
+# Read replicas (analytics, exports, catalog and page reads)
+replica_set = ReplicaSet(
+    settings.DATABASE_REPLICA_URLS,
+    create_instrumented_async_engine,
+    retry_seconds=settings.DB_REPLICA_RETRY_SECONDS
+)
+
 # Create Base class for models
 Base = declarative_base()
 
 
-def get_db():
-    """Dependency for getting database session"""
-    db = SessionLocal()
-    try:
+async def get_db():
+    """Dependency for getting async database session"""
+    async with AsyncSessionLocal() as db:
         yield db
-    finally:
-        db.close()
+
+
+async def open_read_session(primary: bool = False) -> AsyncSession:
+    """
+    Open async session for reads
+
+    Uses the next reachable read replica, or the primary when no replicas
+    are configured, all of them are down or primary is requested.
+    """
+    db = None
+    if replica_set and not primary:
+        db = await replica_set.session()
+    elif replica_set:
+        replica_set.primary_reads += 1
+    return db if db is not None else AsyncSessionLocal()
+
+
+async def get_read_db(request: Request):
+    """Dependency for getting async session for read-only endpoints (replica unless the client has just written)"""
+    async with await open_read_session(primary=reads_from_primary(request)) as db:
+        try:
+            yield db
+        except exc.DBAPIError as error:
+            # Connection lost mid-request: skip the replica for a while
+            replica = db.info.get("replica")
+            if replica is not None and error.connection_invalidated:
+                replica.mark_failed(error)
+            raise
@@ -0,0 +1,61 @@
+"""
+In-process metrics primitives
+"""
+import threading
+from bisect import bisect_left
+from typing import Dict, Sequence
+
+# Default latency buckets in milliseconds
+DEFAULT_BUCKETS_MS = (1, 2, 5, 10, 25, 50, 100, 250, 500, 1000, 2500, 5000)
+
+
+class LatencyHistogram:
+    """Latency histogram with fixed upper-bound buckets (milliseconds), reported cumulatively"""
+
+    def __init__(self, buckets_ms: Sequence[float] = DEFAULT_BUCKETS_MS):
+        self.buckets_ms = tuple(sorted(buckets_ms))
+        self._counts = [0] * (len(self.buckets_ms) + 1)
+        self._count = 0
+        self._sum_ms = 0.0
+        self._max_ms = 0.0
+        self._lock = threading.Lock()
+
+    def observe(self, value_ms: float) -> None:
+        """Record one observation"""
+        idx = bisect_left(self.buckets_ms, value_ms)
+        with self._lock:
+            self._counts[idx] += 1
+            self._count += 1
+            self._sum_ms += value_ms
+            if value_ms > self._max_ms:
+                self._max_ms = value_ms
+
+    def reset(self) -> None:
+        """Drop all observations"""
+        with self._lock:
+            self._counts = [0] * (len(self.buckets_ms) + 1)
+            self._count = 0
+            self._sum_ms = 0.0
+            self._max_ms = 0.0
+
+    def snapshot(self) -> Dict:
+        """Get histogram state as a dict"""
+        with self._lock:
+            counts = list(self._counts)
+            count, sum_ms, max_ms = self._count, self._sum_ms, self._max_ms
+
+        # Like Prometheus "le" buckets: observations at or below each bound
+        buckets = {}
+        cumulative = 0
+        for bound, n in zip(self.buckets_ms, counts):
+            cumulative += n
+            buckets[f"le_{bound:g}ms"] = cumulative
+        buckets["le_inf"] = cumulative + counts[-1]
+
+        return {
+            "count": count,
+            "sum_ms": round(sum_ms, 3),
+            "avg_ms": round(sum_ms / count, 3) if count else 0,
+            "max_ms": round(max_ms, 3),
+            "buckets": buckets,
+        }
@@ -0,0 +1,158 @@
+"""
+SQL query logging: per-statement timing, slow/sampled log and statement stats
+"""
+import logging
+import random
+import re
+import threading
+import time
+from contextvars import ContextVar
+from functools import lru_cache
+from typing import Dict, List, Optional
+
+from sqlalchemy import event
+from sqlalchemy.engine import Engine
+
+from app.core.config import settings
+
+logger = logging.getLogger("app.db.queries")
+
+# Statements are stored under this key once the stats table is full
+OTHER_STATEMENTS = "<other>"
+
+_WHITESPACE = re.compile(r"\s+")
+_STRING_LITERAL = re.compile(r"'(?:[^']|'')*'")
+_NUMBER_LITERAL = re.compile(r"\b\d+(?:\.\d+)?\b")
+_BIND_PARAM = re.compile(r"%\([^)]+\)s|\$\d+|(?<!:):[a-zA-Z_]\w*|\?|%s")
+_POSTCOMPILE = re.compile(r"\(?__\[POSTCOMPILE_\w+\]\)?")
+_PARAM_LIST = re.compile(r"\(\s*\?(?:\s*,\s*\?)*\s*\)")
+_VALUES_LIST = re.compile(r"(VALUES\s*\(\.\.\.\))(?:\s*,\s*\(\.\.\.\))+", re.IGNORECASE)
+
+
+@lru_cache(maxsize=2048)
+def normalize_statement(statement: str) -> str:
+    """Replace literals and parameters so that equal queries share one key"""
+    sql = _WHITESPACE.sub(" ", statement).strip()
+    sql = _STRING_LITERAL.sub("?", sql)
+    sql = _POSTCOMPILE.sub("(...)", sql)
+    sql = _BIND_PARAM.sub("?", sql)
+    sql = _NUMBER_LITERAL.sub("?", sql)
+    sql = _PARAM_LIST.sub("(...)", sql)
+    sql = _VALUES_LIST.sub(r"\1", sql)
+    return sql
+
+
+class QueryStats:
+    """Aggregated counts and durations per normalized statement"""
+
+    def __init__(self, max_statements: int = 500):
+        self.max_statements = max_statements
+        self._stats: Dict[str, List[float]] = {}
+        self._lock = threading.Lock()
+
+    def record(self, statement: str, duration_ms: float) -> None:
+        """Record one statement execution"""
+        with self._lock:
+            entry = self._stats.get(statement)
+            if entry is None:
+                if len(self._stats) >= self.max_statements:
+                    statement = OTHER_STATEMENTS
+                entry = self._stats.setdefault(statement, [0, 0.0, 0.0])
+            entry[0] += 1
+            entry[1] += duration_ms
+            if duration_ms > entry[2]:
+                entry[2] = duration_ms
+
+    def reset(self) -> None:
+        """Drop all collected stats"""
+        with self._lock:
+            self._stats.clear()
+
+    def top(self, limit: int = 50, order_by: str = "total_ms") -> List[Dict]:
+        """Get statements sorted by total time, count or max time"""
+        with self._lock:
+            rows = [
+                {
+                    "statement": statement,
+                    "count": int(count),
+                    "total_ms": round(total_ms, 3),
+                    "avg_ms": round(total_ms / count, 3) if count else 0,
+                    "max_ms": round(max_ms, 3),
+                }
+                for statement, (count, total_ms, max_ms) in self._stats.items()
+            ]
+        rows.sort(key=lambda row: row[order_by], reverse=True)
+        return rows[:limit]
+
+
+# Singleton instance
+query_stats = QueryStats(max_statements=settings.QUERY_STATS_MAX_STATEMENTS)
+
+
+class QueryCounter:
+    """Count statements executed inside a with block, including tasks started in it"""
+
+    def __init__(self):
+        self.statements: List[str] = []
+        self._token = None
+
+    @property
+    def count(self) -> int:
+        return len(self.statements)
+
+    def __enter__(self) -> "QueryCounter":
+        self._token = _query_counter.set(self)
+        return self
+
+    def __exit__(self, *exc_info) -> None:
+        _query_counter.reset(self._token)
+
+
+_query_counter: ContextVar[Optional[QueryCounter]] = ContextVar("query_counter", default=None)
+
+
+def _before_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+    conn.info.setdefault("query_start_time", []).append(time.perf_counter())
+
+
+def _after_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+    start_times = conn.info.get("query_start_time")
+    if not start_times:
+        return
+    duration_ms = (time.perf_counter() - start_times.pop()) * 1000
+
+    normalized = normalize_statement(statement)
+    query_stats.record(normalized, duration_ms)
+
+    counter = _query_counter.get()
+    if counter is not None:
+        counter.statements.append(normalized)
+
+    if duration_ms >= settings.SLOW_QUERY_THRESHOLD_MS:
+        logger.warning("Slow query (%.1f ms): %s", duration_ms, normalized)
+    elif settings.QUERY_LOG_SAMPLE_RATE > 0 and random.random() < settings.QUERY_LOG_SAMPLE_RATE:
+        logger.info("Query (%.1f ms): %s", duration_ms, normalized)
+
+
+def _handle_error(context):
+    # Failed statements never reach after_cursor_execute
+    if context.connection is not None:
+        start_times = context.connection.info.get("query_start_time")
+        if start_times:
+            start_times.pop()
+
+
+def install_query_logging(engine: Engine) -> None:
+    """Attach timing hooks to engine (use AsyncEngine.sync_engine for async engines)"""
+    if event.contains(engine, "before_cursor_execute", _before_cursor_execute):
+        return
+
+    event.listen(engine, "before_cursor_execute", _before_cursor_execute)
+    event.listen(engine, "after_cursor_execute", _after_cursor_execute)
+    event.listen(engine, "handle_error", _handle_error)
+
+    if not logger.handlers and not logging.getLogger().handlers:
+        handler = logging.StreamHandler()
+        handler.setFormatter(logging.Formatter("%(levelname)s [%(name)s] %(message)s"))
+        logger.addHandler(handler)
+        logger.setLevel(logging.INFO)
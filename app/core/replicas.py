@@ -0,0 +1,172 @@
+"""
+Read replica routing: round-robin selection with failover and read-your-writes stickiness
+"""
+import asyncio
+import itertools
+import logging
+import time
+from typing import Callable, Dict, List, Optional
+
+from sqlalchemy import exc
+from sqlalchemy.engine import make_url
+from sqlalchemy.ext.asyncio import AsyncEngine, AsyncSession, async_sessionmaker
+from starlette.datastructures import MutableHeaders
+from starlette.requests import HTTPConnection
+
+logger = logging.getLogger("app.db.replicas")
+
+# Cookie sending a client's reads to the primary for a while after it wrote
+PRIMARY_COOKIE = "db_read_primary_until"
+
+SAFE_METHODS = {"GET", "HEAD", "OPTIONS"}
+
+# Errors meaning the replica could not be reached
+CONNECT_ERRORS = (exc.DBAPIError, OSError, asyncio.TimeoutError)
+
+
+class Replica:
+    """One read replica with its engine and health state"""
+
+    def __init__(self, url: str, engine: AsyncEngine):
+        self.url = make_url(url).render_as_string(hide_password=True)
+        self.engine = engine
+        self.session_factory = async_sessionmaker(
+            bind=engine,
+            class_=AsyncSession,
+            autoflush=False,
+            expire_on_commit=False
+        )
+        self.healthy = True
+        self.failed_at = 0.0
+        self.sessions = 0
+        self.failures = 0
+        self.last_error: Optional[str] = None
+
+    def mark_failed(self, error: BaseException) -> None:
+        if self.healthy:
+            logger.warning("Read replica %s is unavailable: %s", self.url, error)
+        self.healthy = False
+        self.failed_at = time.monotonic()
+        self.failures += 1
+        self.last_error = f"{type(error).__name__}: {error}"
+
+    def mark_healthy(self) -> None:
+        if not self.healthy:
+            logger.info("Read replica %s is back", self.url)
+        self.healthy = True
+
+
+class ReplicaSet:
+    """
+    Read replicas used round-robin
+
+    A replica whose connection fails is skipped for retry_seconds, then tried
+    again by the next request. When no replica can be reached reads go to the
+    primary.
+    """
+
+    def __init__(self, urls: List[str], create_engine: Callable[[str], AsyncEngine], retry_seconds: float = 30.0):
+        self.replicas = [Replica(url, create_engine(url)) for url in urls]
+        self.retry_seconds = retry_seconds
+        self.primary_reads = 0
+        self.fallbacks = 0
+        self._next = itertools.count()
+
+    def __bool__(self) -> bool:
+        return bool(self.replicas)
+
+    def _candidates(self) -> List[Replica]:
+        now = time.monotonic()
+        start = next(self._next) % len(self.replicas)
+        ordered = self.replicas[start:] + self.replicas[:start]
+        return [
+            replica for replica in ordered
+            if replica.healthy or now - replica.failed_at >= self.retry_seconds
+        ]
+
+    async def session(self) -> Optional[AsyncSession]:
+        """
+        Open session on the next reachable replica
+
+        Returns:
+            Session with a connection already checked out, or None if every
+            replica is down
+        """
+        for replica in self._candidates():
+            db = replica.session_factory()
+            try:
+                await db.connection()
+            except CONNECT_ERRORS as error:
+                await db.close()
+                replica.mark_failed(error)
+                continue
+            replica.mark_healthy()
+            replica.sessions += 1
+            db.info["replica"] = replica
+            return db
+        self.fallbacks += 1
+        return None
+
+    async def dispose(self) -> None:
+        for replica in self.replicas:
+            await replica.engine.dispose()
+
+    def stats(self, pool_stats: Callable[[AsyncEngine], Dict]) -> dict:
+        return {
+            "retry_seconds": self.retry_seconds,
+            "primary_reads": self.primary_reads,
+            "fallbacks": self.fallbacks,
+            "replicas": [
+                {
+                    "url": replica.url,
+                    "healthy": replica.healthy,
+                    "sessions": replica.sessions,
+                    "failures": replica.failures,
+                    "last_error": replica.last_error,
+                    "pool": pool_stats(replica.engine),
+                }
+                for replica in self.replicas
+            ],
+        }
+
+
+def reads_from_primary(connection: HTTPConnection) -> bool:
+    """Check whether the client wrote recently and must read its own writes"""
+    value = connection.cookies.get(PRIMARY_COOKIE)
+    if not value:
+        return False
+    try:
+        return float(value) > time.time()
+    except ValueError:
+        return False
+
+
+class PrimaryStickinessMiddleware:
+    """
+    ASGI middleware marking clients that changed data
+
+    Successful unsafe requests (checkout, payment, admin edits) set a cookie
+    for sticky_seconds, so reads routed to replicas come from the primary
+    until replication has caught up.
+    """
+
+    def __init__(self, app, sticky_seconds: float = 10.0):
+        self.app = app
+        self.sticky_seconds = sticky_seconds
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http" or scope["method"] in SAFE_METHODS:
+            await self.app(scope, receive, send)
+            return
+
+        async def send_with_cookie(message):
+            if message["type"] == "http.response.start" and message["status"] < 400:
+                until = int(time.time() + self.sticky_seconds) + 1
+                headers = MutableHeaders(scope=message)
+                headers.append(
+                    "set-cookie",
+                    f"{PRIMARY_COOKIE}={until}; Max-Age={int(self.sticky_seconds) + 1}; Path=/; HttpOnly; SameSite=lax"
+                )
+            await send(message)
+
+        await self.app(scope, receive, send_with_cookie)
@@ -1,21 +1,37 @@
+import asyncio
+import time
+from concurrent.futures import ThreadPoolExecutor
 from datetime import datetime, timedelta
-from typing import Optional
+from typing import Callable, Dict, Optional, Tuple
 from jose import JWTError, jwt
 from passlib.context import CryptContext
 from fastapi import HTTPException, status, Depends
 from fastapi.security import HTTPBearer, HTTPAuthorizationCredentials
-from sqlalchemy.orm import Session
+from sqlalchemy import select
+from sqlalchemy.ext.asyncio import AsyncSession
 
 from app.core.config import settings
 from app.core.database import get_db
+from app.core.metrics import LatencyHistogram
 from app.models.user import User
+from app.utils.cache import TTLCache
 
-# Password hashing
-pwd_context = CryptContext(schemes=["bcrypt"], deprecated="auto")
+# Password hashing; hashes with other rounds are upgraded on login
+pwd_context = CryptContext(
+    schemes=["bcrypt"],
+    deprecated="auto",
+    bcrypt__rounds=settings.BCRYPT_ROUNDS
+)
 
 # Security scheme
 security = HTTPBearer()
 
+# Verified token -> user ID, and user ID -> user snapshot without password hash.
+# Both live in one worker; a snapshot is only used while users.updated_at still
+# matches it, so changes made through any worker take effect on the next request
+token_cache = TTLCache(maxsize=settings.AUTH_CACHE_SIZE, ttl=settings.AUTH_CACHE_TTL_SECONDS)
+user_cache = TTLCache(maxsize=settings.AUTH_CACHE_SIZE, ttl=settings.AUTH_CACHE_TTL_SECONDS)
+
 
 def verify_password(plain_password: str, hashed_password: str) -> bool:
     """Verify password against hash"""
@@ -27,6 +43,66 @@ def get_password_hash(password: str) -> str:
     return pwd_context.hash(password)
 
 
+class PasswordHashPool:
+    """Bounded thread pool that keeps bcrypt off the event loop"""
+
+    def __init__(self, workers: int, queue_size: int):
+        self.workers = workers
+        self.limit = workers + queue_size
+        self.in_flight = 0
+        self.rejected = 0
+        self.latency = LatencyHistogram()
+        self._executor = ThreadPoolExecutor(max_workers=workers, thread_name_prefix="bcrypt")
+
+    async def run(self, func: Callable, *args):
+        """Run func in the pool, 429 if all workers and queue slots are busy"""
+        if self.in_flight >= self.limit:
+            self.rejected += 1
+            raise HTTPException(
+                status_code=status.HTTP_429_TOO_MANY_REQUESTS,
+                detail="Слишком много запросов, повторите попытку позже",
+                headers={"Retry-After": "1"}
+            )
+        
+        self.in_flight += 1
+        start = time.perf_counter()
+        try:
+            return await asyncio.get_running_loop().run_in_executor(self._executor, func, *args)
+        finally:
+            self.in_flight -= 1
+            self.latency.observe((time.perf_counter() - start) * 1000)
+
+    def stats(self) -> Dict:
+        """Get pool usage counters"""
+        return {
+            "workers": self.workers,
+            "limit": self.limit,
+            "in_flight": self.in_flight,
+            "rejected": self.rejected,
+            "bcrypt_rounds": settings.BCRYPT_ROUNDS,
+            "latency": self.latency.snapshot(),
+        }
+
+    def shutdown(self) -> None:
+        self._executor.shutdown(wait=False, cancel_futures=True)
+
+
+password_hash_pool = PasswordHashPool(
+    workers=settings.PASSWORD_HASH_WORKERS,
+    queue_size=settings.PASSWORD_HASH_QUEUE_SIZE
+)
+
+
+async def verify_password_async(plain_password: str, hashed_password: str) -> Tuple[bool, Optional[str]]:
+    """Verify password in hash pool; also returns new hash if it needs rehashing"""
+    return await password_hash_pool.run(pwd_context.verify_and_update, plain_password, hashed_password)
+
+
+async def get_password_hash_async(password: str) -> str:
+    """Hash password in hash pool"""
+    return await password_hash_pool.run(pwd_context.hash, password)
+
+
 def create_access_token(data: dict, expires_delta: Optional[timedelta] = None) -> str:
     """Create JWT access token"""
     to_encode = data.copy()
@@ -54,29 +130,64 @@ def decode_token(token: str) -> dict:
         )
 
 
+def _user_snapshot(user: User) -> Dict:
+    """Copy user columns except the password hash"""
+    return {
+        column.key: getattr(user, column.key)
+        for column in User.__table__.columns
+        if column.key != "password_hash"
+    }
+
+
+def invalidate_user(user_id: int) -> None:
+    """Drop cached user snapshot after profile or status change (this worker only)"""
+    user_cache.pop(user_id)
+
+
 async def get_current_user(
     credentials: HTTPAuthorizationCredentials = Depends(security),
-    db: Session = Depends(get_db)
+    db: AsyncSession = Depends(get_db)
 ) -> User:
-    """Get current authenticated user"""
+    """Get current authenticated user (detached snapshot, checked against users.updated_at)"""
     token = credentials.credentials
-    payload = decode_token(token)
     
-    user_id: int = payload.get("sub")
+    user_id = token_cache.get(token)
     if user_id is None:
-        raise HTTPException(
-            status_code=status.HTTP_401_UNAUTHORIZED,
-            detail="Не удалось проверить учётные данные"
-        )
+        payload = decode_token(token)
+        
+        user_id = payload.get("sub")
+        if user_id is None:
+            raise HTTPException(
+                status_code=status.HTTP_401_UNAUTHORIZED,
+                detail="Не удалось проверить учётные данные"
+            )
+        
+        user_id = int(user_id)
+        token_cache.set(token, user_id, ttl=payload.get("exp", 0) - time.time())
+    
+    snapshot = user_cache.get(user_id)
+    if snapshot is not None:
+        # Other workers cannot drop this cache: a newer row means a stale snapshot
+        updated_at = await db.scalar(select(User.updated_at).where(User.id == user_id))
+        if updated_at != snapshot["updated_at"]:
+            snapshot = None
+    if snapshot is None:
+        user = await db.get(User, user_id)
+        if user is None:
+            raise HTTPException(
+                status_code=status.HTTP_401_UNAUTHORIZED,
+                detail="Пользователь не найден"
+            )
+        snapshot = _user_snapshot(user)
+        user_cache.set(user_id, snapshot)
     
-    user = db.query(User).filter(User.id == user_id).first()
-    if user is None:
+    if not snapshot["is_active"]:
         raise HTTPException(
-            status_code=status.HTTP_401_UNAUTHORIZED,
-            detail="Пользователь не найден"
+            status_code=status.HTTP_403_FORBIDDEN,
+            detail="Аккаунт деактивирован"
         )
     
-    return user
+    return User(**snapshot)
 
 
 async def get_current_admin(
@@ -1,10 +1,17 @@
+import asyncio
+
 from fastapi import FastAPI
 from fastapi.middleware.cors import CORSMiddleware
 from contextlib import asynccontextmanager
 
 from app.core.config import settings
-from app.core.database import engine
+from app.core.database import async_engine, replica_set
+from app.core.replicas import PrimaryStickinessMiddleware
+from app.core.security import password_hash_pool
 from app.api import api_router
+from app.services.inventory import inventory_service, MODE_LEDGER
+from app.services.rollups import rollup_service
+from app.services.analytics_cache import analytics_cache
 
 
 @asynccontextmanager
@@ -12,9 +19,36 @@ async def lifespan(app: FastAPI):
     """Lifecycle manager for FastAPI application"""
     # Startup
     print("🚀 Starting DWC Shop Backend...")
+    reconciliation = None
+    if inventory_service.mode == MODE_LEDGER:
+        reconciliation = asyncio.create_task(
+            inventory_service.run_reconciliation(settings.INVENTORY_FLUSH_INTERVAL_SECONDS)
+        )
+    rollup_refresh = None
+    if rollup_service.enabled:
+        rollup_refresh = asyncio.create_task(
+            rollup_service.run_refresh(settings.ANALYTICS_ROLLUP_INTERVAL_SECONDS)
+        )
     yield
     # Shutdown
     print("👋 Shutting down DWC Shop Backend...")
+    if rollup_refresh:
+        rollup_refresh.cancel()
+        try:
+            await rollup_refresh
+        except asyncio.CancelledError:
+            pass
+    if reconciliation:
+        # Cancelling flushes confirmed stock one last time
+        reconciliation.cancel()
+        try:
+            await reconciliation
+        except asyncio.CancelledError:
+            pass
+    password_hash_pool.shutdown()
+    await analytics_cache.close()
+    await replica_set.dispose()
+    await async_engine.dispose()
 
 
 app = FastAPI(
@@ -35,6 +69,10 @@ app.add_middleware(
     allow_headers=["*"],
 )
 
+# Read-your-writes: clients that just wrote read from the primary
+if replica_set:
+    app.add_middleware(PrimaryStickinessMiddleware, sticky_seconds=settings.DB_REPLICA_STICKY_SECONDS)
+
 # Include API router
 app.include_router(api_router, prefix="/api/v1")
 
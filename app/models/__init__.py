@@ -4,6 +4,7 @@ from app.models.order import Order, OrderItem
 from app.models.promo_code import PromoCode
 from app.models.page import Page
 from app.models.preorder import PreorderStatus, PreorderWave
+from app.models.analytics import DailyOrderStats, DailyPreorderStats
 
 __all__ = [
     "User",
@@ -15,4 +16,6 @@ __all__ = [
     "Page",
     "PreorderStatus",
     "PreorderWave",
+    "DailyOrderStats",
+    "DailyPreorderStats",
 ]
@@ -0,0 +1,51 @@
+from sqlalchemy import Column, Integer, Float, Date, DateTime, Index
+from datetime import datetime
+
+from app.core.database import Base
+
+# Wave stored for preorder items without one: a NULL wave would escape the (day, wave) unique index
+NO_WAVE = 0
+
+
+class DailyOrderStats(Base):
+    """Daily order stats - агрегаты аналитики за день"""
+    __tablename__ = "daily_order_stats"
+
+    day = Column(Date, primary_key=True)
+
+    # Paid orders
+    revenue = Column(Float, nullable=False, default=0)
+    paid_orders = Column(Integer, nullable=False, default=0)
+    products_sold = Column(Integer, nullable=False, default=0)
+
+    # All orders
+    orders_with_promo = Column(Integer, nullable=False, default=0)
+    orders_without_promo = Column(Integer, nullable=False, default=0)
+    discount_total = Column(Float, nullable=False, default=0)
+    preorders = Column(Integer, nullable=False, default=0)
+
+    # Customers
+    new_customers = Column(Integer, nullable=False, default=0)
+    new_buyers = Column(Integer, nullable=False, default=0)  # First order placed this day
+
+    # Start of the refresh that wrote the row
+    refreshed_at = Column(DateTime, nullable=False, default=datetime.utcnow)
+
+    def __repr__(self):
+        return f"<DailyOrderStats {self.day}>"
+
+
+class DailyPreorderStats(Base):
+    """Daily preorder stats - предзаказы за день по волнам"""
+    __tablename__ = "daily_preorder_stats"
+    __table_args__ = (
+        Index("ix_daily_preorder_stats_day_wave", "day", "wave", unique=True),
+    )
+
+    id = Column(Integer, primary_key=True)
+    day = Column(Date, nullable=False)
+    wave = Column(Integer, nullable=False, default=NO_WAVE)
+    preorders = Column(Integer, nullable=False, default=0)
+
+    def __repr__(self):
+        return f"<DailyPreorderStats {self.day} wave {self.wave}>"
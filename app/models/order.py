@@ -1,4 +1,4 @@
-from sqlalchemy import Column, Integer, String, Float, DateTime, Enum, ForeignKey, Boolean, Text
+from sqlalchemy import Column, Integer, String, Float, DateTime, Enum, ForeignKey, Boolean, Text, Index, text
 from sqlalchemy.orm import relationship
 from datetime import datetime
 import enum
@@ -27,6 +27,26 @@ class PaymentStatus(str, enum.Enum):
 class Order(Base):
     """Order model - заказы"""
     __tablename__ = "orders"
+    __table_args__ = (
+        # Order lists: per user, all orders and by status, newest first
+        Index("ix_orders_user_id_created_at", "user_id", "created_at", "id"),
+        Index("ix_orders_created_at_id", "created_at", "id"),
+        Index("ix_orders_status_created_at", "status", "created_at", "id"),
+        # Analytics over paid orders
+        Index(
+            "ix_orders_paid_created_at", "created_at",
+            postgresql_where=text("payment_status = 'SUCCEEDED'"),
+            sqlite_where=text("payment_status = 'SUCCEEDED'")
+        ),
+        # Payment status, webhook and cancel lookups
+        Index(
+            "ix_orders_payment_id", "payment_id",
+            postgresql_where=text("payment_id IS NOT NULL"),
+            sqlite_where=text("payment_id IS NOT NULL")
+        ),
+        # Changed orders picked up by the analytics rollup refresh
+        Index("ix_orders_updated_at", "updated_at"),
+    )
 
     id = Column(Integer, primary_key=True, index=True)
     user_id = Column(Integer, ForeignKey("users.id"), nullable=False)
@@ -74,8 +94,8 @@ class OrderItem(Base):
     __tablename__ = "order_items"
 
     id = Column(Integer, primary_key=True, index=True)
-    order_id = Column(Integer, ForeignKey("orders.id"), nullable=False)
-    product_id = Column(Integer, ForeignKey("products.id"), nullable=False)
+    order_id = Column(Integer, ForeignKey("orders.id"), nullable=False, index=True)
+    product_id = Column(Integer, ForeignKey("products.id"), nullable=False, index=True)
     
     # Item details
     size = Column(String(50), nullable=False)
@@ -1,4 +1,5 @@
-from sqlalchemy import Column, Integer, String, Text, Float, Boolean, DateTime, Enum, ForeignKey, JSON
+from sqlalchemy import Column, Integer, String, Text, Float, Boolean, DateTime, Enum, ForeignKey, JSON, Index, DDL, event, func, cast, literal_column
+from sqlalchemy.dialects.postgresql import JSONB
 from sqlalchemy.orm import relationship
 from datetime import datetime
 import enum
@@ -22,6 +23,10 @@ class SizeType(str, enum.Enum):
 class Product(Base):
     """Product model - товары"""
     __tablename__ = "products"
+    __table_args__ = (
+        # Catalog listing filtered by archive/active flags, ordered by id
+        Index("ix_products_listing", "is_archived", "is_active", "id"),
+    )
 
     id = Column(Integer, primary_key=True, index=True)
     
@@ -55,7 +60,12 @@ class Product(Base):
     updated_at = Column(DateTime, default=datetime.utcnow, onupdate=datetime.utcnow)
     
     # Relationships
-    media = relationship("ProductMedia", back_populates="product", cascade="all, delete-orphan")
+    media = relationship(
+        "ProductMedia",
+        back_populates="product",
+        cascade="all, delete-orphan",
+        order_by="[ProductMedia.order, ProductMedia.id]"  # Carousel order
+    )
     order_items = relationship("OrderItem", back_populates="product")
     promo_codes = relationship("PromoCode", secondary="promo_code_products", back_populates="products")
 
@@ -63,12 +73,47 @@ class Product(Base):
         return f"<Product {self.article}: {self.name}>"
 
 
+# Text search configuration of the product search index
+SEARCH_CONFIG = "russian"
+
+
+def product_search_document():
+    """Full-text document of a product: the exact expression of ix_products_search_document"""
+    empty = literal_column("''")
+    return func.to_tsvector(
+        literal_column(f"'{SEARCH_CONFIG}'::regconfig"),
+        func.coalesce(Product.name, empty) + literal_column("' '") + func.coalesce(Product.description, empty)
+    )
+
+
+# Product search indexes (PostgreSQL only, see alembic/versions/004)
+event.listen(
+    Product.__table__,
+    "before_create",
+    DDL("CREATE EXTENSION IF NOT EXISTS pg_trgm").execute_if(dialect="postgresql")
+)
+# The expression has no leading column to find the table by, hence _table
+Index(
+    "ix_products_search_document", product_search_document(),
+    postgresql_using="gin", _table=Product.__table__
+).ddl_if(dialect="postgresql")
+Index(
+    "ix_products_article_trgm", Product.article,
+    postgresql_using="gin", postgresql_ops={"article": "gin_trgm_ops"}
+).ddl_if(dialect="postgresql")
+Index(
+    "ix_products_sizes", cast(Product.sizes, JSONB).label("sizes_jsonb"),
+    postgresql_using="gin", postgresql_ops={"sizes_jsonb": "jsonb_path_ops"}
+).ddl_if(dialect="postgresql")
+Index("ix_products_price", Product.price)
+
+
 class ProductMedia(Base):
     """Product media - фото товаров"""
     __tablename__ = "product_media"
 
     id = Column(Integer, primary_key=True, index=True)
-    product_id = Column(Integer, ForeignKey("products.id"), nullable=False)
+    product_id = Column(Integer, ForeignKey("products.id"), nullable=False, index=True)
     
     # Media info
     url = Column(String(500), nullable=False)
@@ -66,6 +66,7 @@ class OrderResponse(BaseModel):
 
 class OrderListResponse(BaseModel):
     orders: List[OrderResponse]
-    total: int
+    total: Optional[int] = None
     page: int
     page_size: int
+    next_cursor: Optional[str] = None
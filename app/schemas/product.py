@@ -1,4 +1,4 @@
-from pydantic import BaseModel, Field
+from pydantic import BaseModel, Field, model_validator
 from typing import Optional, List, Dict, Any
 from datetime import datetime
 
@@ -68,7 +68,102 @@ class ProductResponse(ProductBase):
 
 
 class ProductListResponse(BaseModel):
+    products: List[ProductResponse]
+    total: Optional[int] = None
+    page: int
+    page_size: int
+    next_cursor: Optional[str] = None
+
+
+class ProductStaticResponse(ProductBase):
+    """Product without stock and wave counters, changes only on admin edits"""
+    id: int
+    is_active: bool
+    is_archived: bool
+    created_at: datetime
+    media: List[ProductMediaResponse] = []
+    
+    class Config:
+        from_attributes = True
+
+
+class ProductAvailability(BaseModel):
+    id: int
+    order_type: str
+    is_active: bool
+    stock_count: int
+    available: int = Field(..., description="Можно заказать сейчас (склад без резервов или места в волнах)")
+    preorder_waves_total: int
+    preorder_wave_capacity: int
+    current_wave: int
+    current_wave_count: int
+
+
+class ProductAvailabilityResponse(BaseModel):
+    products: List[ProductAvailability]
+
+
+class ProductImportRow(BaseModel):
+    row: int = Field(..., description="Номер строки файла")
+    article: Optional[str] = None
+    status: str = Field(..., description="created, updated или error")
+    id: Optional[int] = None
+    errors: List[str] = []
+
+
+class ProductImportResponse(BaseModel):
+    created: int
+    updated: int
+    failed: int
+    rows: List[ProductImportRow]
+
+
+class ProductStockItem(BaseModel):
+    id: Optional[int] = Field(None, description="ID товара")
+    article: Optional[str] = Field(None, description="Артикул, если ID не указан")
+    stock_count: Optional[int] = Field(None, description="Остаток или изменение остатка в режиме delta")
+    price: Optional[float] = Field(None, gt=0, description="Новая цена")
+    
+    @model_validator(mode="after")
+    def validate_item(self):
+        if self.id is None and not self.article:
+            raise ValueError("Нужен id или article")
+        if self.stock_count is None and self.price is None:
+            raise ValueError("Нужен stock_count или price")
+        return self
+
+
+class ProductStockUpdate(BaseModel):
+    items: List[ProductStockItem]
+    mode: str = Field(default="absolute", pattern="^(absolute|delta)$", description="absolute - новые значения, delta - stock_count прибавляется к остатку")
+    
+    @model_validator(mode="after")
+    def validate_stock(self):
+        if self.mode == "absolute" and any(item.stock_count is not None and item.stock_count < 0 for item in self.items):
+            raise ValueError("stock_count не может быть отрицательным")
+        return self
+
+
+class ProductStockUpdateResponse(BaseModel):
+    changed: int
+    unchanged: int
+    unknown: int
+    unknown_items: List[str] = Field(default_factory=list, description="ID или артикулы ненайденных товаров")
+    clamped: int = 0
+    clamped_ids: List[int] = Field(default_factory=list, description="ID товаров, остаток которых в режиме delta обрезан до 0")
+
+
+class ProductSearchFacets(BaseModel):
+    """Counts of matching products per value, each without its own filter applied"""
+    sizes: Dict[str, int]
+    order_types: Dict[str, int]
+    price_min: Optional[float] = None
+    price_max: Optional[float] = None
+
+
+class ProductSearchResponse(BaseModel):
     products: List[ProductResponse]
     total: int
     page: int
     page_size: int
+    facets: ProductSearchFacets
@@ -0,0 +1,142 @@
+"""
+Analytics cache service: short-lived cache of analytics responses
+"""
+import json
+import logging
+from datetime import datetime, timezone
+from typing import Any, Optional
+
+from fastapi.encoders import jsonable_encoder
+from fastapi.responses import Response
+
+from app.core.config import settings
+from app.utils.cache import MemoryCacheBackend, RedisCacheBackend
+
+logger = logging.getLogger("app.analytics.cache")
+
+# Cache backends
+BACKEND_MEMORY = "memory"
+BACKEND_REDIS = "redis"
+
+KEY_PREFIX = "analytics"
+GENERATION_KEY = f"{KEY_PREFIX}:generation"
+
+
+def _normalize(value: Any) -> str:
+    if value is None:
+        return ""
+    if isinstance(value, datetime):
+        if value.tzinfo is not None:
+            value = value.astimezone(timezone.utc).replace(tzinfo=None)
+        return value.isoformat()
+    return str(value)
+
+
+class AnalyticsCache:
+    """
+    Service for caching analytics responses
+
+    Entries are keyed by endpoint and normalized parameters plus a generation
+    number. Invalidation bumps the generation, so every cached response
+    becomes unreachable at once, in all workers with the Redis backend.
+    """
+
+    def __init__(self, backend, ttl: float = 30.0):
+        self.backend = backend
+        self.ttl = ttl
+        self.hits = 0
+        self.misses = 0
+        self.invalidations = 0
+        self.errors = 0
+
+    @property
+    def enabled(self) -> bool:
+        return self.ttl > 0
+
+    async def key(self, endpoint: str, *params: Any) -> Optional[str]:
+        """
+        Build cache key for an endpoint call
+
+        Args:
+            endpoint: Endpoint name
+            params: Query parameters as received, before defaults are applied
+
+        Returns:
+            Cache key or None if caching is off or the backend is unavailable
+        """
+        if not self.enabled:
+            return None
+        try:
+            generation = await self.backend.get_generation(GENERATION_KEY)
+        except Exception:
+            self.errors += 1
+            logger.exception("Analytics cache backend failed")
+            return None
+        return ":".join([KEY_PREFIX, str(generation), endpoint, *(_normalize(param) for param in params)])
+
+    async def get(self, key: Optional[str]) -> Optional[Response]:
+        """Get cached response as ready JSON, None on miss"""
+        if key is None:
+            return None
+        try:
+            body = await self.backend.get(key)
+        except Exception:
+            self.errors += 1
+            logger.exception("Analytics cache backend failed")
+            return None
+        if body is None:
+            self.misses += 1
+            return None
+        self.hits += 1
+        return Response(content=body, media_type="application/json")
+
+    async def set(self, key: Optional[str], response: Any) -> None:
+        """Store response body"""
+        if key is None:
+            return
+        try:
+            await self.backend.set(key, json.dumps(jsonable_encoder(response)), self.ttl)
+        except Exception:
+            self.errors += 1
+            logger.exception("Analytics cache backend failed")
+
+    async def invalidate(self) -> None:
+        """Drop all cached responses (called when orders are created, paid or changed)"""
+        if not self.enabled:
+            return
+        self.invalidations += 1
+        try:
+            await self.backend.incr_generation(GENERATION_KEY)
+        except Exception:
+            self.errors += 1
+            logger.exception("Analytics cache backend failed")
+
+    async def close(self) -> None:
+        await self.backend.close()
+
+    def stats(self) -> dict:
+        lookups = self.hits + self.misses
+        return {
+            "ttl_seconds": self.ttl,
+            "hits": self.hits,
+            "misses": self.misses,
+            "hit_ratio": round(self.hits / lookups, 4) if lookups else 0.0,
+            "invalidations": self.invalidations,
+            "errors": self.errors,
+            "backend": self.backend.name,
+            "store": self.backend.stats(),
+        }
+
+
+def create_backend(name: str):
+    """Create cache backend from settings"""
+    if name == BACKEND_REDIS:
+        return RedisCacheBackend.from_url(settings.ANALYTICS_CACHE_REDIS_URL)
+    return MemoryCacheBackend(maxsize=settings.ANALYTICS_CACHE_SIZE, ttl=settings.ANALYTICS_CACHE_TTL_SECONDS)
+
+
+# Singleton instance
+analytics_cache = AnalyticsCache(
+    backend=create_backend(settings.ANALYTICS_CACHE_BACKEND),
+    ttl=settings.ANALYTICS_CACHE_TTL_SECONDS
+)
@@ -0,0 +1,264 @@
+"""
+Catalog snapshot service: pre-serialized products served from memory
+"""
+import asyncio
+import hashlib
+import json
+import time
+from typing import Callable, Dict, Iterable, List, Optional, Sequence, Set, Tuple
+
+from sqlalchemy import select
+from sqlalchemy.orm import selectinload
+
+from app.core.config import settings
+from app.core.database import AsyncSessionLocal
+from app.models.product import Product
+from app.schemas.product import ProductResponse, ProductStaticResponse
+from app.utils.cache import TTLCache
+from app.utils.pagination import TOTAL_NONE, decode_cursor, encode_cursor
+
+# Assembled list pages kept per snapshot version
+MAX_PAGES = 1024
+
+# Volatile product columns served by the availability endpoint
+COUNTER_COLUMNS = (
+    Product.id,
+    Product.order_type,
+    Product.is_active,
+    Product.stock_count,
+    Product.preorder_waves_total,
+    Product.preorder_wave_capacity,
+    Product.current_wave,
+    Product.current_wave_count,
+)
+
+
+def make_etag(body: bytes) -> str:
+    """Strong ETag from response bytes, equal in every worker for equal content"""
+    return f'"{hashlib.blake2b(body, digest_size=12).hexdigest()}"'
+
+
+def etag_matches(if_none_match: Optional[str], etag: str) -> bool:
+    """Check If-None-Match request header against ETag"""
+    if not if_none_match:
+        return False
+    tags = [tag.strip() for tag in if_none_match.split(",")]
+    return "*" in tags or etag in (tag[2:] if tag.startswith("W/") else tag for tag in tags)
+
+
+class CatalogEntry:
+    """Serialized product with the fields list filters need"""
+
+    __slots__ = ("id", "is_active", "is_archived", "body", "etag", "static_body", "static_etag")
+
+    def __init__(self, product: Product):
+        self.id = product.id
+        self.is_active = product.is_active
+        self.is_archived = product.is_archived
+        self.body = ProductResponse.model_validate(product).model_dump_json().encode()
+        self.etag = make_etag(self.body)
+        # Without counters: the ETag survives sales and wave changes
+        self.static_body = ProductStaticResponse.model_validate(product).model_dump_json().encode()
+        self.static_etag = make_etag(self.static_body)
+
+
+class CatalogSnapshot:
+    """
+    In-process snapshot of the public catalog
+
+    Every product is kept as ready JSON bytes; list pages are assembled from
+    them and cached until the next change. Writes in this process mark the
+    changed products dirty and only those are reloaded, on the next read.
+    The whole snapshot is reloaded after ttl seconds, which bounds how long
+    changes made by other worker processes stay invisible.
+
+    Stock and wave counters are also kept apart in a small cache with a
+    short TTL, so storefronts can poll them without the full product JSON.
+    """
+
+    def __init__(self, ttl: float = 30.0, counters_ttl: float = 1.0, counters_size: int = 10000):
+        self.ttl = ttl
+        self.counters = TTLCache(maxsize=counters_size, ttl=counters_ttl)
+        self.version = 0
+        self._entries: Dict[int, CatalogEntry] = {}
+        self._ids: List[int] = []
+        self._loaded_at: Optional[float] = None
+        self._dirty: Set[int] = set()
+        self._pages: Dict[tuple, Tuple[bytes, str]] = {}
+        self._lock = asyncio.Lock()
+        self._listeners: List[Callable[[List[int]], None]] = []
+        self.full_loads = 0
+        self.product_loads = 0
+        self.page_builds = 0
+
+    @property
+    def enabled(self) -> bool:
+        return self.ttl > 0
+
+    def invalidate(self, product_ids: Iterable[int]) -> None:
+        """Mark products changed (called after create, update, archive, delete and stock changes)"""
+        product_ids = list(product_ids)
+        for product_id in product_ids:
+            self.counters.pop(product_id)
+        for listener in self._listeners:
+            listener(product_ids)
+        if not self.enabled:
+            return
+        self._dirty.update(product_ids)
+        self.version += 1
+        self._pages.clear()
+
+    def subscribe(self, listener: Callable[[List[int]], None]) -> None:
+        """Call listener with product ids on every invalidation, also when the snapshot is disabled"""
+        self._listeners.append(listener)
+
+    def _is_fresh(self) -> bool:
+        return (
+            self._loaded_at is not None
+            and time.monotonic() - self._loaded_at < self.ttl
+            and not self._dirty
+        )
+
+    async def _sync(self) -> None:
+        if self._is_fresh():
+            return
+        async with self._lock:
+            if self._is_fresh():
+                return
+            # Invalidations arriving during the load stay dirty for the next read
+            full = self._loaded_at is None or time.monotonic() - self._loaded_at >= self.ttl
+            dirty, self._dirty = self._dirty, set()
+            started_at = time.monotonic()
+            try:
+                # Always the primary: a replica may not have the write yet
+                async with AsyncSessionLocal() as db:
+                    query = select(Product).options(selectinload(Product.media)).order_by(Product.id)
+                    if not full:
+                        query = query.where(Product.id.in_(dirty))
+                    result = await db.execute(query)
+                    products = result.scalars().all()
+            except Exception:
+                self._dirty |= dirty
+                raise
+
+            if full:
+                self._entries = {product.id: CatalogEntry(product) for product in products}
+                self._loaded_at = started_at
+                self.full_loads += 1
+            else:
+                for product_id in dirty:
+                    self._entries.pop(product_id, None)
+                for product in products:
+                    self._entries[product.id] = CatalogEntry(product)
+                self.product_loads += len(dirty)
+            self._ids = sorted(self._entries)
+            self.version += 1
+            self._pages.clear()
+
+    async def product(self, product_id: int) -> Optional[CatalogEntry]:
+        """Serialized product or None if it does not exist"""
+        await self._sync()
+        return self._entries.get(product_id)
+
+    async def products(self, product_ids: Sequence[int]) -> List[CatalogEntry]:
+        """Serialized products in the given order, missing ids are skipped"""
+        await self._sync()
+        return [self._entries[product_id] for product_id in product_ids if product_id in self._entries]
+
+    async def page(
+        self,
+        skip: int,
+        limit: int,
+        is_active: Optional[bool],
+        is_archived: Optional[bool],
+        after: Optional[str],
+        total_mode: str
+    ) -> Tuple[bytes, str]:
+        """
+        Serialized product list page, same shape as ProductListResponse
+
+        Returns:
+            Response body and its ETag
+        """
+        await self._sync()
+        key = (self.version, skip, limit, is_active, is_archived, after, total_mode)
+        cached = self._pages.get(key)
+        if cached is not None:
+            return cached
+
+        entries = [
+            self._entries[product_id] for product_id in self._ids
+            if (is_active is None or self._entries[product_id].is_active == is_active)
+            and (is_archived is None or self._entries[product_id].is_archived == is_archived)
+        ]
+        total = len(entries)
+        if after:
+            last_id = decode_cursor(after, (Product.id,))[0]
+            entries = [entry for entry in entries if entry.id > last_id]
+            rows = entries[:limit + 1]
+        else:
+            rows = entries[skip:skip + limit + 1]
+        next_cursor = encode_cursor([rows[limit - 1].id]) if len(rows) > limit else None
+        rows = rows[:limit]
+
+        meta = json.dumps({
+            "total": None if total_mode == TOTAL_NONE else total,
+            "page": skip // limit + 1,
+            "page_size": limit,
+            "next_cursor": next_cursor
+        })
+        body = b'{"products":[' + b",".join(entry.body for entry in rows) + b"]," + meta[1:].encode()
+        etag = make_etag(body)
+
+        if len(self._pages) >= MAX_PAGES:
+            self._pages.clear()
+        self._pages[key] = (body, etag)
+        self.page_builds += 1
+        return body, etag
+
+    async def product_counters(self, product_ids: Sequence[int]) -> List[dict]:
+        """
+        Stock and wave counters of products, missing ids are skipped
+
+        Cache misses are read from the primary with one SELECT of the
+        counter columns.
+        """
+        found = {}
+        missing = []
+        for product_id in product_ids:
+            counters = self.counters.get(product_id)
+            if counters is None:
+                missing.append(product_id)
+            else:
+                found[product_id] = counters
+        if missing:
+            async with AsyncSessionLocal() as db:
+                result = await db.execute(select(*COUNTER_COLUMNS).where(Product.id.in_(missing)))
+                for row in result.all():
+                    counters = dict(row._mapping)
+                    self.counters.set(row.id, counters)
+                    found[row.id] = counters
+        return [found[product_id] for product_id in product_ids if product_id in found]
+
+    def stats(self) -> dict:
+        return {
+            "enabled": self.enabled,
+            "ttl_seconds": self.ttl,
+            "version": self.version,
+            "products": len(self._entries),
+            "dirty": len(self._dirty),
+            "cached_pages": len(self._pages),
+            "age_seconds": round(time.monotonic() - self._loaded_at, 3) if self._loaded_at is not None else None,
+            "full_loads": self.full_loads,
+            "product_loads": self.product_loads,
+            "page_builds": self.page_builds,
+            "counters": self.counters.stats(),
+        }
+
+
+# Singleton instance
+catalog_snapshot = CatalogSnapshot(
+    ttl=settings.CATALOG_SNAPSHOT_TTL_SECONDS,
+    counters_ttl=settings.CATALOG_AVAILABILITY_TTL_SECONDS,
+    counters_size=settings.CATALOG_AVAILABILITY_CACHE_SIZE
+)
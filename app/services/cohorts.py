@@ -0,0 +1,172 @@
+"""
+Cohort analytics service: retention, LTV and repeat purchases of customers
+"""
+import asyncio
+from datetime import datetime
+from typing import Optional
+
+import numpy as np
+import pandas as pd
+from sqlalchemy import select, func
+from sqlalchemy.ext.asyncio import AsyncSession
+
+from app.models.order import Order, PaymentStatus
+from app.utils.timeseries import epoch_seconds
+
+# Cohort columns: months since the first purchase
+DEFAULT_MONTHS = 12
+MAX_MONTHS = 36
+
+ORDER_COLUMNS = ["user_id", "purchased_at", "final_amount"]
+
+# Bits of the sort key holding seconds since the earliest order (~544 years)
+TIME_KEY_BITS = 34
+
+
+def _month_label(month: int) -> str:
+    year, month = divmod(int(month), 12)
+    return f"{year:04d}-{month + 1:02d}"
+
+
+class CohortService:
+    """Service for monthly cohort analysis of paid orders"""
+
+    async def load_orders(self, db: AsyncSession) -> pd.DataFrame:
+        """
+        Load paid orders as a compact columnar frame
+
+        Purchase time is the payment time, or the order time for orders paid
+        before paid_at was recorded, sent as integer seconds so no datetime
+        objects are built per row.
+
+        Returns:
+            DataFrame with user_id, purchased_at (seconds since 1970), final_amount
+        """
+        purchased_at = func.coalesce(Order.paid_at, Order.created_at)
+        result = await db.execute(
+            select(
+                Order.user_id,
+                epoch_seconds(purchased_at, db.bind.dialect.name),
+                Order.final_amount
+            ).where(
+                Order.payment_status == PaymentStatus.SUCCEEDED,
+                purchased_at.isnot(None)
+            )
+        )
+        return pd.DataFrame.from_records(result.all(), columns=ORDER_COLUMNS)
+
+    def compute(
+        self,
+        orders: pd.DataFrame,
+        months: int = DEFAULT_MONTHS,
+        cohorts: Optional[int] = None,
+        now: Optional[datetime] = None
+    ) -> dict:
+        """
+        Compute monthly cohort retention and LTV matrices
+
+        A customer's cohort is the month of their first paid order. Retention is
+        the share of the cohort buying in the n-th month after it, LTV the
+        cumulative revenue per cohort customer by then.
+
+        Args:
+            orders: Frame from load_orders
+            months: Months after the first purchase to report
+            cohorts: Only the latest N cohorts (default: all)
+            now: Current time, months after it are not reported
+
+        Returns:
+            Cohort matrices, repeat rate and time to second order
+        """
+        now = now or datetime.utcnow()
+        current_month = now.year * 12 + now.month - 1
+
+        if orders.empty:
+            return {
+                "months": months,
+                "customers": 0,
+                "repeat_customers": 0,
+                "repeat_rate": 0,
+                "time_to_second_order_days": {"median": None, "mean": None},
+                "cohorts": []
+            }
+
+        user_ids = orders["user_id"].to_numpy(dtype=np.int64)
+        purchased_at = orders["purchased_at"].to_numpy(dtype=np.int64)
+        amounts = orders["final_amount"].to_numpy(dtype=np.float64)
+
+        # Months as year * 12 + month - 1
+        month_index = purchased_at.astype("datetime64[s]").astype("datetime64[M]").astype(np.int64) + 1970 * 12
+
+        # Orders sorted by customer, then time: one packed int64 key sorts much
+        # faster than np.lexsort when customer ids and seconds fit into it
+        seconds = purchased_at - purchased_at.min()
+        if user_ids.min() >= 0 and user_ids.max() < 1 << (63 - TIME_KEY_BITS) and seconds.max() < 1 << TIME_KEY_BITS:
+            order = np.argsort((user_ids << TIME_KEY_BITS) | seconds)
+        else:
+            order = np.lexsort((seconds, user_ids))
+        user_ids, purchased_at, amounts, month_index = (
+            user_ids[order], purchased_at[order], amounts[order], month_index[order]
+        )
+        first_row = np.r_[True, user_ids[1:] != user_ids[:-1]]
+        customer_start = np.flatnonzero(first_row)
+        customer = np.cumsum(first_row) - 1  # Customer number of every order
+        orders_per_customer = np.diff(np.r_[customer_start, len(user_ids)])
+
+        cohort = month_index[customer_start][customer]
+        offset = month_index - cohort
+        in_window = offset < months
+
+        # Customers buying in each (cohort, offset) cell, counted once per cell
+        cohort_first = cohort.min()
+        cohort_count = cohort.max() - cohort_first + 1
+        cell = (cohort[in_window] - cohort_first) * months + offset[in_window]
+        active = np.unique(customer[in_window] * (cohort_count * months) + cell) % (cohort_count * months)
+        active_customers = np.bincount(active, minlength=cohort_count * months).reshape(cohort_count, months)
+        revenue = np.bincount(cell, weights=amounts[in_window], minlength=cohort_count * months).reshape(cohort_count, months)
+        sizes = np.bincount(cohort[customer_start] - cohort_first, minlength=cohort_count)
+
+        retention = active_customers / np.maximum(sizes, 1)[:, None]
+        ltv = np.cumsum(revenue, axis=1) / np.maximum(sizes, 1)[:, None]
+
+        # Time from the first to the second order
+        second_row = customer_start[orders_per_customer > 1] + 1
+        days_to_second = (purchased_at[second_row] - purchased_at[second_row - 1]) / 86400
+        repeat_customers = int(len(second_row))
+
+        rows = []
+        for index in np.flatnonzero(sizes):
+            cohort_month = cohort_first + index
+            # Months that have not happened yet are left out
+            available = min(months, current_month - cohort_month + 1)
+            if available <= 0:
+                continue
+            rows.append({
+                "cohort": _month_label(cohort_month),
+                "customers": int(sizes[index]),
+                "retention": np.round(retention[index, :available], 4).tolist(),
+                "ltv": np.round(ltv[index, :available], 2).tolist()
+            })
+        if cohorts:
+            rows = rows[-cohorts:]
+
+        return {
+            "months": months,
+            "customers": int(len(customer_start)),
+            "repeat_customers": repeat_customers,
+            "repeat_rate": round(repeat_customers / len(customer_start), 4),
+            "time_to_second_order_days": {
+                "median": round(float(np.median(days_to_second)), 2) if repeat_customers else None,
+                "mean": round(float(days_to_second.mean()), 2) if repeat_customers else None
+            },
+            "cohorts": rows
+        }
+
+    async def get_cohorts(self, db: AsyncSession, months: int = DEFAULT_MONTHS, cohorts: Optional[int] = None) -> dict:
+        """Load paid orders and compute cohorts off the event loop"""
+        orders = await self.load_orders(db)
+        return await asyncio.to_thread(self.compute, orders, months, cohorts)
+
+
+# Singleton instance
+cohort_service = CohortService()
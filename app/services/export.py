@@ -0,0 +1,207 @@
+"""
+Export service for streaming large query results as files
+"""
+import csv
+import enum
+import io
+import zlib
+from typing import AsyncIterator, Callable, List, Optional, Sequence
+
+import pyarrow as pa
+import pyarrow.parquet as pq
+from sqlalchemy import types
+from sqlalchemy.sql import Select
+
+from app.core.config import settings
+from app.core.database import open_read_session
+
+
+# Export formats
+FORMAT_CSV = "csv"
+FORMAT_CSV_GZIP = "csv.gz"
+FORMAT_PARQUET = "parquet"
+FORMAT_ARROW = "arrow"  # Arrow IPC stream
+
+EXPORT_FORMAT_PATTERN = r"^(csv|csv\.gz|parquet|arrow)$"
+
+MEDIA_TYPES = {
+    FORMAT_CSV: "text/csv",
+    FORMAT_CSV_GZIP: "application/gzip",
+    FORMAT_PARQUET: "application/vnd.apache.parquet",
+    FORMAT_ARROW: "application/vnd.apache.arrow.stream",
+}
+
+# Arrow types for SQLAlchemy column types (checked in order, default string)
+ARROW_TYPES = [
+    (types.Boolean, pa.bool_()),
+    (types.Integer, pa.int64()),
+    (types.Float, pa.float64()),
+    (types.Numeric, pa.float64()),
+    (types.DateTime, pa.timestamp("us")),
+    (types.Date, pa.date32()),
+]
+
+
+def accepts_gzip(accept_encoding: Optional[str]) -> bool:
+    """Check whether Accept-Encoding allows gzip"""
+    for item in (accept_encoding or "").split(","):
+        coding, _, params = item.strip().partition(";")
+        if coding.strip().lower() not in ("gzip", "*"):
+            continue
+        quality = params.strip()
+        if quality.startswith("q="):
+            try:
+                return float(quality[2:]) > 0
+            except ValueError:
+                return False
+        return True
+    return False
+
+
+def arrow_schema(query: Select) -> pa.Schema:
+    """Build Arrow schema from query columns"""
+    fields = []
+    for column in query.selected_columns:
+        arrow_type = next(
+            (arrow_type for sql_type, arrow_type in ARROW_TYPES if isinstance(column.type, sql_type)),
+            pa.string()
+        )
+        fields.append(pa.field(column.key, arrow_type))
+    return pa.schema(fields)
+
+
+class _ChunkSink(io.RawIOBase):
+    """Write-only file that hands written bytes out in chunks"""
+
+    def __init__(self):
+        super().__init__()
+        self._chunks: List[bytes] = []
+        self._position = 0
+
+    def writable(self) -> bool:
+        return True
+
+    def write(self, data) -> int:
+        data = bytes(data)
+        self._chunks.append(data)
+        self._position += len(data)
+        return len(data)
+
+    def tell(self) -> int:
+        # Writers record offsets, so keep counting across taken chunks
+        return self._position
+
+    def take(self) -> bytes:
+        chunk = b"".join(self._chunks)
+        self._chunks.clear()
+        return chunk
+
+
+class ExportService:
+    """Service for streaming query results without loading them into memory"""
+
+    def __init__(self, batch_size: int = 1000, columnar_batch_size: int = 50000):
+        self.batch_size = batch_size
+        self.columnar_batch_size = columnar_batch_size
+
+    async def iter_batches(self, query: Select, batch_size: Optional[int] = None) -> AsyncIterator[Sequence]:
+        """
+        Fetch query rows batch by batch through a server-side cursor
+
+        Args:
+            query: Column projection to export
+            batch_size: Rows per batch (default: batch_size)
+
+        Yields:
+            Lists of at most batch_size rows
+        """
+        # The request session is closed before the response body is sent,
+        # so the export opens its own session (on a read replica if configured)
+        # for the lifetime of the stream
+        async with await open_read_session() as db:
+            result = await db.stream(query.execution_options(yield_per=batch_size or self.batch_size))
+            async for rows in result.partitions():
+                yield rows
+
+    async def stream_csv(
+        self,
+        query: Select,
+        header: List[str],
+        format_row: Callable[[Sequence], list]
+    ) -> AsyncIterator[str]:
+        """
+        Stream query rows as CSV text, one chunk per batch
+
+        Args:
+            query: Column projection to export
+            header: CSV header row
+            format_row: Converts a result row into CSV values
+
+        Yields:
+            CSV text chunks
+        """
+        output = io.StringIO()
+        writer = csv.writer(output)
+
+        writer.writerow(header)
+        yield self._take(output)
+
+        async for rows in self.iter_batches(query):
+            writer.writerows(format_row(row) for row in rows)
+            yield self._take(output)
+
+    async def stream_gzip(self, chunks: AsyncIterator[str]) -> AsyncIterator[bytes]:
+        """
+        Compress text chunks into one gzip stream
+
+        Every chunk is sync-flushed so the client receives data as it is produced.
+        """
+        compressor = zlib.compressobj(6, zlib.DEFLATED, 31)
+        async for chunk in chunks:
+            yield compressor.compress(chunk.encode()) + compressor.flush(zlib.Z_SYNC_FLUSH)
+        yield compressor.flush()
+
+    async def stream_columnar(self, query: Select, export_format: str) -> AsyncIterator[bytes]:
+        """
+        Stream query rows as Parquet or Arrow IPC, one record batch per cursor batch
+
+        Args:
+            query: Column projection to export
+            export_format: parquet or arrow
+
+        Yields:
+            File bytes
+        """
+        schema = arrow_schema(query)
+        sink = _ChunkSink()
+        if export_format == FORMAT_PARQUET:
+            writer = pq.ParquetWriter(sink, schema, compression="zstd")
+        else:
+            writer = pa.ipc.new_stream(sink, schema)
+
+        try:
+            async for rows in self.iter_batches(query, self.columnar_batch_size):
+                columns = [
+                    pa.array([value.value if isinstance(value, enum.Enum) else value for value in column], type=field.type)
+                    for column, field in zip(zip(*rows), schema)
+                ]
+                writer.write_batch(pa.RecordBatch.from_arrays(columns, schema=schema))
+                yield sink.take()
+        finally:
+            writer.close()
+        yield sink.take()
+
+    @staticmethod
+    def _take(output: io.StringIO) -> str:
+        """Return buffered text and reset the buffer"""
+        chunk = output.getvalue()
+        output.seek(0)
+        output.truncate(0)
+        return chunk
+
+
+# Singleton instance
+export_service = ExportService(
+    batch_size=settings.EXPORT_BATCH_SIZE,
+    columnar_batch_size=settings.EXPORT_COLUMNAR_BATCH_SIZE
+)
@@ -0,0 +1,475 @@
+"""
+Inventory service for reserving stock and preorder wave slots
+"""
+import asyncio
+import logging
+import threading
+import time
+from collections import defaultdict
+from typing import Dict, List, Optional
+from sqlalchemy import select, update, case, and_, literal, bindparam, func
+from sqlalchemy.ext.asyncio import AsyncSession
+from sqlalchemy.orm.attributes import set_committed_value
+
+from app.core.config import settings
+from app.core.database import AsyncSessionLocal
+from app.models.order import Order, OrderItem
+from app.models.product import Product, OrderType
+from app.services.catalog import catalog_snapshot
+
+logger = logging.getLogger("app.inventory")
+
+# Reservation modes
+MODE_LOCK = "lock"  # SELECT ... FOR UPDATE, counters changed on ORM objects
+MODE_ATOMIC = "atomic"  # Guarded UPDATE ... RETURNING per product, no row lock held
+MODE_LEDGER = "ledger"  # In-memory holds, stock written to DB in batches after payment
+
+MODES = (MODE_LOCK, MODE_ATOMIC, MODE_LEDGER)
+
+# How many times to re-read stock when a ledger line is being reconciled
+LEDGER_LOAD_ATTEMPTS = 5
+
+
+class _LedgerLine:
+    """Stock state of one product"""
+
+    __slots__ = ("stock", "held", "pending", "epoch", "flushing")
+
+    def __init__(self):
+        self.stock: Optional[int] = None  # Last known DB stock_count
+        self.held = 0  # Active holds (order created, not paid)
+        self.pending = 0  # Confirmed holds not yet written to DB
+        self.epoch = 0  # Bumped whenever DB stock changes under the ledger
+        self.flushing = False
+
+    @property
+    def available(self) -> int:
+        return self.stock - self.held - self.pending
+
+
+class _Hold:
+    """Quantities held for one order"""
+
+    __slots__ = ("quantities", "expires_at")
+
+    def __init__(self, expires_at: float):
+        self.quantities: Dict[int, int] = defaultdict(int)
+        self.expires_at = expires_at
+
+
+class InventoryLedger:
+    """
+    In-process stock ledger with TTL holds
+
+    Checkout takes a hold against the cached DB stock without touching the
+    products row. Paid holds become pending decrements that are written to
+    the DB in batches; cancelled or expired holds return to stock.
+    The ledger is per process, so the hot products must be served by one worker.
+    """
+
+    def __init__(self, hold_ttl: float):
+        self.hold_ttl = hold_ttl
+        self._lines: Dict[int, _LedgerLine] = defaultdict(_LedgerLine)
+        self._holds: Dict[str, _Hold] = {}
+        self._lock = threading.Lock()
+        self.counters = defaultdict(int)
+
+    def epoch(self, product_id: int) -> Optional[int]:
+        """Get line epoch, or None if line stock is already known"""
+        with self._lock:
+            line = self._lines[product_id]
+            return None if line.stock is not None else line.epoch
+
+    def load(self, product_id: int, stock_count: int, epoch: int) -> None:
+        """Set line stock read from DB unless DB stock changed while reading"""
+        with self._lock:
+            line = self._lines[product_id]
+            if line.stock is None and line.epoch == epoch and not line.flushing:
+                line.stock = stock_count
+
+    def hold(self, key: str, product_id: int, quantity: int) -> bool:
+        """Hold quantity for order key; False if not enough stock"""
+        with self._lock:
+            line = self._lines[product_id]
+            if line.stock is None or line.available < quantity:
+                self.counters["rejected"] += 1
+                return False
+
+            line.held += quantity
+            hold = self._holds.get(key)
+            if hold is None:
+                hold = self._holds[key] = _Hold(time.monotonic() + self.hold_ttl)
+            hold.quantities[product_id] += quantity
+            self.counters["held"] += 1
+            return True
+
+    def release(self, key: str) -> bool:
+        """Return held quantities to stock"""
+        with self._lock:
+            return self._release(key, "released")
+
+    def _release(self, key: str, counter: str) -> bool:
+        hold = self._holds.pop(key, None)
+        if hold is None:
+            return False
+        for product_id, quantity in hold.quantities.items():
+            self._lines[product_id].held -= quantity
+        self.counters[counter] += 1
+        return True
+
+    def confirm(self, key: str) -> bool:
+        """Turn hold into pending DB decrement; False if hold is gone"""
+        with self._lock:
+            hold = self._holds.pop(key, None)
+            if hold is None:
+                return False
+            for product_id, quantity in hold.quantities.items():
+                line = self._lines[product_id]
+                line.held -= quantity
+                line.pending += quantity
+            self.counters["confirmed"] += 1
+            return True
+
+    def add_pending(self, quantities: Dict[int, int]) -> None:
+        """Queue DB decrements for a paid order without an active hold"""
+        with self._lock:
+            for product_id, quantity in quantities.items():
+                self._lines[product_id].pending += quantity
+            self.counters["confirmed_without_hold"] += 1
+
+    def expire(self) -> int:
+        """Release holds past their TTL"""
+        now = time.monotonic()
+        with self._lock:
+            expired = [key for key, hold in self._holds.items() if hold.expires_at <= now]
+            for key in expired:
+                self._release(key, "expired")
+        return len(expired)
+
+    def invalidate(self, product_id: int) -> None:
+        """Forget cached stock after it was changed directly in DB"""
+        with self._lock:
+            line = self._lines[product_id]
+            line.stock = None
+            line.epoch += 1
+
+    def begin_flush(self) -> Dict[int, int]:
+        """Get pending decrements to write and block stock reloads meanwhile"""
+        with self._lock:
+            batch = {pid: line.pending for pid, line in self._lines.items() if line.pending > 0}
+            for product_id in batch:
+                line = self._lines[product_id]
+                line.flushing = True
+                line.epoch += 1
+            return batch
+
+    def end_flush(self, batch: Dict[int, int], applied: bool) -> None:
+        """Account for a written (or failed) batch"""
+        with self._lock:
+            for product_id, quantity in batch.items():
+                line = self._lines[product_id]
+                line.flushing = False
+                line.epoch += 1
+                if applied:
+                    line.pending -= quantity
+                    if line.stock is not None:
+                        line.stock -= quantity
+            if applied:
+                self.counters["flushed_units"] += sum(batch.values())
+
+    def available(self, product_id: int) -> Optional[int]:
+        """Get stock left after holds and pending decrements, None if not loaded"""
+        with self._lock:
+            line = self._lines.get(product_id)
+            if line is None or line.stock is None:
+                return None
+            return line.available
+
+    def snapshot(self) -> Dict:
+        """Get ledger counters and per-product state"""
+        with self._lock:
+            return {
+                "active_holds": len(self._holds),
+                "counters": dict(self.counters),
+                "products": {
+                    product_id: {
+                        "stock": line.stock,
+                        "held": line.held,
+                        "pending": line.pending,
+                        "available": line.available if line.stock is not None else None,
+                    }
+                    for product_id, line in self._lines.items()
+                },
+            }
+
+
+class InventoryService:
+    """Service for reserving product stock during checkout"""
+
+    def __init__(self, mode: str = MODE_LOCK, hold_ttl: float = 900):
+        if mode not in MODES:
+            raise ValueError(f"Unknown inventory reservation mode: {mode}")
+        self.mode = mode
+        self.ledger = InventoryLedger(hold_ttl)
+
+    async def load_products(self, db: AsyncSession, product_ids: List[int]) -> Dict[int, Product]:
+        """
+        Load products for checkout
+
+        Args:
+            db: Database session
+            product_ids: Product IDs from the cart
+
+        Returns:
+            dict of product ID to Product (locked in lock mode)
+        """
+        query = select(Product).where(Product.id.in_(product_ids)).order_by(Product.id)
+
+        # Ordering by id keeps the lock order deterministic across checkouts
+        if self.mode == MODE_LOCK:
+            query = query.with_for_update()
+
+        if self.mode == MODE_LEDGER:
+            epochs = {product_id: self.ledger.epoch(product_id) for product_id in product_ids}
+
+        result = await db.execute(query)
+        products = {product.id: product for product in result.scalars()}
+
+        if self.mode == MODE_LEDGER:
+            for product_id, product in products.items():
+                if epochs[product_id] is not None:
+                    self.ledger.load(product_id, product.stock_count, epochs[product_id])
+
+        return products
+
+    async def reserve_stock(
+        self,
+        db: AsyncSession,
+        product: Product,
+        quantity: int,
+        hold_key: Optional[str] = None
+    ) -> bool:
+        """
+        Take quantity from product stock
+
+        Args:
+            db: Database session
+            product: Product loaded by load_products
+            quantity: Quantity to reserve
+            hold_key: Order number the ledger hold is kept under (ledger mode)
+
+        Returns:
+            True if reserved, False if there is not enough stock
+        """
+        if self.mode == MODE_LEDGER:
+            if product.order_type != OrderType.ORDER:
+                return False
+            await self._load_ledger_line(db, product.id)
+            return self.ledger.hold(hold_key, product.id, quantity)
+
+        if self.mode == MODE_LOCK:
+            if product.stock_count < quantity:
+                return False
+            product.stock_count -= quantity
+            return True
+
+        result = await db.execute(
+            update(Product)
+            .where(
+                Product.id == product.id,
+                Product.is_active == True,
+                Product.order_type == OrderType.ORDER,
+                Product.stock_count >= quantity
+            )
+            .values(stock_count=Product.stock_count - quantity)
+            .returning(Product.stock_count)
+            .execution_options(synchronize_session=False)
+        )
+        stock_count = result.scalar_one_or_none()
+        if stock_count is None:
+            return False
+
+        set_committed_value(product, "stock_count", stock_count)
+        return True
+
+    async def reserve_preorder(self, db: AsyncSession, product: Product, quantity: int) -> Optional[int]:
+        """
+        Add quantity to the current preorder wave
+
+        Args:
+            db: Database session
+            product: Product loaded by load_products
+            quantity: Quantity to reserve
+
+        Returns:
+            Wave number the items were added to, or None if all waves are full
+
+        Preorders use the guarded UPDATE in ledger mode as well.
+        """
+        if self.mode == MODE_LOCK:
+            if product.current_wave > product.preorder_waves_total:
+                return None
+            preorder_wave = product.current_wave
+
+            product.current_wave_count += quantity
+
+            # Check if wave is full
+            if product.current_wave_count >= product.preorder_wave_capacity:
+                product.current_wave += 1
+                product.current_wave_count = 0
+
+                # Check if all waves are done
+                if product.current_wave > product.preorder_waves_total:
+                    product.order_type = OrderType.WAITING
+
+            return preorder_wave
+
+        # All SET expressions see the old row values
+        filled = Product.current_wave_count + quantity
+        wave_full = filled >= Product.preorder_wave_capacity
+        waiting = literal(OrderType.WAITING, Product.order_type.type)
+
+        result = await db.execute(
+            update(Product)
+            .where(
+                Product.id == product.id,
+                Product.is_active == True,
+                Product.order_type == OrderType.PREORDER,
+                Product.current_wave <= Product.preorder_waves_total
+            )
+            .values(
+                current_wave_count=case((wave_full, 0), else_=filled),
+                current_wave=case((wave_full, Product.current_wave + 1), else_=Product.current_wave),
+                order_type=case(
+                    (and_(wave_full, Product.current_wave + 1 > Product.preorder_waves_total), waiting),
+                    else_=Product.order_type
+                )
+            )
+            .returning(Product.current_wave, Product.current_wave_count, Product.order_type)
+            .execution_options(synchronize_session=False)
+        )
+        row = result.one_or_none()
+        if row is None:
+            return None
+
+        current_wave, current_wave_count, order_type = row
+        set_committed_value(product, "current_wave", current_wave)
+        set_committed_value(product, "current_wave_count", current_wave_count)
+        set_committed_value(product, "order_type", order_type)
+
+        # Quantity is at least 1, so an empty wave means this reservation filled the previous one
+        return current_wave - 1 if current_wave_count == 0 else current_wave
+
+    async def _load_ledger_line(self, db: AsyncSession, product_id: int) -> None:
+        """Read stock into ledger if it was invalidated after load_products"""
+        for _ in range(LEDGER_LOAD_ATTEMPTS):
+            epoch = self.ledger.epoch(product_id)
+            if epoch is None:
+                return
+            stock_count = await db.scalar(select(Product.stock_count).where(Product.id == product_id))
+            self.ledger.load(product_id, stock_count or 0, epoch)
+            await asyncio.sleep(0.01)
+
+    def release(self, order_number: str) -> None:
+        """Return stock held for unpaid order (ledger mode)"""
+        if self.mode == MODE_LEDGER:
+            self.ledger.release(order_number)
+
+    async def confirm(self, db: AsyncSession, order: Order) -> None:
+        """Queue DB stock decrement for paid order (ledger mode)"""
+        if self.mode != MODE_LEDGER or self.ledger.confirm(order.order_number):
+            return
+
+        # Hold expired or was lost on restart: the order is paid, so take the stock anyway
+        result = await db.execute(
+            select(OrderItem.product_id, func.sum(OrderItem.quantity))
+            .where(OrderItem.order_id == order.id, OrderItem.is_preorder == False)
+            .group_by(OrderItem.product_id)
+        )
+        quantities = dict(result.all())
+        if quantities:
+            logger.warning("Order %s paid without an active stock hold", order.order_number)
+            self.ledger.add_pending(quantities)
+
+    def available(self, counters: Dict) -> int:
+        """
+        Units that can be ordered now
+
+        Args:
+            counters: Product order_type, stock_count and preorder wave counters
+
+        Returns:
+            Stock minus ledger holds for regular products, free wave slots for preorders
+        """
+        order_type = counters["order_type"]
+        if order_type == OrderType.PREORDER:
+            waves_left = counters["preorder_waves_total"] - counters["current_wave"] + 1
+            if waves_left <= 0:
+                return 0
+            return max(waves_left * counters["preorder_wave_capacity"] - counters["current_wave_count"], 0)
+        if order_type == OrderType.WAITING:
+            return 0
+        if self.mode == MODE_LEDGER:
+            available = self.ledger.available(counters["id"])
+            if available is not None:
+                return max(available, 0)
+        return max(counters["stock_count"] or 0, 0)
+
+    def invalidate(self, product_id: int) -> None:
+        """Drop cached stock after admin changed the product"""
+        if self.mode == MODE_LEDGER:
+            self.ledger.invalidate(product_id)
+
+    async def flush(self) -> int:
+        """
+        Write pending ledger decrements to DB in one batch
+
+        Returns:
+            Number of products updated
+        """
+        batch = self.ledger.begin_flush()
+        if not batch:
+            return 0
+
+        products = Product.__table__
+        applied = False
+        try:
+            async with AsyncSessionLocal() as db:
+                await db.execute(
+                    update(products)
+                    .where(products.c.id == bindparam("product_id"))
+                    .values(
+                        stock_count=products.c.stock_count - bindparam("quantity"),
+                        updated_at=func.now()
+                    ),
+                    [
+                        {"product_id": product_id, "quantity": quantity}
+                        for product_id, quantity in batch.items()
+                    ]
+                )
+                await db.commit()
+            applied = True
+            catalog_snapshot.invalidate(batch)
+        except Exception:
+            logger.exception("Inventory flush failed")
+        finally:
+            self.ledger.end_flush(batch, applied)
+
+        return len(batch) if applied else 0
+
+    async def run_reconciliation(self, interval: float) -> None:
+        """Expire holds and flush confirmed stock until cancelled"""
+        try:
+            while True:
+                await asyncio.sleep(interval)
+                self.ledger.expire()
+                await self.flush()
+        finally:
+            await self.flush()
+
+
+# Singleton instance
+inventory_service = InventoryService(
+    mode=settings.INVENTORY_RESERVATION_MODE,
+    hold_ttl=settings.INVENTORY_HOLD_TTL_SECONDS
+)
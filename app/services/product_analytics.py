@@ -0,0 +1,162 @@
+"""
+Product analytics service: sales, sell-through and preorder wave fill per product and size
+"""
+from datetime import datetime
+from typing import List, Optional
+
+from sqlalchemy import select, func, case, cast, BigInteger, Float
+from sqlalchemy.ext.asyncio import AsyncSession
+
+from app.models.order import Order, OrderItem, PaymentStatus
+from app.models.product import Product
+
+# Ranking metrics
+SORT_REVENUE = "revenue"
+SORT_UNITS = "units"
+SORT_PATTERN = r"^(revenue|units)$"
+
+DEFAULT_LIMIT = 20
+MAX_LIMIT = 200
+
+
+def _rate(part, whole) -> Optional[float]:
+    return round(part / whole, 4) if whole else None
+
+
+class ProductAnalyticsService:
+    """Service for per-product sales analytics of paid orders"""
+
+    def ranking_query(
+        self,
+        start: Optional[datetime],
+        end: Optional[datetime],
+        sort_by: str = SORT_REVENUE,
+        limit: int = DEFAULT_LIMIT
+    ):
+        """
+        Top products with their per-size rows in one statement
+
+        Items of paid orders are grouped by (product, size) once; window sums
+        over the product give its totals, which are ranked and cut to the top
+        N before products are joined.
+
+        Args:
+            start: Orders created at or after (optional)
+            end: Orders created before (optional, exclusive)
+            sort_by: Ranking metric, revenue or units
+            limit: Number of products
+
+        Returns:
+            Select of per-size rows of the top products, best first
+        """
+        line_revenue = OrderItem.price * OrderItem.quantity
+        revenue = func.sum(line_revenue)
+        units = func.sum(OrderItem.quantity)
+        conditions = [Order.payment_status == PaymentStatus.SUCCEEDED]
+        if start is not None:
+            conditions.append(Order.created_at >= start)
+        if end is not None:
+            conditions.append(Order.created_at < end)
+
+        # One pass over order items: per-size sums and product totals as windows
+        sizes = select(
+            OrderItem.product_id,
+            OrderItem.size,
+            cast(revenue, Float).label("revenue"),
+            cast(units, BigInteger).label("units"),
+            cast(func.sum(case((OrderItem.is_preorder == True, OrderItem.quantity), else_=0)), BigInteger).label("preorder_units"),
+            cast(func.sum(revenue).over(partition_by=OrderItem.product_id), Float).label("product_revenue"),
+            cast(func.sum(units).over(partition_by=OrderItem.product_id), BigInteger).label("product_units")
+        ).join(Order, Order.id == OrderItem.order_id).where(
+            *conditions
+        ).group_by(OrderItem.product_id, OrderItem.size).subquery()
+
+        metric = sizes.c.product_revenue if sort_by == SORT_REVENUE else sizes.c.product_units
+        ranked = select(
+            sizes,
+            func.dense_rank().over(order_by=(metric.desc(), sizes.c.product_id)).label("rank")
+        ).subquery()
+
+        return select(
+            ranked,
+            Product.article,
+            Product.name,
+            Product.order_type,
+            Product.stock_count,
+            Product.preorder_waves_total,
+            Product.preorder_wave_capacity,
+            Product.current_wave,
+            Product.current_wave_count
+        ).join(Product, Product.id == ranked.c.product_id).where(
+            ranked.c.rank <= limit
+        ).order_by(ranked.c.rank, ranked.c.revenue.desc(), ranked.c.size)
+
+    def build(self, rows) -> List[dict]:
+        """
+        Fold per-size rows into products
+
+        Sell-through is stock units sold in the period against those units
+        plus the stock left. Wave fill compares preorder units with the
+        capacity of all preorder waves; the current wave fill comes from the
+        live wave counter.
+        """
+        products = []
+        for row in rows:
+            if not products or products[-1]["product_id"] != row.product_id:
+                capacity = (row.preorder_waves_total or 0) * (row.preorder_wave_capacity or 0)
+                filled = max(row.current_wave - 1, 0) * (row.preorder_wave_capacity or 0) + (row.current_wave_count or 0)
+                products.append({
+                    "rank": row.rank,
+                    "product_id": row.product_id,
+                    "article": row.article,
+                    "name": row.name,
+                    "order_type": row.order_type,
+                    "revenue": row.product_revenue,
+                    "units": row.product_units,
+                    "stock_units": 0,
+                    "preorder_units": 0,
+                    "stock_count": row.stock_count or 0,
+                    "sell_through_rate": None,
+                    "preorder": {
+                        "waves_total": row.preorder_waves_total or 0,
+                        "wave_capacity": row.preorder_wave_capacity or 0,
+                        "current_wave": row.current_wave,
+                        "current_wave_fill_rate": _rate(row.current_wave_count or 0, row.preorder_wave_capacity),
+                        "fill_rate": _rate(min(filled, capacity), capacity)
+                    },
+                    "sizes": []
+                })
+            product = products[-1]
+            capacity = product["preorder"]["waves_total"] * product["preorder"]["wave_capacity"]
+            stock_units = row.units - row.preorder_units
+            product["stock_units"] += stock_units
+            product["preorder_units"] += row.preorder_units
+            product["sizes"].append({
+                "size": row.size,
+                "revenue": row.revenue,
+                "units": row.units,
+                "stock_units": stock_units,
+                "preorder_units": row.preorder_units,
+                "revenue_share": _rate(row.revenue, row.product_revenue),
+                "wave_fill_rate": _rate(row.preorder_units, capacity)
+            })
+
+        for product in products:
+            product["sell_through_rate"] = _rate(product["stock_units"], product["stock_units"] + product["stock_count"])
+        return products
+
+    async def get_top_products(
+        self,
+        db: AsyncSession,
+        start: Optional[datetime] = None,
+        end: Optional[datetime] = None,
+        sort_by: str = SORT_REVENUE,
+        limit: int = DEFAULT_LIMIT
+    ) -> List[dict]:
+        """Top products by revenue or units, with size breakdown"""
+        result = await db.execute(self.ranking_query(start, end, sort_by, limit))
+        return self.build(result.all())
+
+
+# Singleton instance
+product_analytics_service = ProductAnalyticsService()
@@ -0,0 +1,251 @@
+"""
+Product import service: bulk create and update of products from JSON lines or CSV
+"""
+import csv
+import io
+import json
+from datetime import datetime
+from typing import Dict, Iterator, List, Optional, Tuple
+
+from pydantic import ValidationError
+from sqlalchemy import select, delete, insert
+from sqlalchemy.dialects import postgresql, sqlite
+from sqlalchemy.ext.asyncio import AsyncSession
+
+from app.models.product import Product, ProductMedia, OrderType
+from app.schemas.product import ProductCreate
+
+# Upload formats
+FORMAT_JSONL = "jsonl"
+FORMAT_CSV = "csv"
+FORMAT_PATTERN = f"^({FORMAT_JSONL}|{FORMAT_CSV})$"
+
+# Row results
+STATUS_CREATED = "created"
+STATUS_UPDATED = "updated"
+STATUS_ERROR = "error"
+
+# Separator of list cells (sizes, media_urls) in CSV, commas belong to CSV itself
+CSV_LIST_SEPARATOR = "|"
+CSV_LIST_FIELDS = {"sizes", "media_urls"}
+CSV_JSON_FIELDS = {"size_table"}
+
+# Product columns written from an import row; on conflict only the ones the row has are updated
+PRODUCT_FIELDS = [
+    "name",
+    "description",
+    "price",
+    "sizes",
+    "size_table",
+    "care_instructions",
+    "order_type",
+    "stock_count",
+    "preorder_waves_total",
+    "preorder_wave_capacity",
+]
+
+UPSERT_INSERTS = {"postgresql": postgresql.insert, "sqlite": sqlite.insert}
+
+
+def parse_jsonl(text: str) -> Iterator[Tuple[int, Optional[dict], Optional[str]]]:
+    """Rows of a JSON lines upload as (line number, fields, parse error)"""
+    for number, line in enumerate(text.splitlines(), 1):
+        if not line.strip():
+            continue
+        try:
+            fields = json.loads(line)
+        except json.JSONDecodeError as e:
+            yield number, None, f"Некорректный JSON: {e.msg}"
+            continue
+        if not isinstance(fields, dict):
+            yield number, None, "Строка должна быть JSON-объектом"
+            continue
+        yield number, fields, None
+
+
+def parse_csv(text: str) -> Iterator[Tuple[int, Optional[dict], Optional[str]]]:
+    """
+    Rows of a CSV upload with a header line as (line number, fields, parse error)
+
+    Empty cells are left out, so the field keeps its current value on update.
+    sizes and media_urls are separated by "|", size_table is JSON.
+    """
+    reader = csv.DictReader(io.StringIO(text))
+    for row in reader:
+        fields = {}
+        error = None
+        for name, value in row.items():
+            if name is None:
+                error = "Лишние колонки в строке"
+                continue
+            value = (value or "").strip()
+            if not value:
+                continue
+            if name in CSV_LIST_FIELDS:
+                fields[name] = [item.strip() for item in value.split(CSV_LIST_SEPARATOR) if item.strip()]
+            elif name in CSV_JSON_FIELDS:
+                try:
+                    fields[name] = json.loads(value)
+                except json.JSONDecodeError as e:
+                    error = f"{name}: некорректный JSON: {e.msg}"
+            else:
+                fields[name] = value
+        yield reader.line_num, fields if error is None else None, error
+
+
+def _validation_errors(error: ValidationError) -> List[str]:
+    return [
+        f"{'.'.join(str(part) for part in item['loc'])}: {item['msg']}" if item["loc"] else item["msg"]
+        for item in error.errors()
+    ]
+
+
+class ProductImportService:
+    """
+    Service for bulk product import
+
+    Rows are validated in memory with the ProductCreate schema, then written
+    with INSERT ... ON CONFLICT (article) DO UPDATE in batches, all in the
+    caller's transaction. Existing products get only the fields present in
+    their row; media are replaced when the row has media_urls.
+    """
+
+    def validate(self, rows) -> Tuple[List[dict], List[Tuple[int, ProductCreate]]]:
+        """
+        Validate parsed rows
+
+        Returns:
+            Row results of invalid rows and valid rows as (line number, product)
+        """
+        errors = []
+        valid = []
+        seen: Dict[str, int] = {}
+        for number, fields, error in rows:
+            if error is not None:
+                errors.append({"row": number, "article": None, "status": STATUS_ERROR, "errors": [error]})
+                continue
+            try:
+                product = ProductCreate.model_validate(fields)
+                OrderType(product.order_type)
+            except ValidationError as e:
+                errors.append({
+                    "row": number, "article": fields.get("article"), "status": STATUS_ERROR,
+                    "errors": _validation_errors(e)
+                })
+                continue
+            except ValueError:
+                errors.append({
+                    "row": number, "article": fields.get("article"), "status": STATUS_ERROR,
+                    "errors": [f"order_type: неизвестный тип заказа {product.order_type}"]
+                })
+                continue
+            if product.article in seen:
+                errors.append({
+                    "row": number, "article": product.article, "status": STATUS_ERROR,
+                    "errors": [f"article: артикул уже есть в строке {seen[product.article]}"]
+                })
+                continue
+            seen[product.article] = number
+            valid.append((number, product))
+        return errors, valid
+
+    async def _upsert_batch(
+        self,
+        db: AsyncSession,
+        batch: List[Tuple[int, ProductCreate]],
+        fields: frozenset,
+        now: datetime
+    ) -> List[dict]:
+        products = Product.__table__
+        articles = [product.article for _, product in batch]
+        result = await db.execute(select(products.c.article).where(products.c.article.in_(articles)))
+        existing = set(result.scalars().all())
+
+        values = []
+        for _, product in batch:
+            row = {column: getattr(product, column) for column in PRODUCT_FIELDS}
+            row["order_type"] = OrderType(product.order_type)
+            values.append({
+                **row,
+                "article": product.article,
+                "current_wave": 1,
+                "current_wave_count": 0,
+                "is_active": True,
+                "is_archived": False,
+                "created_at": now,
+                "updated_at": now,
+            })
+
+        # Executemany of one cached statement: SQLAlchemy sends it as multi-row
+        # INSERT ... RETURNING batches without compiling a statement per batch
+        statement = UPSERT_INSERTS[db.bind.dialect.name](products)
+        updated_columns = [column for column in PRODUCT_FIELDS if column in fields]
+        statement = statement.on_conflict_do_update(
+            index_elements=[products.c.article],
+            set_={column: statement.excluded[column] for column in updated_columns + ["updated_at"]}
+        ).returning(products.c.id, products.c.article)
+        result = await db.execute(statement, values)
+        ids = {row.article: row.id for row in result.all()}
+
+        # Rows with media_urls replace the photos of updated products
+        if "media_urls" in fields:
+            replaced = [ids[article] for article in articles if article in existing]
+            if replaced:
+                await db.execute(delete(ProductMedia).where(ProductMedia.product_id.in_(replaced)))
+            media = [
+                {"product_id": ids[product.article], "url": url, "order": index, "created_at": now}
+                for _, product in batch
+                for index, url in enumerate(product.media_urls)
+            ]
+            if media:
+                await db.execute(insert(ProductMedia), media)
+
+        return [
+            {
+                "row": number,
+                "article": product.article,
+                "status": STATUS_UPDATED if product.article in existing else STATUS_CREATED,
+                "id": ids[product.article],
+            }
+            for number, product in batch
+        ]
+
+    async def import_products(self, db: AsyncSession, rows, batch_size: int = 500) -> dict:
+        """
+        Validate and upsert products, without committing
+
+        Args:
+            db: Database session
+            rows: Parsed rows from parse_jsonl or parse_csv
+            batch_size: Products per INSERT statement
+
+        Returns:
+            Counts and per-row results in upload order
+        """
+        results, valid = self.validate(rows)
+
+        # One statement shape per set of provided fields, so an update never
+        # overwrites a field its row left out with the schema default
+        groups: Dict[frozenset, List[Tuple[int, ProductCreate]]] = {}
+        for number, product in valid:
+            groups.setdefault(frozenset(product.model_fields_set), []).append((number, product))
+
+        now = datetime.utcnow()
+        for fields, group in groups.items():
+            for start in range(0, len(group), batch_size):
+                results += await self._upsert_batch(db, group[start:start + batch_size], fields, now)
+
+        results.sort(key=lambda result: result["row"])
+        counts = {STATUS_CREATED: 0, STATUS_UPDATED: 0, STATUS_ERROR: 0}
+        for result in results:
+            counts[result["status"]] += 1
+        return {
+            "created": counts[STATUS_CREATED],
+            "updated": counts[STATUS_UPDATED],
+            "failed": counts[STATUS_ERROR],
+            "rows": results
+        }
+
+
+# Singleton instance
+product_import_service = ProductImportService()
@@ -0,0 +1,428 @@
+"""
+Analytics rollup service: daily aggregates refreshed incrementally
+"""
+import asyncio
+import logging
+import time
+from datetime import date, datetime, time as dt_time, timedelta
+from typing import List, Optional, Tuple
+
+from sqlalchemy import select, delete, insert, func, and_, union_all, cast, exists, BigInteger, Float
+from sqlalchemy.dialects import postgresql, sqlite
+from sqlalchemy.ext.asyncio import AsyncSession
+from sqlalchemy.orm import aliased
+from sqlalchemy.sql import Select
+
+from app.core.config import settings
+from app.core.database import AsyncSessionLocal
+from app.models.analytics import DailyOrderStats, DailyPreorderStats, NO_WAVE
+from app.models.order import Order, OrderItem, PaymentStatus
+from app.models.user import User
+from app.utils.timeseries import GROUP_BY_DAY, period_start
+
+logger = logging.getLogger("app.analytics.rollups")
+
+# Rows changed this long before the previous refresh started are scanned again,
+# covering clock skew between app hosts and transactions committed late
+REFRESH_OVERLAP = timedelta(minutes=5)
+
+# Dirty days closer than this are rebuilt as one range
+MAX_DAY_GAP = 7
+MAX_RANGE_DAYS = 31
+
+# pg_try_advisory_xact_lock key, so one worker refreshes at a time
+REFRESH_LOCK_ID = 7_301_015
+
+UPSERT_INSERTS = {"postgresql": postgresql.insert, "sqlite": sqlite.insert}
+
+# Half-open datetime range, None for an open end
+Range = Tuple[Optional[datetime], Optional[datetime]]
+
+
+def _midnight(day: date) -> datetime:
+    return datetime.combine(day, dt_time.min)
+
+
+def _in_range(column, start: Optional[datetime], end: Optional[datetime]) -> list:
+    conditions = []
+    if start is not None:
+        conditions.append(column >= start)
+    if end is not None:
+        conditions.append(column < end)
+    return conditions
+
+
+def _sum(column, integer: bool = False):
+    # SUM of bigint is numeric in PostgreSQL, keep counts integral
+    return cast(func.coalesce(func.sum(column), 0), BigInteger if integer else Float)
+
+
+def _day_ranges(days: List[date]) -> List[Tuple[date, date]]:
+    """Group sorted days into half-open [first, last + 1) ranges"""
+    ranges = []
+    for day in days:
+        if ranges and (day - ranges[-1][1]).days < MAX_DAY_GAP and (day - ranges[-1][0]).days < MAX_RANGE_DAYS:
+            ranges[-1] = (ranges[-1][0], day + timedelta(days=1))
+        else:
+            ranges.append((day, day + timedelta(days=1)))
+    return ranges
+
+
+def _as_date(value) -> date:
+    # SQLite returns date() as text
+    return date.fromisoformat(value) if isinstance(value, str) else value
+
+
+class RollupService:
+    """Service for maintaining and querying daily analytics rollups"""
+
+    def __init__(self, enabled: bool = True):
+        self.enabled = enabled
+        self.watermark: Optional[datetime] = None  # Start of the last refresh
+        self.ready = False  # Rollups hold every day up to watermark
+        self.refreshes = 0
+        self.errors = 0
+        self.last_refresh_days = 0
+        self.last_refresh_ms = 0.0
+
+    # Refresh
+
+    async def refresh(self) -> int:
+        """
+        Rebuild rollups of days with orders or customers changed since the last refresh
+
+        Returns:
+            Number of days rebuilt
+        """
+        started = datetime.utcnow()
+        clock = time.perf_counter()
+        async with AsyncSessionLocal() as db:
+            dialect = db.bind.dialect.name
+            if dialect == "postgresql":
+                locked = await db.scalar(select(func.pg_try_advisory_xact_lock(REFRESH_LOCK_ID)))
+                if not locked:
+                    # Another worker is refreshing, pick up what it has written
+                    await self._load_watermark(db)
+                    return 0
+
+            if self.watermark is None:
+                await self._load_watermark(db)
+
+            days = await self._dirty_days(db, dialect)
+            for first, last in _day_ranges(days):
+                await self._rebuild(db, dialect, first, last, started)
+            await db.commit()
+
+        self.watermark = started
+        self.ready = True
+        self.refreshes += 1
+        self.last_refresh_days = len(days)
+        self.last_refresh_ms = (time.perf_counter() - clock) * 1000
+        return len(days)
+
+    async def _load_watermark(self, db: AsyncSession) -> None:
+        watermark = await db.scalar(select(func.max(DailyOrderStats.refreshed_at)))
+        if watermark is not None:
+            self.watermark = watermark
+            self.ready = True
+
+    async def _dirty_days(self, db: AsyncSession, dialect: str) -> List[date]:
+        """Days whose orders or customers changed after the watermark (all days on first run)"""
+        since = self.watermark - REFRESH_OVERLAP if self.watermark else None
+        order_day = period_start(Order.created_at, GROUP_BY_DAY, dialect)
+        user_day = period_start(User.created_at, GROUP_BY_DAY, dialect)
+
+        order_days = select(order_day.label("day")).where(Order.created_at.isnot(None))
+        user_days = select(user_day.label("day")).where(User.created_at.isnot(None))
+        if since is not None:
+            order_days = order_days.where(Order.updated_at >= since)
+            user_days = user_days.where(User.updated_at >= since)
+
+        result = await db.execute(union_all(order_days, user_days))
+        return sorted({_as_date(day) for day in result.scalars()})
+
+    async def _rebuild(self, db: AsyncSession, dialect: str, first: date, last: date, refreshed_at: datetime) -> None:
+        """Recompute rollups of days in [first, last)"""
+        start, end = _midnight(first), _midnight(last)
+        stats = {}
+
+        def row(day) -> dict:
+            day = _as_date(day)
+            return stats.setdefault(day, {
+                "day": day, "revenue": 0, "paid_orders": 0, "products_sold": 0,
+                "orders_with_promo": 0, "orders_without_promo": 0, "discount_total": 0,
+                "preorders": 0, "new_customers": 0, "new_buyers": 0, "refreshed_at": refreshed_at
+            })
+
+        paid = Order.payment_status == PaymentStatus.SUCCEEDED
+        order_day = period_start(Order.created_at, GROUP_BY_DAY, dialect).label("day")
+
+        result = await db.execute(
+            select(
+                order_day,
+                func.coalesce(func.sum(Order.final_amount).filter(paid), 0).label("revenue"),
+                func.count(Order.id).filter(paid).label("paid_orders"),
+                func.count(Order.id).filter(Order.promo_code_id.isnot(None)).label("orders_with_promo"),
+                func.count(Order.id).filter(Order.promo_code_id.is_(None)).label("orders_without_promo"),
+                func.coalesce(func.sum(Order.discount_amount), 0).label("discount_total")
+            ).where(*_in_range(Order.created_at, start, end)).group_by(order_day)
+        )
+        for day, *values in result.all():
+            row(day).update(zip(
+                ("revenue", "paid_orders", "orders_with_promo", "orders_without_promo", "discount_total"), values
+            ))
+
+        result = await db.execute(
+            select(
+                order_day,
+                func.coalesce(func.sum(OrderItem.quantity).filter(paid), 0).label("products_sold"),
+                func.count(OrderItem.id).filter(OrderItem.is_preorder == True).label("preorders")
+            ).join(Order, OrderItem.order_id == Order.id)
+            .where(*_in_range(Order.created_at, start, end)).group_by(order_day)
+        )
+        for day, products_sold, preorders in result.all():
+            row(day).update(products_sold=products_sold, preorders=preorders)
+
+        result = await db.execute(self._new_customers_query(dialect, start, end, group=True))
+        for day, count in result.all():
+            row(day)["new_customers"] = count
+
+        result = await db.execute(self._new_buyers_query(dialect, start, end, group=True))
+        for day, count in result.all():
+            row(day)["new_buyers"] = count
+
+        result = await db.execute(
+            select(order_day, OrderItem.preorder_wave, func.count(OrderItem.id))
+            .join(Order, OrderItem.order_id == Order.id)
+            .where(OrderItem.is_preorder == True, *_in_range(Order.created_at, start, end))
+            .group_by(order_day, OrderItem.preorder_wave)
+        )
+        waves = [
+            {"day": _as_date(day), "wave": NO_WAVE if wave is None else wave, "preorders": count}
+            for day, wave, count in result.all()
+        ]
+
+        await db.execute(delete(DailyOrderStats).where(DailyOrderStats.day >= first, DailyOrderStats.day < last))
+        await db.execute(delete(DailyPreorderStats).where(DailyPreorderStats.day >= first, DailyPreorderStats.day < last))
+        if stats:
+            await db.execute(insert(DailyOrderStats), list(stats.values()))
+        if waves:
+            # Upsert on the (day, wave) unique index in case another refresh wrote the day meanwhile
+            statement = UPSERT_INSERTS[dialect](DailyPreorderStats.__table__)
+            statement = statement.on_conflict_do_update(
+                index_elements=[DailyPreorderStats.day, DailyPreorderStats.wave],
+                set_={"preorders": statement.excluded.preorders}
+            )
+            await db.execute(statement, waves)
+
+    @staticmethod
+    def _new_customers_query(dialect: str, start: Optional[datetime], end: Optional[datetime], group: bool = False) -> Select:
+        """Customers registered in the range"""
+        day = period_start(User.created_at, GROUP_BY_DAY, dialect).label("day")
+        query = select(*([day] if group else []), func.count(User.id).label("new_customers")).where(
+            User.is_admin == False, *_in_range(User.created_at, start, end)
+        )
+        return query.group_by(day) if group else query
+
+    @staticmethod
+    def _new_buyers_query(dialect: str, start: Optional[datetime], end: Optional[datetime], group: bool = False) -> Select:
+        """Customers who placed their first order in the range"""
+        earlier = aliased(Order)
+        day = period_start(Order.created_at, GROUP_BY_DAY, dialect).label("day")
+        query = select(*([day] if group else []), func.count(func.distinct(Order.user_id)).label("new_buyers")).where(
+            *_in_range(Order.created_at, start, end),
+            ~exists().where(and_(earlier.user_id == Order.user_id, earlier.created_at < Order.created_at))
+        )
+        return query.group_by(day) if group else query
+
+    async def run_refresh(self, interval: float) -> None:
+        """Refresh rollups every interval seconds until cancelled"""
+        while True:
+            try:
+                await self.refresh()
+            except asyncio.CancelledError:
+                raise
+            except Exception:
+                self.errors += 1
+                logger.exception("Analytics rollup refresh failed")
+            await asyncio.sleep(interval)
+
+    def stats(self) -> dict:
+        return {
+            "enabled": self.enabled,
+            "ready": self.ready,
+            "watermark": self.watermark,
+            "refreshes": self.refreshes,
+            "errors": self.errors,
+            "last_refresh_days": self.last_refresh_days,
+            "last_refresh_ms": round(self.last_refresh_ms, 3),
+        }
+
+    # Queries
+
+    def split(self, start: Optional[datetime], end: Optional[datetime]) -> Tuple[Optional[Tuple[Optional[date], date]], List[Range]]:
+        """
+        Split a half-open datetime range into whole days served from rollups
+        and edge ranges computed from raw rows
+
+        Days from today on are always raw, so the current day is never stale.
+
+        Returns:
+            ((first_day, last_day) or None, raw ranges)
+        """
+        if not (self.enabled and self.ready):
+            return None, [(start, end)]
+
+        today = datetime.utcnow().date()
+        first = None if start is None else (start.date() if start == _midnight(start.date()) else start.date() + timedelta(days=1))
+        last = today if end is None else min(end.date(), today)
+
+        if first is not None and first >= last:
+            return None, [(start, end)]
+
+        raw = []
+        if start is not None and start < _midnight(first):
+            raw.append((start, _midnight(first)))
+        if end is None or _midnight(last) < end:
+            raw.append((_midnight(last), end))
+        return (first, last), raw
+
+    @staticmethod
+    def _days(column, days: Tuple[Optional[date], date]) -> list:
+        first, last = days
+        conditions = [column < last]
+        if first is not None:
+            conditions.append(column >= first)
+        return conditions
+
+    def sales_parts(self, dialect: str, start: Optional[datetime], end: Optional[datetime], group_by: Optional[str]) -> List[Select]:
+        """Selects of (period?, total_sales, orders_count, products_sold) covering the range"""
+        days, raw = self.split(start, end)
+        parts = []
+        if days:
+            period = [period_start(DailyOrderStats.day, group_by, dialect).label("period")] if group_by else []
+            parts.append(
+                select(
+                    *period,
+                    _sum(DailyOrderStats.revenue).label("total_sales"),
+                    _sum(DailyOrderStats.paid_orders, integer=True).label("orders_count"),
+                    _sum(DailyOrderStats.products_sold, integer=True).label("products_sold")
+                ).where(*self._days(DailyOrderStats.day, days)).group_by(*period)
+            )
+        for raw_start, raw_end in raw:
+            # Paid orders with their item quantities, one row per order
+            paid_orders = select(
+                Order.id,
+                Order.created_at,
+                Order.final_amount,
+                func.coalesce(func.sum(OrderItem.quantity), 0).label("products_sold")
+            ).outerjoin(OrderItem, OrderItem.order_id == Order.id).where(
+                Order.payment_status == PaymentStatus.SUCCEEDED,
+                *_in_range(Order.created_at, raw_start, raw_end)
+            ).group_by(Order.id, Order.created_at, Order.final_amount).subquery()
+            period = [period_start(paid_orders.c.created_at, group_by, dialect).label("period")] if group_by else []
+            parts.append(
+                select(
+                    *period,
+                    _sum(paid_orders.c.final_amount).label("total_sales"),
+                    cast(func.count(paid_orders.c.id), BigInteger).label("orders_count"),
+                    _sum(paid_orders.c.products_sold, integer=True).label("products_sold")
+                ).group_by(*period)
+            )
+        return parts
+
+    def promo_code_parts(self, dialect: str, start: Optional[datetime], end: Optional[datetime], group_by: Optional[str]) -> List[Select]:
+        """Selects of (period?, orders_with_promo, orders_without_promo, total_discount_given)"""
+        days, raw = self.split(start, end)
+        parts = []
+        if days:
+            period = [period_start(DailyOrderStats.day, group_by, dialect).label("period")] if group_by else []
+            parts.append(
+                select(
+                    *period,
+                    _sum(DailyOrderStats.orders_with_promo, integer=True).label("orders_with_promo"),
+                    _sum(DailyOrderStats.orders_without_promo, integer=True).label("orders_without_promo"),
+                    _sum(DailyOrderStats.discount_total).label("total_discount_given")
+                ).where(*self._days(DailyOrderStats.day, days)).group_by(*period)
+            )
+        for raw_start, raw_end in raw:
+            period = [period_start(Order.created_at, group_by, dialect).label("period")] if group_by else []
+            parts.append(
+                select(
+                    *period,
+                    cast(func.count(Order.id).filter(Order.promo_code_id.isnot(None)), BigInteger).label("orders_with_promo"),
+                    cast(func.count(Order.id).filter(Order.promo_code_id.is_(None)), BigInteger).label("orders_without_promo"),
+                    _sum(Order.discount_amount).label("total_discount_given")
+                ).where(*_in_range(Order.created_at, raw_start, raw_end)).group_by(*period)
+            )
+        return parts
+
+    def preorder_parts(self, start: Optional[datetime], end: Optional[datetime]) -> List[Select]:
+        """Selects of (wave, count) covering the range"""
+        days, raw = self.split(start, end)
+        parts = []
+        if days:
+            parts.append(
+                select(
+                    func.nullif(DailyPreorderStats.wave, NO_WAVE).label("wave"),
+                    _sum(DailyPreorderStats.preorders, integer=True).label("count")
+                ).where(*self._days(DailyPreorderStats.day, days)).group_by(DailyPreorderStats.wave)
+            )
+        for raw_start, raw_end in raw:
+            parts.append(
+                select(
+                    OrderItem.preorder_wave.label("wave"),
+                    cast(func.count(OrderItem.id), BigInteger).label("count")
+                ).join(Order, OrderItem.order_id == Order.id).where(
+                    OrderItem.is_preorder == True,
+                    *_in_range(Order.created_at, raw_start, raw_end)
+                ).group_by(OrderItem.preorder_wave)
+            )
+        return parts
+
+    def customer_parts(self, dialect: str) -> List[Select]:
+        """Selects of (total_customers, customers_with_orders) over all time"""
+        days, raw = self.split(None, None)
+        parts = []
+        if days:
+            parts.append(
+                select(
+                    _sum(DailyOrderStats.new_customers, integer=True).label("total_customers"),
+                    _sum(DailyOrderStats.new_buyers, integer=True).label("customers_with_orders")
+                ).where(*self._days(DailyOrderStats.day, days))
+            )
+        for raw_start, raw_end in raw:
+            new_customers = self._new_customers_query(dialect, raw_start, raw_end).scalar_subquery()
+            new_buyers = self._new_buyers_query(dialect, raw_start, raw_end).scalar_subquery()
+            parts.append(
+                select(
+                    cast(new_customers, BigInteger).label("total_customers"),
+                    cast(new_buyers, BigInteger).label("customers_with_orders")
+                )
+            )
+        return parts
+
+    @staticmethod
+    def combine(parts: List[Select], keys: List[str], group: Optional[str] = None) -> Select:
+        """
+        Sum the columns of parts into one statement
+
+        Args:
+            parts: Selects with the same columns
+            keys: Columns to sum
+            group: Column to group by, if any
+        """
+        if len(parts) == 1 and group is None:
+            return parts[0]
+        combined = (union_all(*parts) if len(parts) > 1 else parts[0]).subquery()
+        columns = [
+            cast(func.coalesce(func.sum(combined.c[key]), 0), combined.c[key].type).label(key)
+            for key in keys
+        ]
+        if group is None:
+            return select(*columns)
+        return select(combined.c[group], *columns).group_by(combined.c[group]).order_by(combined.c[group])
+
+
+# Singleton instance
+rollup_service = RollupService(enabled=settings.ANALYTICS_ROLLUPS_ENABLED)
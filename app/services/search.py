@@ -0,0 +1,447 @@
+"""
+Product search service: full-text, article and faceted search over the active catalog
+"""
+import asyncio
+import re
+import time
+from bisect import bisect_left, insort
+from collections import Counter
+from typing import Dict, Iterable, List, Optional, Sequence, Set
+
+from sqlalchemy import select, func, case, cast, or_, and_, true, null, literal_column, union_all, String, Float
+from sqlalchemy.dialects.postgresql import JSONB
+from sqlalchemy.ext.asyncio import AsyncSession
+
+from app.core.config import settings
+from app.models.product import Product, OrderType, SEARCH_CONFIG, product_search_document
+from app.services.catalog import catalog_snapshot
+
+ORDER_TYPE_PATTERN = "^(" + "|".join(order_type.value for order_type in OrderType) + ")$"
+
+MAX_QUERY_LENGTH = 100
+
+# Facet rows of the facet statement
+FACET_TOTAL = "total"
+FACET_SIZE = "size"
+FACET_ORDER_TYPE = "order_type"
+FACET_PRICE = "price"
+
+# Search result boost of an exact and a prefix article match
+ARTICLE_EXACT_BOOST = 2.0
+ARTICLE_PREFIX_BOOST = 1.0
+
+
+def tokenize(text: Optional[str]) -> List[str]:
+    """Lowercase words of a text, digits kept, punctuation and underscores dropped"""
+    return re.findall(r"[^\W_]+", (text or "").lower())
+
+
+def trigrams(text: str) -> Set[str]:
+    return {text[i:i + 3] for i in range(len(text) - 2)}
+
+
+def _escape_like(value: str) -> str:
+    return value.replace("\\", "\\\\").replace("%", "\\%").replace("_", "\\_")
+
+
+def _facets(sizes: Dict[str, int], order_types: Dict[str, int], price_min, price_max) -> dict:
+    return {
+        "sizes": dict(sorted(sizes.items())),
+        "order_types": dict(sorted(order_types.items())),
+        "price_min": price_min,
+        "price_max": price_max
+    }
+
+
+# Columns of the in-memory index
+INDEX_COLUMNS = (
+    Product.id,
+    Product.name,
+    Product.description,
+    Product.article,
+    Product.price,
+    Product.sizes,
+    Product.order_type,
+    Product.is_active,
+    Product.is_archived,
+)
+
+
+class SearchDocument:
+    """Searchable fields of one product in the in-memory index"""
+
+    __slots__ = ("id", "article", "price", "sizes", "order_type", "words", "length")
+
+    def __init__(self, row):
+        words = tokenize(f"{row.name} {row.description or ''}")
+        self.id = row.id
+        self.article = row.article.lower()
+        self.price = row.price
+        self.sizes = frozenset(row.sizes or ())
+        self.order_type = row.order_type.value
+        self.words = Counter(words)
+        self.length = len(words)
+
+
+class InMemorySearchIndex:
+    """
+    Inverted index of the active catalog for databases without full-text search
+
+    Used for SQLite runs: words of name and description map to products and
+    their counts, query words match as prefixes found by bisecting the sorted
+    vocabulary. Articles are indexed by trigrams for substring matches. There
+    is no stemming, prefix matching stands in for it.
+
+    Like the catalog snapshot, products invalidated in this process are
+    reindexed on the next search and the whole index is rebuilt after ttl
+    seconds.
+    """
+
+    def __init__(self, ttl: float = 30.0):
+        self.ttl = ttl
+        self._documents: Dict[int, SearchDocument] = {}
+        self._postings: Dict[str, Dict[int, int]] = {}
+        self._terms: List[str] = []
+        self._article_trigrams: Dict[str, Set[int]] = {}
+        self._built_at: Optional[float] = None
+        self._dirty: Set[int] = set()
+        self._lock = asyncio.Lock()
+        self.builds = 0
+        self.product_loads = 0
+
+    def invalidate(self, product_ids: Iterable[int]) -> None:
+        self._dirty.update(product_ids)
+
+    def _is_fresh(self) -> bool:
+        return (
+            self._built_at is not None
+            and time.monotonic() - self._built_at < self.ttl
+            and not self._dirty
+        )
+
+    def _add(self, document: SearchDocument) -> None:
+        self._documents[document.id] = document
+        for word, count in document.words.items():
+            postings = self._postings.get(word)
+            if postings is None:
+                postings = self._postings[word] = {}
+                insort(self._terms, word)
+            postings[document.id] = count
+        for trigram in trigrams(document.article):
+            self._article_trigrams.setdefault(trigram, set()).add(document.id)
+
+    def _remove(self, product_id: int) -> None:
+        # Words left without products stay in the vocabulary until the next rebuild
+        document = self._documents.pop(product_id, None)
+        if document is None:
+            return
+        for word in document.words:
+            self._postings[word].pop(product_id, None)
+        for trigram in trigrams(document.article):
+            self._article_trigrams[trigram].discard(product_id)
+
+    @staticmethod
+    def _build(rows) -> tuple:
+        documents = {}
+        postings: Dict[str, Dict[int, int]] = {}
+        article_trigrams: Dict[str, Set[int]] = {}
+        for row in rows:
+            document = SearchDocument(row)
+            documents[row.id] = document
+            for word, count in document.words.items():
+                postings.setdefault(word, {})[row.id] = count
+            for trigram in trigrams(document.article):
+                article_trigrams.setdefault(trigram, set()).add(row.id)
+        return documents, postings, sorted(postings), article_trigrams
+
+    async def sync(self, db: AsyncSession) -> None:
+        if self._is_fresh():
+            return
+        async with self._lock:
+            if self._is_fresh():
+                return
+            full = self._built_at is None or time.monotonic() - self._built_at >= self.ttl
+            dirty, self._dirty = self._dirty, set()
+            started_at = time.monotonic()
+            try:
+                if full:
+                    result = await db.execute(
+                        select(*INDEX_COLUMNS).where(Product.is_active == True, Product.is_archived == False)
+                    )
+                else:
+                    result = await db.execute(select(*INDEX_COLUMNS).where(Product.id.in_(dirty)))
+                rows = result.all()
+            except Exception:
+                self._dirty |= dirty
+                raise
+
+            if full:
+                # Tokenizing the whole catalog takes long enough to keep it off the event loop;
+                # searches meanwhile use the previous index
+                self._documents, self._postings, self._terms, self._article_trigrams = (
+                    await asyncio.to_thread(self._build, rows)
+                )
+                self._built_at = started_at
+                self.builds += 1
+            else:
+                for product_id in dirty:
+                    self._remove(product_id)
+                for row in rows:
+                    if row.is_active and not row.is_archived:
+                        self._add(SearchDocument(row))
+                self.product_loads += len(dirty)
+
+    def _prefix_postings(self, prefix: str) -> Dict[int, int]:
+        """Word counts per product of all words starting with prefix"""
+        matches: Dict[int, int] = {}
+        index = bisect_left(self._terms, prefix)
+        while index < len(self._terms) and self._terms[index].startswith(prefix):
+            for product_id, count in self._postings[self._terms[index]].items():
+                matches[product_id] = matches.get(product_id, 0) + count
+            index += 1
+        return matches
+
+    def _article_matches(self, text: str) -> Set[int]:
+        grams = trigrams(text)
+        if grams:
+            candidates = set.intersection(*(self._article_trigrams.get(gram, set()) for gram in grams))
+        else:
+            candidates = self._documents.keys()
+        return {product_id for product_id in candidates if text in self._documents[product_id].article}
+
+    def _scores(self, q: Optional[str]) -> Dict[int, float]:
+        """Relevance of every product matching the query (all products without one)"""
+        text = (q or "").strip().lower()
+        if not text:
+            return {product_id: 0.0 for product_id in self._documents}
+
+        # Every query word must match as a prefix; score is matched words per document length
+        scores: Dict[int, float] = {}
+        tokens = tokenize(text)
+        if tokens:
+            matched = [self._prefix_postings(token) for token in tokens]
+            for product_id in set.intersection(*(set(counts) for counts in matched)):
+                hits = sum(counts[product_id] for counts in matched)
+                scores[product_id] = hits / (1 + self._documents[product_id].length)
+
+        for product_id in self._article_matches(text):
+            article = self._documents[product_id].article
+            boost = ARTICLE_EXACT_BOOST if article == text else ARTICLE_PREFIX_BOOST if article.startswith(text) else 0.0
+            scores[product_id] = scores.get(product_id, 0.0) + boost
+        return scores
+
+    async def search(
+        self,
+        db: AsyncSession,
+        q: Optional[str],
+        sizes: Sequence[str],
+        min_price: Optional[float],
+        max_price: Optional[float],
+        order_type: Optional[str],
+        skip: int,
+        limit: int
+    ) -> dict:
+        await self.sync(db)
+        scores = self._scores(q)
+        documents = [self._documents[product_id] for product_id in scores]
+
+        # Each facet counts matches with every filter except its own
+        wanted_sizes = set(sizes)
+        size_counts: Counter = Counter()
+        order_type_counts: Counter = Counter()
+        prices = []
+        found = []
+        for document in documents:
+            size_ok = not wanted_sizes or not wanted_sizes.isdisjoint(document.sizes)
+            price_ok = (
+                (min_price is None or document.price >= min_price)
+                and (max_price is None or document.price <= max_price)
+            )
+            order_type_ok = order_type is None or document.order_type == order_type
+            if price_ok and order_type_ok:
+                size_counts.update(document.sizes)
+            if size_ok and price_ok:
+                order_type_counts[document.order_type] += 1
+            if size_ok and order_type_ok:
+                prices.append(document.price)
+                if price_ok:
+                    found.append(document)
+
+        found.sort(key=lambda document: (-scores[document.id], document.id))
+        return {
+            "ids": [document.id for document in found[skip:skip + limit]],
+            "total": len(found),
+            "facets": _facets(
+                size_counts,
+                order_type_counts,
+                min(prices) if prices else None,
+                max(prices) if prices else None
+            )
+        }
+
+    def stats(self) -> dict:
+        return {
+            "ttl_seconds": self.ttl,
+            "products": len(self._documents),
+            "terms": len(self._terms),
+            "article_trigrams": len(self._article_trigrams),
+            "dirty": len(self._dirty),
+            "age_seconds": round(time.monotonic() - self._built_at, 3) if self._built_at is not None else None,
+            "builds": self.builds,
+            "product_loads": self.product_loads,
+        }
+
+
+class ProductSearchService:
+    """
+    Service for product search with facets
+
+    On PostgreSQL the query runs against the GIN indexes of migration 004:
+    full-text search over name and description (prefix matches, russian
+    stemming), trigram substring match on the article, JSONB containment for
+    sizes. Other databases use the in-memory index.
+    """
+
+    def __init__(self, index_ttl: float = 30.0):
+        self.index = InMemorySearchIndex(ttl=index_ttl)
+        catalog_snapshot.subscribe(self.index.invalidate)
+
+    def _text_match(self, q: Optional[str]):
+        """Match condition and rank expression of the query, (None, None) without one"""
+        text = (q or "").strip()
+        if not text:
+            return None, None
+
+        config = literal_column(f"'{SEARCH_CONFIG}'::regconfig")
+        article_contains = Product.article.ilike(f"%{_escape_like(text)}%", escape="\\")
+        article_boost = case(
+            (func.lower(Product.article) == text.lower(), ARTICLE_EXACT_BOOST),
+            (Product.article.ilike(f"{_escape_like(text)}%", escape="\\"), ARTICLE_PREFIX_BOOST),
+            else_=0.0
+        )
+        tokens = tokenize(text)
+        if not tokens:
+            return article_contains, article_boost
+
+        document = product_search_document()
+        query = func.to_tsquery(config, " & ".join(f"{token}:*" for token in tokens))
+        return (
+            or_(document.bool_op("@@")(query), article_contains),
+            func.ts_rank_cd(document, query) + article_boost
+        )
+
+    async def _search_postgresql(
+        self,
+        db: AsyncSession,
+        q: Optional[str],
+        sizes: Sequence[str],
+        min_price: Optional[float],
+        max_price: Optional[float],
+        order_type: Optional[str],
+        skip: int,
+        limit: int
+    ) -> dict:
+        match, rank = self._text_match(q)
+        base = [Product.is_active == True, Product.is_archived == False]
+        if match is not None:
+            base.append(match)
+
+        # Any of the sizes; @> is served by the jsonb_path_ops index
+        size_filter = or_(*(cast(Product.sizes, JSONB).contains([size]) for size in sizes)) if sizes else true()
+        price_filter = and_(
+            Product.price >= min_price if min_price is not None else true(),
+            Product.price <= max_price if max_price is not None else true()
+        )
+        order_type_filter = Product.order_type == OrderType(order_type) if order_type else true()
+
+        # Total and facets in one statement, each facet without its own filter
+        size_values = func.jsonb_array_elements_text(cast(Product.sizes, JSONB)).table_valued("value").lateral()
+        no_value = cast(null(), String)
+        no_price = cast(null(), Float)
+        facets = union_all(
+            select(
+                literal_column(f"'{FACET_TOTAL}'").label("facet"),
+                no_value.label("value"),
+                func.count().label("count"),
+                no_price.label("price_min"),
+                no_price.label("price_max")
+            ).where(*base, size_filter, price_filter, order_type_filter),
+            select(
+                literal_column(f"'{FACET_SIZE}'"), size_values.c.value, func.count(), no_price, no_price
+            ).select_from(Product).join(size_values, true()).where(
+                *base, price_filter, order_type_filter
+            ).group_by(size_values.c.value),
+            select(
+                literal_column(f"'{FACET_ORDER_TYPE}'"), cast(Product.order_type, String), func.count(), no_price, no_price
+            ).where(*base, size_filter, price_filter).group_by(Product.order_type),
+            select(
+                literal_column(f"'{FACET_PRICE}'"), no_value, func.count(),
+                cast(func.min(Product.price), Float), cast(func.max(Product.price), Float)
+            ).where(*base, size_filter, order_type_filter)
+        )
+
+        total = 0
+        size_counts: Dict[str, int] = {}
+        order_type_counts: Dict[str, int] = {}
+        price_min = price_max = None
+        for row in (await db.execute(facets)).all():
+            if row.facet == FACET_TOTAL:
+                total = row.count
+            elif row.facet == FACET_SIZE:
+                size_counts[row.value] = row.count
+            elif row.facet == FACET_ORDER_TYPE:
+                # Enum values are stored by name
+                order_type_counts[OrderType[row.value].value] = row.count
+            else:
+                price_min, price_max = row.price_min, row.price_max
+
+        ids = []
+        if total > skip:
+            order_by = (rank.desc(), Product.id) if rank is not None else (Product.id,)
+            result = await db.execute(
+                select(Product.id).where(
+                    *base, size_filter, price_filter, order_type_filter
+                ).order_by(*order_by).offset(skip).limit(limit)
+            )
+            ids = list(result.scalars().all())
+
+        return {
+            "ids": ids,
+            "total": total,
+            "facets": _facets(size_counts, order_type_counts, price_min, price_max)
+        }
+
+    async def search(
+        self,
+        db: AsyncSession,
+        q: Optional[str] = None,
+        sizes: Sequence[str] = (),
+        min_price: Optional[float] = None,
+        max_price: Optional[float] = None,
+        order_type: Optional[str] = None,
+        skip: int = 0,
+        limit: int = 20
+    ) -> dict:
+        """
+        Search active products
+
+        Args:
+            db: Database session
+            q: Words of name or description (prefix matches), or part of the article
+            sizes: Products having any of the sizes
+            min_price: Minimum price (inclusive)
+            max_price: Maximum price (inclusive)
+            order_type: order, preorder or waiting
+            skip: Results to skip
+            limit: Page size
+
+        Returns:
+            Page of product ids by relevance, total and facets
+        """
+        if db.bind.dialect.name == "postgresql":
+            return await self._search_postgresql(db, q, sizes, min_price, max_price, order_type, skip, limit)
+        return await self.index.search(db, q, sizes, min_price, max_price, order_type, skip, limit)
+
+
+# Singleton instance
+product_search_service = ProductSearchService(index_ttl=settings.SEARCH_INDEX_TTL_SECONDS)
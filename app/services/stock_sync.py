@@ -0,0 +1,178 @@
+"""
+Stock sync service: set-based stock and price updates pushed by the warehouse
+"""
+from typing import Dict, List, Sequence, Tuple
+
+from sqlalchemy import select, update, func, case, cast, or_, bindparam, column, values, Integer, Float
+from sqlalchemy.ext.asyncio import AsyncSession
+
+from app.models.product import Product
+from app.schemas.product import ProductStockItem
+
+# Update modes
+MODE_ABSOLUTE = "absolute"
+MODE_DELTA = "delta"  # stock_count is added to the current stock
+
+
+class StockSyncService:
+    """
+    Service for batch stock and price updates
+
+    Items are resolved to product ids with one SELECT ... FOR UPDATE, merged
+    per product and compared with the current values, then only the products
+    that change are written by one UPDATE ... FROM (VALUES ...) on PostgreSQL
+    or one executemany UPDATE elsewhere, so their updated_at is the only one
+    touched and both backends report the same changed products.
+    """
+
+    async def _resolve(
+        self,
+        db: AsyncSession,
+        items: Sequence[ProductStockItem],
+        mode: str
+    ) -> Tuple[List[dict], List[str]]:
+        """
+        Match items to products by id or article
+
+        Returns:
+            Changes merged per product with its current stock and price,
+            and keys of unknown items
+        """
+        ids = {item.id for item in items if item.id is not None}
+        articles = {item.article for item in items if item.id is None}
+        # Locked until commit: the values compared below are the ones the UPDATE changes.
+        # Same id order as checkout, so a sync during a drop cannot deadlock with it
+        result = await db.execute(
+            select(Product.id, Product.article, Product.stock_count, Product.price)
+            .where(or_(Product.id.in_(ids), Product.article.in_(articles)))
+            .order_by(Product.id)
+            .with_for_update()
+        )
+        known = {}
+        by_article = {}
+        for row in result.all():
+            known[row.id] = row
+            by_article[row.article] = row.id
+
+        changes: Dict[int, dict] = {}
+        unknown = []
+        for item in items:
+            product_id = item.id if item.id is not None else by_article.get(item.article)
+            if product_id not in known:
+                unknown.append(str(item.id if item.id is not None else item.article))
+                continue
+            # Repeated products: deltas add up, absolute values keep the last one
+            change = changes.setdefault(product_id, {
+                "product_id": product_id,
+                "new_stock": None,
+                "new_price": None,
+                "stock_count": known[product_id].stock_count,
+                "price": known[product_id].price
+            })
+            if item.stock_count is not None:
+                if mode == MODE_DELTA and change["new_stock"] is not None:
+                    change["new_stock"] += item.stock_count
+                else:
+                    change["new_stock"] = item.stock_count
+            if item.price is not None:
+                change["new_price"] = item.price
+        return list(changes.values()), unknown
+
+    @staticmethod
+    def _new_values(stock, price, mode: str) -> Tuple:
+        products = Product.__table__
+        if mode == MODE_DELTA:
+            # Stock never goes below zero
+            added = products.c.stock_count + func.coalesce(stock, 0)
+            new_stock = case((added < 0, 0), else_=added)
+        else:
+            new_stock = func.coalesce(stock, products.c.stock_count)
+        return new_stock, func.coalesce(price, products.c.price)
+
+    @staticmethod
+    def _compare(change: dict, mode: str) -> Tuple[bool, bool]:
+        """
+        Same rules as _new_values on the current values of the product
+
+        Returns:
+            Whether the product changes and whether its stock is clamped at 0
+        """
+        clamped = False
+        if mode == MODE_DELTA:
+            new_stock = change["stock_count"] + (change["new_stock"] or 0)
+            if new_stock < 0:
+                new_stock, clamped = 0, True
+        else:
+            new_stock = change["stock_count"] if change["new_stock"] is None else change["new_stock"]
+        new_price = change["price"] if change["new_price"] is None else change["new_price"]
+        return (new_stock, new_price) != (change["stock_count"], change["price"]), clamped
+
+    async def apply(self, db: AsyncSession, items: Sequence[ProductStockItem], mode: str = MODE_ABSOLUTE) -> dict:
+        """
+        Apply stock and price changes, without committing
+
+        Args:
+            db: Database session
+            items: Products by id or article with stock_count and/or price
+            mode: absolute or delta
+
+        Returns:
+            Counts of changed, unchanged and unknown products, ids of changed
+            products, ids of products whose stock was clamped at 0 in delta
+            mode and keys of unknown items
+        """
+        changes, unknown = await self._resolve(db, items, mode)
+        changed_ids: List[int] = []
+        clamped_ids: List[int] = []
+        to_write = []
+        for change in changes:
+            changed, clamped = self._compare(change, mode)
+            if changed:
+                changed_ids.append(change["product_id"])
+                to_write.append({key: change[key] for key in ("product_id", "new_stock", "new_price")})
+            if clamped:
+                clamped_ids.append(change["product_id"])
+
+        if to_write:
+            products = Product.__table__
+            if db.bind.dialect.name == "postgresql":
+                # Numbers only, rendered inline: no parameter limit for thousands of rows
+                rows = values(
+                    column("product_id", Integer),
+                    column("new_stock", Integer),
+                    column("new_price", Float),
+                    name="changes",
+                    literal_binds=True
+                ).data([(change["product_id"], change["new_stock"], change["new_price"]) for change in to_write])
+                new_stock, new_price = self._new_values(
+                    cast(rows.c.new_stock, Integer), cast(rows.c.new_price, Float), mode
+                )
+                await db.execute(
+                    update(products)
+                    .where(products.c.id == rows.c.product_id)
+                    .values(stock_count=new_stock, price=new_price, updated_at=func.now())
+                )
+            else:
+                # No UPDATE FROM VALUES in SQLite: one statement sent with every row
+                new_stock, new_price = self._new_values(
+                    bindparam("new_stock", type_=Integer), bindparam("new_price", type_=Float), mode
+                )
+                await db.execute(
+                    update(products)
+                    .where(products.c.id == bindparam("product_id"))
+                    .values(stock_count=new_stock, price=new_price, updated_at=func.now()),
+                    to_write
+                )
+
+        return {
+            "changed": len(changed_ids),
+            "unchanged": len(changes) - len(changed_ids),
+            "unknown": len(unknown),
+            "unknown_items": unknown,
+            "clamped": len(clamped_ids),
+            "clamped_ids": clamped_ids,
+            "changed_ids": changed_ids
+        }
+
+# Singleton instance
+stock_sync_service = StockSyncService()
@@ -0,0 +1,207 @@
+"""
+Caching utilities: in-process TTL cache and pluggable cache backends
+"""
+import threading
+import time
+from collections import OrderedDict
+from typing import Any, Dict, Hashable, Optional
+
+
+class TTLCache:
+    """Bounded LRU cache with per-entry time to live"""
+
+    def __init__(self, maxsize: int = 1024, ttl: float = 60.0):
+        self.maxsize = maxsize
+        self.ttl = ttl
+        self._data: "OrderedDict[Hashable, tuple]" = OrderedDict()
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+
+    def get(self, key: Hashable, default: Any = None) -> Any:
+        """
+        Get cached value
+
+        Args:
+            key: Cache key
+            default: Value returned on miss
+
+        Returns:
+            Cached value or default if missing or expired
+        """
+        with self._lock:
+            entry = self._data.get(key)
+            if entry is not None:
+                value, expires_at = entry
+                if expires_at > time.monotonic():
+                    self._data.move_to_end(key)
+                    self.hits += 1
+                    return value
+                del self._data[key]
+            self.misses += 1
+            return default
+
+    def set(self, key: Hashable, value: Any, ttl: Optional[float] = None) -> None:
+        """
+        Store value, evicting least recently used entries when full
+
+        Args:
+            key: Cache key
+            value: Value to store
+            ttl: Time to live in seconds (default: cache ttl)
+        """
+        ttl = self.ttl if ttl is None else min(ttl, self.ttl)
+        if self.maxsize <= 0 or ttl <= 0:
+            return
+
+        with self._lock:
+            self._data[key] = (value, time.monotonic() + ttl)
+            self._data.move_to_end(key)
+            while len(self._data) > self.maxsize:
+                self._data.popitem(last=False)
+                self.evictions += 1
+
+    def pop(self, key: Hashable) -> None:
+        """Drop entry if present"""
+        with self._lock:
+            self._data.pop(key, None)
+
+    def clear(self) -> None:
+        """Drop all entries"""
+        with self._lock:
+            self._data.clear()
+
+    def stats(self) -> Dict:
+        """Get size and hit/miss counters"""
+        with self._lock:
+            lookups = self.hits + self.misses
+            return {
+                "size": len(self._data),
+                "maxsize": self.maxsize,
+                "ttl_seconds": self.ttl,
+                "hits": self.hits,
+                "misses": self.misses,
+                "hit_ratio": round(self.hits / lookups, 4) if lookups else 0.0,
+                "evictions": self.evictions,
+            }
+
+
+class LocalRedis:
+    """
+    In-process stand-in for the subset of the redis.asyncio client used by
+    RedisCacheBackend (get, set with ex, incr, delete)
+
+    Lets the Redis backend run in tests and scripts without a Redis server.
+    """
+
+    def __init__(self, maxsize: int = 10000):
+        self.maxsize = maxsize
+        self._data: Dict[str, tuple] = {}
+
+    def _alive(self, name: str) -> Optional[tuple]:
+        entry = self._data.get(name)
+        if entry is not None and entry[1] is not None and entry[1] <= time.monotonic():
+            del self._data[name]
+            return None
+        return entry
+
+    async def get(self, name: str) -> Optional[bytes]:
+        entry = self._alive(name)
+        return entry[0] if entry else None
+
+    async def set(self, name: str, value, ex: Optional[float] = None) -> bool:
+        if len(self._data) >= self.maxsize:
+            now = time.monotonic()
+            for key in [key for key, (_, expires_at) in self._data.items() if expires_at is not None and expires_at <= now]:
+                del self._data[key]
+        value = value.encode() if isinstance(value, str) else bytes(value)
+        self._data[name] = (value, time.monotonic() + ex if ex else None)
+        return True
+
+    async def incr(self, name: str) -> int:
+        entry = self._alive(name)
+        value = int(entry[0]) + 1 if entry else 1
+        self._data[name] = (str(value).encode(), entry[1] if entry else None)
+        return value
+
+    async def delete(self, *names: str) -> int:
+        return sum(self._data.pop(name, None) is not None for name in names)
+
+
+class MemoryCacheBackend:
+    """Cache backend storing values in a process-local TTLCache"""
+
+    name = "memory"
+
+    def __init__(self, maxsize: int = 1024, ttl: float = 60.0):
+        self.cache = TTLCache(maxsize=maxsize, ttl=ttl)
+        self.generation = 0
+
+    async def get(self, key: str) -> Optional[str]:
+        return self.cache.get(key)
+
+    async def set(self, key: str, value: str, ttl: float) -> None:
+        self.cache.set(key, value, ttl)
+
+    async def get_generation(self, key: str) -> int:
+        return self.generation
+
+    async def incr_generation(self, key: str) -> int:
+        # Older entries become unreachable; drop them at once to free memory
+        self.generation += 1
+        self.cache.clear()
+        return self.generation
+
+    async def close(self) -> None:
+        self.cache.clear()
+
+    def stats(self) -> Dict:
+        return self.cache.stats()
+
+
+class RedisCacheBackend:
+    """
+    Cache backend on a Redis client, shared by all workers
+
+    Args:
+        client: redis.asyncio.Redis or a compatible object (e.g. LocalRedis)
+    """
+
+    name = "redis"
+
+    def __init__(self, client):
+        self.client = client
+
+    @classmethod
+    def from_url(cls, url: str) -> "RedisCacheBackend":
+        """Connect to redis://... or use an in-process LocalRedis for local://"""
+        if url.startswith("local://"):
+            return cls(LocalRedis())
+        try:
+            import redis.asyncio as redis
+        except ImportError as error:
+            raise RuntimeError("Redis cache backend requires the redis package") from error
+        return cls(redis.from_url(url))
+
+    async def get(self, key: str) -> Optional[str]:
+        value = await self.client.get(key)
+        return value.decode() if isinstance(value, bytes) else value
+
+    async def set(self, key: str, value: str, ttl: float) -> None:
+        await self.client.set(key, value, ex=max(1, int(ttl)))
+
+    async def get_generation(self, key: str) -> int:
+        value = await self.client.get(key)
+        return int(value) if value is not None else 0
+
+    async def incr_generation(self, key: str) -> int:
+        return await self.client.incr(key)
+
+    async def close(self) -> None:
+        close = getattr(self.client, "aclose", None) or getattr(self.client, "close", None)
+        if close is not None:
+            await close()
+
+    def stats(self) -> Dict:
+        return {"client": type(self.client).__name__}
@@ -0,0 +1,138 @@
+"""
+Pagination utilities: opaque keyset cursors and list totals
+"""
+import base64
+import json
+from datetime import datetime
+from typing import Any, List, Optional, Sequence, Tuple
+
+from fastapi import HTTPException, status
+from sqlalchemy import func, select, text, tuple_
+from sqlalchemy.ext.asyncio import AsyncSession
+from sqlalchemy.sql import Select
+
+from app.core.config import settings
+from app.utils.cache import TTLCache
+
+# Ways to compute list totals
+TOTAL_EXACT = "exact"  # COUNT(*) on every request
+TOTAL_CACHED = "cached"  # COUNT(*) cached for PAGINATION_COUNT_CACHE_TTL_SECONDS
+TOTAL_APPROXIMATE = "approximate"  # Planner row estimate for unfiltered lists (PostgreSQL)
+TOTAL_NONE = "none"  # No total
+
+TOTAL_MODE_PATTERN = f"^({TOTAL_EXACT}|{TOTAL_CACHED}|{TOTAL_APPROXIMATE}|{TOTAL_NONE})$"
+
+count_cache = TTLCache(maxsize=1024, ttl=settings.PAGINATION_COUNT_CACHE_TTL_SECONDS)
+
+
+def encode_cursor(values: Sequence[Any]) -> str:
+    """Encode sort key values of the last row into an opaque cursor"""
+    raw = json.dumps([value.isoformat() if isinstance(value, datetime) else value for value in values])
+    return base64.urlsafe_b64encode(raw.encode()).decode().rstrip("=")
+
+
+def _cursor_value(column, value: Any) -> Any:
+    python_type = column.type.python_type
+    if python_type is datetime:
+        return datetime.fromisoformat(value)
+    # A tampered value of another type would reach the database (or the snapshot) as is
+    if isinstance(value, bool) or not isinstance(value, python_type):
+        raise ValueError
+    return value
+
+
+def decode_cursor(cursor: str, columns: Sequence) -> List[Any]:
+    """Decode cursor into sort key values typed after columns"""
+    try:
+        padded = cursor + "=" * (-len(cursor) % 4)
+        values = json.loads(base64.urlsafe_b64decode(padded.encode()))
+        if not isinstance(values, list) or len(values) != len(columns):
+            raise ValueError
+        return [_cursor_value(column, value) for column, value in zip(columns, values)]
+    except (ValueError, TypeError):
+        raise HTTPException(
+            status_code=status.HTTP_400_BAD_REQUEST,
+            detail="Неверный курсор пагинации"
+        )
+
+
+def paginate(
+    query: Select,
+    columns: Sequence,
+    skip: int,
+    limit: int,
+    after: Optional[str] = None,
+    descending: bool = False
+) -> Select:
+    """
+    Order query by columns and apply skip/limit or keyset cursor
+
+    One extra row is fetched to tell whether there is a next page.
+
+    Args:
+        query: Base query with filters
+        columns: Unique sort key, e.g. (Order.created_at, Order.id)
+        skip: Offset for skip/limit mode
+        limit: Page size
+        after: Cursor from previous page (skip is ignored)
+        descending: Sort direction
+    """
+    if after:
+        key = tuple_(*columns)
+        values = tuple_(*decode_cursor(after, columns))
+        query = query.where(key < values if descending else key > values)
+        skip = 0
+
+    order_by = [column.desc() for column in columns] if descending else list(columns)
+    return query.order_by(*order_by).offset(skip).limit(limit + 1)
+
+
+def split_page(rows: Sequence, columns: Sequence, limit: int) -> Tuple[List, Optional[str]]:
+    """Drop the extra row fetched by paginate and build the next cursor"""
+    rows = list(rows)
+    if limit <= 0:
+        return [], None
+    if len(rows) <= limit:
+        return rows, None
+
+    rows = rows[:limit]
+    last = rows[-1]
+    return rows, encode_cursor([getattr(last, column.key) for column in columns])
+
+
+async def count_total(db: AsyncSession, query: Select, mode: str = TOTAL_EXACT) -> Optional[int]:
+    """
+    Count rows of a filtered list query
+
+    Args:
+        db: Database session
+        query: List query before ordering and pagination
+        mode: exact, cached, approximate or none
+
+    Returns:
+        Total rows (estimated in approximate mode) or None
+    """
+    if mode == TOTAL_NONE:
+        return None
+
+    if mode == TOTAL_APPROXIMATE and query.whereclause is None and db.bind.dialect.name == "postgresql":
+        table = query.get_final_froms()[0]
+        estimate = await db.scalar(
+            text("SELECT reltuples::bigint FROM pg_class WHERE oid = to_regclass(:table)"),
+            {"table": table.name}
+        )
+        # -1 until the table has been analyzed
+        if estimate is not None and estimate >= 0:
+            return int(estimate)
+
+    count_query = select(func.count()).select_from(query.subquery())
+    if mode == TOTAL_EXACT:
+        return await db.scalar(count_query)
+
+    compiled = count_query.compile()
+    key = (str(compiled), tuple(sorted(compiled.params.items())))
+    total = count_cache.get(key)
+    if total is None:
+        total = await db.scalar(count_query)
+        count_cache.set(key, total)
+    return total
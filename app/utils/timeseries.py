@@ -0,0 +1,55 @@
+"""
+Time series utilities: grouping rows by day, week or month
+"""
+from datetime import date, datetime
+from typing import Optional, Union
+
+from sqlalchemy import BigInteger, Date, cast, func, literal
+
+# Time series periods
+GROUP_BY_DAY = "day"
+GROUP_BY_WEEK = "week"  # Weeks start on Monday
+GROUP_BY_MONTH = "month"
+
+GROUP_BY_PATTERN = f"^({GROUP_BY_DAY}|{GROUP_BY_WEEK}|{GROUP_BY_MONTH})$"
+
+
+def period_start(column, group_by: str, dialect: str):
+    """
+    SQL expression for the first day of the period containing column
+
+    Args:
+        column: Datetime column
+        group_by: day, week or month
+        dialect: SQLAlchemy dialect name
+
+    Returns:
+        Date expression usable in SELECT and GROUP BY
+    """
+    # Modifiers are rendered inline: with bound parameters PostgreSQL does not
+    # match the SELECT expression to the GROUP BY one
+    if dialect == "postgresql":
+        return cast(func.date_trunc(literal(group_by, literal_execute=True), column), Date)
+
+    # SQLite has no date_trunc
+    if group_by == GROUP_BY_WEEK:
+        return func.date(column, literal("weekday 0", literal_execute=True), literal("-6 days", literal_execute=True))
+    if group_by == GROUP_BY_MONTH:
+        return func.date(column, literal("start of month", literal_execute=True))
+    return func.date(column)
+
+
+def epoch_seconds(column, dialect: str):
+    """SQL expression for a datetime column as integer seconds since 1970 (UTC)"""
+    if dialect == "postgresql":
+        return cast(func.extract("epoch", column), BigInteger)
+    return cast(func.strftime(literal("%s", literal_execute=True), column), BigInteger)
+
+
+def format_period(value: Optional[Union[date, datetime, str]]) -> Optional[str]:
+    """Period start as YYYY-MM-DD regardless of the driver's return type"""
+    if value is None or isinstance(value, str):
+        return value
+    if isinstance(value, datetime):
+        value = value.date()
+    return value.isoformat()
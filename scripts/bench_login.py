@@ -0,0 +1,128 @@
+"""
+Login latency benchmark
+
+Sends concurrent POST /auth/login requests to the app in process and prints
+p50/p99 latency, 429 responses and the worst event loop stall. The inline
+mode runs bcrypt on the event loop thread, as login did before the hash pool.
+
+Usage:
+    python scripts/bench_login.py --database-url sqlite:///./bench_login.db --requests 200 --concurrency 50
+"""
+import argparse
+import asyncio
+import os
+import sys
+import time
+import uuid
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+PASSWORD = "bench-password"
+
+
+def parse_args():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--database-url", default=os.environ.get("DATABASE_URL"), help="Sync DATABASE_URL of a scratch database")
+    parser.add_argument("--requests", type=int, default=200, help="Logins per mode")
+    parser.add_argument("--concurrency", type=int, default=50, help="Concurrent logins")
+    parser.add_argument("--modes", default="inline,pool", help="Comma separated modes: inline, pool")
+    return parser.parse_args()
+
+
+def percentile(values, fraction):
+    if not values:
+        return 0.0
+    values = sorted(values)
+    return values[min(len(values) - 1, int(len(values) * fraction))]
+
+
+async def measure_loop_lag(stop: asyncio.Event, lags: list):
+    """Record how late a 10 ms timer fires while logins run"""
+    while not stop.is_set():
+        start = time.perf_counter()
+        await asyncio.sleep(0.01)
+        lags.append((time.perf_counter() - start) * 1000 - 10)
+
+
+async def run_mode(mode, args, client, phone):
+    from app.core import security
+
+    original_run = security.password_hash_pool.run
+    if mode == "inline":
+        async def run_inline(func, *func_args):
+            return func(*func_args)
+        security.password_hash_pool.run = run_inline
+
+    queue = asyncio.Queue()
+    for _ in range(args.requests):
+        queue.put_nowait(None)
+
+    latencies = []
+    statuses = {}
+
+    async def worker():
+        while not queue.empty():
+            queue.get_nowait()
+            start = time.perf_counter()
+            response = await client.post("/auth/login", json={"phone": phone, "password": PASSWORD})
+            latencies.append((time.perf_counter() - start) * 1000)
+            statuses[response.status_code] = statuses.get(response.status_code, 0) + 1
+
+    stop = asyncio.Event()
+    lags = []
+    lag_task = asyncio.create_task(measure_loop_lag(stop, lags))
+
+    started = time.perf_counter()
+    try:
+        await asyncio.gather(*(worker() for _ in range(args.concurrency)))
+    finally:
+        security.password_hash_pool.run = original_run
+    elapsed = time.perf_counter() - started
+
+    stop.set()
+    await lag_task
+
+    print(
+        f"{mode:>6}: {args.requests / elapsed:7.1f} req/s  "
+        f"p50={percentile(latencies, 0.5):.0f}ms p99={percentile(latencies, 0.99):.0f}ms  "
+        f"max loop stall={max(lags, default=0):.0f}ms  statuses={statuses}"
+    )
+
+
+async def main(args):
+    import httpx
+    from app.core.config import settings
+    from app.core.database import Base, engine, async_engine, AsyncSessionLocal
+    from app.core.security import get_password_hash, password_hash_pool
+    from app.main import app as application
+    from app.models.user import User
+
+    Base.metadata.create_all(engine)
+
+    phone = f"+7900{uuid.uuid4().int % 10 ** 7:07d}"
+    async with AsyncSessionLocal() as db:
+        db.add(User(phone=phone, password_hash=get_password_hash(PASSWORD)))
+        await db.commit()
+
+    print(
+        f"{args.requests} logins, concurrency {args.concurrency}, "
+        f"bcrypt rounds {settings.BCRYPT_ROUNDS}, hash workers {settings.PASSWORD_HASH_WORKERS}, "
+        f"queue {settings.PASSWORD_HASH_QUEUE_SIZE}"
+    )
+
+    transport = httpx.ASGITransport(app=application)
+    async with httpx.AsyncClient(transport=transport, base_url="http://bench/api/v1", timeout=None) as client:
+        for mode in args.modes.split(","):
+            await run_mode(mode.strip(), args, client, phone)
+
+    password_hash_pool.shutdown()
+    await async_engine.dispose()
+
+
+if __name__ == "__main__":
+    args = parse_args()
+    if args.database_url:
+        os.environ["DATABASE_URL"] = args.database_url
+    # Keep the slow query log quiet under load
+    os.environ.setdefault("SLOW_QUERY_THRESHOLD_MS", "1000")
+    asyncio.run(main(args))
@@ -0,0 +1,111 @@
+"""
+Test fixtures: a temporary SQLite database recreated for every test and an in-process API client
+"""
+import os
+import shutil
+import tempfile
+import uuid
+from contextlib import contextmanager
+
+# Settings are read on import, so the environment is set before app is imported;
+# too early for tmp_path_factory, the directory is removed by temporary_database
+DATABASE_DIR = tempfile.mkdtemp(prefix="dwc_tests_")
+DATABASE_PATH = os.path.join(DATABASE_DIR, "test.db")
+os.environ["DATABASE_URL"] = f"sqlite:///{DATABASE_PATH}"
+# Every request reads the user and the catalog from the database
+os.environ["AUTH_CACHE_TTL_SECONDS"] = "0"
+os.environ["CATALOG_SNAPSHOT_TTL_SECONDS"] = "0"
+os.environ["SLOW_QUERY_THRESHOLD_MS"] = "60000"
+
+import httpx
+import pytest
+from sqlalchemy import event
+
+from app.core.database import Base, engine, async_engine, AsyncSessionLocal
+from app.core.security import create_access_token
+from app.models.product import Product
+from app.models.user import User
+import app.models  # noqa: F401
+
+
+@pytest.fixture
+def anyio_backend():
+    return "asyncio"
+
+
+@pytest.fixture(scope="session", autouse=True)
+def temporary_database():
+    """Remove the database directory after the run"""
+    yield
+    engine.dispose()
+    shutil.rmtree(DATABASE_DIR, ignore_errors=True)
+
+
+@pytest.fixture(autouse=True)
+def database():
+    """Empty schema for every test"""
+    Base.metadata.drop_all(engine)
+    Base.metadata.create_all(engine)
+    yield
+    engine.dispose()
+
+
+@pytest.fixture
+async def db():
+    """Async session; the pool is disposed because aiosqlite connections belong to the test's event loop"""
+    async with AsyncSessionLocal() as session:
+        yield session
+    await async_engine.dispose()
+
+
+@pytest.fixture
+async def client():
+    """API client calling the app in process"""
+    from app.main import app as application
+
+    transport = httpx.ASGITransport(app=application)
+    async with httpx.AsyncClient(transport=transport, base_url="http://test/api/v1") as client:
+        yield client
+    await async_engine.dispose()
+
+
+@pytest.fixture
+def make_user(db):
+    """Create a user and return it with its Authorization header"""
+    async def make(is_admin: bool = False):
+        user = User(phone=f"+7900{uuid.uuid4().int % 10 ** 7:07d}", password_hash="x", is_admin=is_admin)
+        db.add(user)
+        await db.commit()
+        return user, {"Authorization": f"Bearer {create_access_token({'sub': str(user.id)})}"}
+    return make
+
+
+@pytest.fixture
+def make_product(db):
+    """Create a product; keyword arguments override the defaults"""
+    async def make(**fields):
+        values = {"name": "Test", "article": f"T-{uuid.uuid4().hex[:10]}", "price": 100.0, "sizes": ["Oki"], "stock_count": 10}
+        values.update(fields)
+        product = Product(**values)
+        db.add(product)
+        await db.commit()
+        return product
+    return make
+
+
+@pytest.fixture
+def count_queries():
+    """Context manager collecting the SQL statements sent through the async engine"""
+    @contextmanager
+    def count():
+        statements = []
+
+        def before_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+            statements.append(statement)
+
+        event.listen(async_engine.sync_engine, "before_cursor_execute", before_cursor_execute)
+        try:
+            yield statements
+        finally:
+            event.remove(async_engine.sync_engine, "before_cursor_execute", before_cursor_execute)
+    return count
@@ -0,0 +1,115 @@
+"""
+Analytics response cache on the Redis backend (LocalRedis via local://)
+"""
+import uuid
+
+import pytest
+
+from app.models.order import Order, PaymentStatus
+from app.services.analytics_cache import AnalyticsCache, analytics_cache
+from app.utils import cache
+from app.utils.cache import LocalRedis, RedisCacheBackend
+
+pytestmark = pytest.mark.anyio
+
+
+@pytest.fixture
+def clock(monkeypatch):
+    """Controllable time.monotonic of the cache module"""
+    now = [1000.0]
+    monkeypatch.setattr(cache.time, "monotonic", lambda: now[0])
+    return now
+
+
+async def test_local_redis_commands(clock):
+    redis = LocalRedis()
+
+    assert await redis.get("missing") is None
+    await redis.set("text", "value")
+    assert await redis.get("text") == b"value"
+
+    await redis.set("short", b"1", ex=10)
+    clock[0] += 9
+    assert await redis.get("short") == b"1"
+    clock[0] += 1
+    assert await redis.get("short") is None
+
+    assert await redis.incr("counter") == 1
+    assert await redis.incr("counter") == 2
+    assert await redis.get("counter") == b"2"
+
+    assert await redis.delete("text", "counter", "missing") == 2
+    assert await redis.get("text") is None
+
+
+async def test_local_redis_drops_expired_keys_when_full(clock):
+    redis = LocalRedis(maxsize=2)
+    await redis.set("old", "1", ex=1)
+    await redis.set("kept", "2")
+    clock[0] += 2
+
+    await redis.set("new", "3")
+    assert set(redis._data) == {"kept", "new"}
+
+
+async def test_cache_round_trip_and_invalidation():
+    analytics = AnalyticsCache(RedisCacheBackend.from_url("local://"), ttl=30)
+
+    key = await analytics.key("sales", None, None, "day")
+    assert await analytics.get(key) is None
+    await analytics.set(key, {"total_sales": 100.0})
+    cached = await analytics.get(key)
+    assert cached.body == b'{"total_sales": 100.0}'
+    assert (analytics.hits, analytics.misses) == (1, 1)
+
+    await analytics.invalidate()
+    new_key = await analytics.key("sales", None, None, "day")
+    assert new_key != key
+    assert await analytics.get(new_key) is None
+    assert analytics.stats()["store"] == {"client": "LocalRedis"}
+
+
+async def test_invalidation_reaches_every_worker():
+    # Two workers sharing one Redis
+    backend = RedisCacheBackend.from_url("local://")
+    first, second = AnalyticsCache(backend, ttl=30), AnalyticsCache(backend, ttl=30)
+
+    key = await first.key("customers")
+    await first.set(key, {"total_customers": 1})
+    assert await second.get(await second.key("customers")) is not None
+
+    await second.invalidate()
+    assert await first.get(await first.key("customers")) is None
+
+
+async def test_sales_endpoint_is_cached_until_an_order_changes(db, client, monkeypatch, make_user):
+    monkeypatch.setattr(analytics_cache, "backend", RedisCacheBackend.from_url("local://"))
+    monkeypatch.setattr(analytics_cache, "ttl", 30)
+    customer, _ = await make_user()
+    _, headers = await make_user(is_admin=True)
+
+    first = await client.get("/analytics/sales", headers=headers)
+    assert first.status_code == 200
+    assert first.json()["orders_count"] == 0
+
+    # Written behind the API's back: the cached response stays
+    order = Order(
+        user_id=customer.id,
+        order_number=f"AC-{uuid.uuid4().hex[:12]}",
+        total_amount=500,
+        final_amount=500,
+        payment_status=PaymentStatus.SUCCEEDED
+    )
+    db.add(order)
+    await db.commit()
+    hits = analytics_cache.hits
+    cached = await client.get("/analytics/sales", headers=headers)
+    assert cached.json() == first.json()
+    assert analytics_cache.hits == hits + 1
+
+    # Order changes through the API drop it
+    response = await client.put(f"/orders/{order.id}", headers=headers, json={"status": "processing"})
+    assert response.status_code == 200
+    fresh = await client.get("/analytics/sales", headers=headers)
+    assert fresh.json()["orders_count"] == 1
+    assert fresh.json()["total_sales"] == 500
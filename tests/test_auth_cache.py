@@ -0,0 +1,49 @@
+"""
+Cached user snapshots: changes written by another worker take effect on the next request
+"""
+import pytest
+
+from app.core import security
+
+pytestmark = pytest.mark.anyio
+
+
+@pytest.fixture
+def auth_cache(monkeypatch):
+    """Token and user caches on, emptied before and after the test"""
+    for cache in (security.token_cache, security.user_cache):
+        monkeypatch.setattr(cache, "ttl", 60)
+        cache.clear()
+    yield
+    security.token_cache.clear()
+    security.user_cache.clear()
+
+
+async def test_snapshot_is_reused_while_the_user_is_unchanged(client, auth_cache, make_user):
+    user, headers = await make_user()
+
+    assert (await client.get("/users/me", headers=headers)).status_code == 200
+    hits = security.user_cache.hits
+    assert (await client.get("/users/me", headers=headers)).json()["id"] == user.id
+    assert security.user_cache.hits == hits + 1
+
+
+async def test_deactivation_in_another_worker(db, client, auth_cache, make_user):
+    user, headers = await make_user()
+    assert (await client.get("/users/me", headers=headers)).status_code == 200
+
+    # Written without invalidate_user, as another worker's cache would see it
+    user.is_active = False
+    await db.commit()
+    response = await client.get("/users/me", headers=headers)
+    assert response.status_code == 403
+    assert response.json()["detail"] == "Аккаунт деактивирован"
+
+
+async def test_demoted_admin_loses_access_right_away(db, client, auth_cache, make_user):
+    admin, headers = await make_user(is_admin=True)
+    assert (await client.get("/users/", headers=headers)).status_code == 200
+
+    admin.is_admin = False
+    await db.commit()
+    assert (await client.get("/users/", headers=headers)).status_code == 403
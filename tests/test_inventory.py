@@ -0,0 +1,221 @@
+"""
+Stock reservation: atomic and ledger modes, preorder waves, payment confirmation
+"""
+import asyncio
+
+import pytest
+from fastapi import HTTPException
+from sqlalchemy import select, update
+
+from app.api.endpoints import orders, payment
+from app.core.database import AsyncSessionLocal
+from app.models.order import Order
+from app.models.product import Product, OrderType
+from app.schemas.order import OrderCreate
+from app.services.inventory import InventoryService, MODE_LOCK, MODE_ATOMIC, MODE_LEDGER
+
+pytestmark = pytest.mark.anyio
+
+
+@pytest.fixture
+def atomic_service(monkeypatch):
+    """Atomic mode service used by the order endpoints"""
+    service = InventoryService(mode=MODE_ATOMIC)
+    monkeypatch.setattr(orders, "inventory_service", service)
+    return service
+
+
+@pytest.fixture
+def ledger_service(monkeypatch):
+    """Ledger mode service used by the order and payment endpoints"""
+    service = InventoryService(mode=MODE_LEDGER, hold_ttl=60)
+    monkeypatch.setattr(orders, "inventory_service", service)
+    monkeypatch.setattr(payment, "inventory_service", service)
+    return service
+
+
+async def checkout(user, product_id: int, quantity: int = 1) -> Order:
+    """Create an order in its own session, like a separate request"""
+    order_data = OrderCreate(items=[{"product_id": product_id, "size": "Oki", "quantity": quantity}])
+    async with AsyncSessionLocal() as db:
+        return await orders.create_order(order_data, current_user=user, db=db)
+
+
+async def stock_count(product_id: int) -> int:
+    async with AsyncSessionLocal() as db:
+        return await db.scalar(select(Product.stock_count).where(Product.id == product_id))
+
+
+async def load_product(product_id: int) -> Product:
+    async with AsyncSessionLocal() as db:
+        return await db.get(Product, product_id)
+
+
+async def gather_checkouts(user, product_id: int, count: int, quantity: int = 1):
+    """Run concurrent checkouts and split them into placed orders and rejections"""
+    results = await asyncio.gather(
+        *(checkout(user, product_id, quantity) for _ in range(count)), return_exceptions=True
+    )
+    placed = [result for result in results if isinstance(result, Order)]
+    rejected = [result for result in results if isinstance(result, HTTPException)]
+    assert len(placed) + len(rejected) == count, results
+    assert all(error.status_code == 400 for error in rejected)
+    return placed, rejected
+
+
+async def test_atomic_concurrent_checkouts_stop_at_zero(db, atomic_service, make_user, make_product):
+    user, _ = await make_user()
+    product = await make_product(stock_count=5)
+
+    placed, rejected = await gather_checkouts(user, product.id, 20)
+    assert (len(placed), len(rejected)) == (5, 15)
+    assert await stock_count(product.id) == 0
+
+
+async def test_atomic_quantity_at_stock_boundary(db, atomic_service, make_user, make_product):
+    user, _ = await make_user()
+    product = await make_product(stock_count=7)
+
+    # Two units each: three fit, the fourth would leave -1
+    placed, rejected = await gather_checkouts(user, product.id, 8, quantity=2)
+    assert (len(placed), len(rejected)) == (3, 5)
+    assert await stock_count(product.id) == 1
+
+    with pytest.raises(HTTPException):
+        await checkout(user, product.id, 2)
+    await checkout(user, product.id, 1)
+    assert await stock_count(product.id) == 0
+
+
+@pytest.mark.parametrize("mode", [MODE_LOCK, MODE_ATOMIC])
+async def test_preorder_waves_roll_over_and_run_out(db, monkeypatch, make_user, make_product, mode):
+    monkeypatch.setattr(orders, "inventory_service", InventoryService(mode=mode))
+    user, _ = await make_user()
+    product = await make_product(
+        order_type=OrderType.PREORDER, stock_count=0, preorder_waves_total=2, preorder_wave_capacity=3
+    )
+
+    waves = []
+    for _ in range(6):
+        order = await checkout(user, product.id)
+        waves.append(order.items[0].preorder_wave)
+    assert waves == [1, 1, 1, 2, 2, 2]
+
+    # The last slot of the last wave closes preorders
+    product = await load_product(product.id)
+    assert product.order_type == OrderType.WAITING
+    assert (product.current_wave, product.current_wave_count) == (3, 0)
+    with pytest.raises(HTTPException) as error:
+        await checkout(user, product.id)
+    assert error.value.status_code == 400
+
+
+async def test_atomic_concurrent_preorders_fill_every_wave_once(db, atomic_service, make_user, make_product):
+    user, _ = await make_user()
+    product = await make_product(
+        order_type=OrderType.PREORDER, stock_count=0, preorder_waves_total=3, preorder_wave_capacity=4
+    )
+
+    placed, rejected = await gather_checkouts(user, product.id, 20)
+    assert (len(placed), len(rejected)) == (12, 8)
+    waves = sorted(order.items[0].preorder_wave for order in placed)
+    assert waves == [1] * 4 + [2] * 4 + [3] * 4
+    assert (await load_product(product.id)).order_type == OrderType.WAITING
+
+
+async def test_hold_then_release(db, ledger_service, make_user, make_product):
+    user, _ = await make_user()
+    product = await make_product(stock_count=5)
+
+    order = await checkout(user, product.id, 3)
+    assert ledger_service.ledger.available(product.id) == 2
+    with pytest.raises(HTTPException) as error:
+        await checkout(user, product.id, 3)
+    assert error.value.status_code == 400
+
+    ledger_service.release(order.order_number)
+    assert ledger_service.ledger.available(product.id) == 5
+    await checkout(user, product.id, 5)
+    assert ledger_service.ledger.available(product.id) == 0
+    # Holds never touch the products row
+    assert await stock_count(product.id) == 5
+
+
+async def test_hold_then_expire(db, ledger_service, make_user, make_product):
+    user, _ = await make_user()
+    product = await make_product(stock_count=5)
+    ledger_service.ledger.hold_ttl = 0
+
+    order = await checkout(user, product.id, 4)
+    assert ledger_service.ledger.available(product.id) == 1
+    assert ledger_service.ledger.expire() == 1
+    assert ledger_service.ledger.available(product.id) == 5
+    assert ledger_service.ledger.counters["expired"] == 1
+
+    # Nothing is left to release after expiry
+    assert not ledger_service.ledger.release(order.order_number)
+    assert ledger_service.ledger.available(product.id) == 5
+
+
+async def test_confirm_then_flush(db, ledger_service, make_user, make_product):
+    user, _ = await make_user()
+    product = await make_product(stock_count=5)
+
+    order = await checkout(user, product.id, 2)
+    await ledger_service.confirm(db, order)
+    assert ledger_service.ledger.snapshot()["products"][product.id]["pending"] == 2
+    assert await stock_count(product.id) == 5
+
+    assert await ledger_service.flush() == 1
+    assert await stock_count(product.id) == 3
+    line = ledger_service.ledger.snapshot()["products"][product.id]
+    assert (line["stock"], line["held"], line["pending"], line["available"]) == (3, 0, 0, 3)
+    # Nothing left to write
+    assert await ledger_service.flush() == 0
+
+
+@pytest.mark.parametrize("hold_expired", [False, True])
+async def test_double_confirm_takes_stock_once(
+    db, client, monkeypatch, ledger_service, make_user, make_product, hold_expired
+):
+    user, headers = await make_user()
+    product = await make_product(stock_count=5)
+    if hold_expired:
+        ledger_service.ledger.hold_ttl = 0
+    order = await checkout(user, product.id, 4)
+    await db.execute(update(Order).where(Order.id == order.id).values(payment_id="pay-1"))
+    await db.commit()
+    if hold_expired:
+        assert ledger_service.ledger.expire() == 1
+
+    paid = {"id": "pay-1", "status": "succeeded", "paid": True}
+    monkeypatch.setattr(payment.payment_service, "get_payment", lambda payment_id: paid)
+    monkeypatch.setattr(payment.payment_service, "process_webhook", lambda body: {**paid, "payment_id": "pay-1"})
+
+    # Status polls and the webhook for one payment arrive together
+    responses = await asyncio.gather(
+        client.get("/payment/status/pay-1", headers=headers),
+        client.get("/payment/status/pay-1", headers=headers),
+        client.post("/payment/webhook", json={}),
+    )
+    assert [response.status_code for response in responses] == [200, 200, 200]
+    assert responses[2].json() == {"status": "ok"}
+
+    await ledger_service.flush()
+    assert await stock_count(product.id) == 1
+    counters = ledger_service.ledger.counters
+    assert counters["confirmed"] + counters["confirmed_without_hold"] == 1
+
+
+async def test_concurrent_checkouts_do_not_oversell(db, ledger_service, make_user, make_product):
+    user, _ = await make_user()
+    product = await make_product(stock_count=5)
+
+    placed, rejected = await gather_checkouts(user, product.id, 20)
+    assert (len(placed), len(rejected)) == (5, 15)
+    assert ledger_service.ledger.available(product.id) == 0
+
+    for order in placed:
+        await ledger_service.confirm(db, order)
+    await ledger_service.flush()
+    assert await stock_count(product.id) == 0
@@ -0,0 +1,25 @@
+"""
+In-process metrics primitives
+"""
+from app.core.metrics import LatencyHistogram
+
+
+def test_latency_buckets_are_cumulative():
+    histogram = LatencyHistogram(buckets_ms=(1, 10, 100))
+    for value_ms in (0.5, 1, 5, 10, 50, 500, 1000):
+        histogram.observe(value_ms)
+
+    snapshot = histogram.snapshot()
+    assert snapshot["buckets"] == {"le_1ms": 2, "le_10ms": 4, "le_100ms": 5, "le_inf": 7}
+    assert snapshot["count"] == 7
+    assert snapshot["max_ms"] == 1000
+
+
+def test_reset():
+    histogram = LatencyHistogram(buckets_ms=(1, 10))
+    histogram.observe(5)
+    histogram.reset()
+
+    snapshot = histogram.snapshot()
+    assert snapshot["buckets"] == {"le_1ms": 0, "le_10ms": 0, "le_inf": 0}
+    assert (snapshot["count"], snapshot["sum_ms"], snapshot["avg_ms"]) == (0, 0, 0)
@@ -0,0 +1,184 @@
+"""
+Keyset cursors, skip/limit and list totals
+"""
+import base64
+import json
+import uuid
+from datetime import datetime
+
+import pytest
+from fastapi import HTTPException
+
+from app.models.order import Order
+from app.models.user import User
+from app.services.catalog import CatalogSnapshot
+from app.utils.pagination import count_cache, decode_cursor, encode_cursor, split_page
+
+pytestmark = pytest.mark.anyio
+
+ORDER_KEY = (Order.created_at, Order.id)
+
+CREATED_AT = datetime(2024, 3, 1, 12, 0, 0)
+
+
+def raw_cursor(values) -> str:
+    return base64.urlsafe_b64encode(json.dumps(values).encode()).decode().rstrip("=")
+
+
+@pytest.fixture
+async def orders_seeded(db, make_user):
+    """Seven orders sharing one created_at, plus one older; returns admin headers and ids newest first"""
+    customer, _ = await make_user()
+    _, admin_headers = await make_user(is_admin=True)
+    orders = [
+        Order(
+            user_id=customer.id,
+            order_number=f"PG-{uuid.uuid4().hex[:12]}",
+            total_amount=100,
+            final_amount=100,
+            created_at=CREATED_AT if index < 7 else datetime(2024, 2, 1)
+        )
+        for index in range(8)
+    ]
+    db.add_all(orders)
+    await db.commit()
+    # created_at descending, then id descending within the tie
+    ids = sorted((order.id for order in orders[:7]), reverse=True) + [orders[7].id]
+    return admin_headers, ids
+
+
+def test_cursor_round_trip():
+    cursor = encode_cursor([CREATED_AT, 42])
+    assert decode_cursor(cursor, ORDER_KEY) == [CREATED_AT, 42]
+
+
+@pytest.mark.parametrize("cursor", [
+    "not a cursor",
+    "%%%",
+    base64.urlsafe_b64encode(b"\xff\xfe").decode(),
+    raw_cursor({"created_at": "2024-03-01T12:00:00", "id": 1}),
+    raw_cursor(["2024-03-01T12:00:00"]),
+    raw_cursor(["2024-03-01T12:00:00", 1, 2]),
+    raw_cursor(["yesterday", 1]),
+    raw_cursor([None, 1]),
+    raw_cursor(["2024-03-01T12:00:00", "1"]),
+    raw_cursor(["2024-03-01T12:00:00", None]),
+    raw_cursor(["2024-03-01T12:00:00", True]),
+    raw_cursor(["2024-03-01T12:00:00", [1]]),
+    raw_cursor(["2024-03-01T12:00:00", 1.5]),
+])
+def test_invalid_cursor_is_rejected(cursor):
+    with pytest.raises(HTTPException) as error:
+        decode_cursor(cursor, ORDER_KEY)
+    assert error.value.status_code == 400
+
+
+def test_split_page():
+    rows = [User(id=index) for index in range(1, 6)]
+    page, cursor = split_page(rows, (User.id,), 4)
+    assert [row.id for row in page] == [1, 2, 3, 4]
+    assert decode_cursor(cursor, (User.id,)) == [4]
+
+    # Exactly limit rows: nothing after them
+    assert split_page(rows[:4], (User.id,), 4) == (rows[:4], None)
+    assert split_page([], (User.id,), 4) == ([], None)
+    assert split_page(rows[:1], (User.id,), 0) == ([], None)
+
+
+async def test_cursor_pages_through_created_at_ties(client, orders_seeded):
+    headers, ids = orders_seeded
+
+    seen = []
+    cursors = []
+    after = None
+    while True:
+        params = {"limit": 3, **({"after": after} if after else {})}
+        response = await client.get("/orders/admin/all", headers=headers, params=params)
+        assert response.status_code == 200
+        page = response.json()
+        seen += [order["id"] for order in page["orders"]]
+        after = page["next_cursor"]
+        cursors.append(after)
+        if after is None:
+            break
+
+    assert seen == ids
+    # 8 rows in pages of 3: only the last page has no cursor
+    assert len(cursors) == 3 and all(cursors[:-1])
+
+
+async def test_last_full_page_has_no_cursor(client, orders_seeded):
+    headers, ids = orders_seeded
+
+    response = await client.get("/orders/admin/all", headers=headers, params={"limit": 8})
+    page = response.json()
+    assert [order["id"] for order in page["orders"]] == ids
+    assert page["next_cursor"] is None
+
+
+async def test_skip_is_ignored_with_cursor(client, orders_seeded):
+    headers, ids = orders_seeded
+
+    first = (await client.get("/orders/admin/all", headers=headers, params={"limit": 3})).json()
+    after = first["next_cursor"]
+    plain = await client.get("/orders/admin/all", headers=headers, params={"limit": 3, "after": after})
+    skipped = await client.get("/orders/admin/all", headers=headers, params={"limit": 3, "after": after, "skip": 2})
+    assert plain.json()["orders"] == skipped.json()["orders"]
+    assert [order["id"] for order in skipped.json()["orders"]] == ids[3:6]
+
+    # Without a cursor skip is an offset
+    offset = (await client.get("/orders/admin/all", headers=headers, params={"limit": 3, "skip": 2})).json()
+    assert [order["id"] for order in offset["orders"]] == ids[2:5]
+
+
+@pytest.mark.parametrize("path", ["/orders/admin/all", "/products/", "/users/", "/promo-codes/"])
+@pytest.mark.parametrize("cursor", ["garbage!", raw_cursor(["2024-03-01T12:00:00", {"id": 1}]), raw_cursor(["x"])])
+async def test_tampered_cursor_is_bad_request(client, make_user, path, cursor):
+    _, headers = await make_user(is_admin=True)
+    response = await client.get(path, headers=headers, params={"after": cursor})
+    assert response.status_code == 400
+    assert response.json()["detail"] == "Неверный курсор пагинации"
+
+
+@pytest.mark.parametrize("path", ["/users/", "/promo-codes/"])
+@pytest.mark.parametrize("params", [{"limit": 0}, {"limit": -1}, {"skip": -1}])
+async def test_out_of_range_paging_is_rejected(client, make_user, path, params):
+    _, headers = await make_user(is_admin=True)
+    response = await client.get(path, headers=headers, params=params)
+    assert response.status_code == 422
+
+
+async def test_tampered_cursor_on_catalog_snapshot(db, make_product):
+    await make_product()
+    snapshot = CatalogSnapshot(ttl=60)
+    with pytest.raises(HTTPException) as error:
+        await snapshot.page(0, 10, None, None, raw_cursor(["1"]), "exact")
+    assert error.value.status_code == 400
+
+
+async def test_total_modes(db, client, orders_seeded, make_user):
+    headers, ids = orders_seeded
+    count_cache.clear()
+
+    async def total(mode: str):
+        response = await client.get("/orders/admin/all", headers=headers, params={"limit": 2, "total_mode": mode})
+        assert response.status_code == 200
+        return response.json()["total"]
+
+    assert await total("exact") == 8
+    assert await total("none") is None
+    # No planner estimate outside PostgreSQL: counted exactly
+    assert await total("approximate") == 8
+    assert await total("cached") == 8
+
+    customer_id = (await db.get(Order, ids[0])).user_id
+    db.add(Order(user_id=customer_id, order_number=f"PG-{uuid.uuid4().hex[:12]}", total_amount=1, final_amount=1))
+    await db.commit()
+
+    assert await total("cached") == 8
+    assert await total("exact") == 9
+    count_cache.clear()
+    assert await total("cached") == 9
+
+    response = await client.get("/orders/admin/all", headers=headers, params={"total_mode": "estimate"})
+    assert response.status_code == 422
@@ -0,0 +1,90 @@
+"""
+Payment endpoints around the blocking YooKassa client
+"""
+import asyncio
+import time
+import uuid
+
+import pytest
+
+from app.api.endpoints import payment
+from app.models.order import Order, OrderStatus, PaymentStatus
+
+pytestmark = pytest.mark.anyio
+
+# How long the fake YooKassa call blocks its thread
+YOOKASSA_DELAY = 0.3
+
+
+@pytest.fixture
+def slow_yookassa(monkeypatch):
+    """Payment service whose calls block like the real HTTP client"""
+    def get_payment(payment_id):
+        time.sleep(YOOKASSA_DELAY)
+        return {"id": payment_id, "status": "pending", "paid": False}
+
+    def cancel_payment(payment_id):
+        time.sleep(YOOKASSA_DELAY)
+        return True
+
+    def create_payment(order):
+        time.sleep(YOOKASSA_DELAY)
+        return {"payment_id": "pay-slow", "confirmation_url": "https://yookassa.example/confirm"}
+
+    monkeypatch.setattr(payment.payment_service, "get_payment", get_payment)
+    monkeypatch.setattr(payment.payment_service, "cancel_payment", cancel_payment)
+    monkeypatch.setattr(payment.payment_service, "create_payment", create_payment)
+
+
+async def ticks_during(request) -> int:
+    """Count 10 ms event loop ticks while the request runs"""
+    done = asyncio.Event()
+    ticks = 0
+
+    async def tick():
+        nonlocal ticks
+        while not done.is_set():
+            await asyncio.sleep(0.01)
+            ticks += 1
+
+    ticker = asyncio.create_task(tick())
+    try:
+        response = await request
+    finally:
+        done.set()
+        await ticker
+    assert response.status_code == 200, response.text
+    return ticks
+
+
+@pytest.fixture
+async def order(db, make_user):
+    user, headers = await make_user()
+    order = Order(
+        user_id=user.id,
+        order_number=f"PAY-{uuid.uuid4().hex[:12]}",
+        total_amount=100,
+        final_amount=100,
+        payment_id="pay-slow"
+    )
+    db.add(order)
+    await db.commit()
+    return order, headers
+
+
+async def test_yookassa_calls_do_not_block_the_event_loop(client, slow_yookassa, order):
+    order, headers = order
+
+    # A blocked loop would not tick at all while the call sleeps
+    assert await ticks_during(client.post(f"/payment/create/{order.id}", headers=headers)) >= 10
+    assert await ticks_during(client.get("/payment/status/pay-slow", headers=headers)) >= 10
+    assert await ticks_during(client.post("/payment/cancel/pay-slow", headers=headers)) >= 10
+
+
+async def test_cancel_updates_order(db, client, slow_yookassa, order):
+    order, headers = order
+
+    response = await client.post("/payment/cancel/pay-slow", headers=headers)
+    assert response.json() == {"status": "cancelled"}
+    await db.refresh(order)
+    assert (order.payment_status, order.status) == (PaymentStatus.CANCELLED, OrderStatus.CANCELLED)
@@ -0,0 +1,72 @@
+"""
+Query budgets of list and export endpoints
+
+Every request is counted twice, before and after more rows are added:
+going over the budget or growing with the row count (an N+1 query) fails.
+"""
+import uuid
+
+import pytest
+
+from app.models.order import Order, OrderItem
+from app.models.product import Product, ProductMedia
+from app.models.promo_code import PromoCode
+from app.models.user import User
+
+pytestmark = pytest.mark.anyio
+
+# Statements per request, including the users SELECT made by authentication
+BUDGETS = {
+    "/products/?limit=100": 3,
+    "/orders/?limit=100": 4,
+    "/orders/admin/all?limit=100": 4,
+    "/users/?limit=1000": 2,
+    "/promo-codes/?limit=1000": 2,
+    "/analytics/export/customers": 2,
+    "/analytics/export/orders": 2,
+    "/analytics/export/orders?items=true": 2,
+}
+
+
+async def seed(db, customer_id: int, rows: int) -> None:
+    """Add products with media, orders of the customer, a promo code and a user"""
+    products = []
+    for _ in range(rows):
+        product = Product(name="Check", article=f"CHK-{uuid.uuid4().hex[:10]}", price=100, sizes=["Oki"], stock_count=10)
+        product.media = [ProductMedia(url="https://example.com/1.jpg"), ProductMedia(url="https://example.com/2.jpg")]
+        products.append(product)
+    db.add_all(products)
+    db.add(PromoCode(code=f"CHK{uuid.uuid4().hex[:8]}", discount_percent=5))
+    db.add(User(phone=f"+7912{uuid.uuid4().int % 10 ** 7:07d}", password_hash="x"))
+    await db.flush()
+
+    for product in products:
+        db.add(Order(
+            user_id=customer_id,
+            order_number=f"CHK-{uuid.uuid4().hex[:12]}",
+            total_amount=200,
+            final_amount=200,
+            items=[
+                OrderItem(product_id=product.id, size="Oki", quantity=1, price=100),
+                OrderItem(product_id=product.id, size="Oki", quantity=1, price=100),
+            ]
+        ))
+    await db.commit()
+
+
+@pytest.mark.parametrize("path", list(BUDGETS))
+async def test_query_budget(db, client, count_queries, make_user, path):
+    _, admin_headers = await make_user(is_admin=True)
+    customer, customer_headers = await make_user()
+    headers = customer_headers if path.startswith("/orders/?") else admin_headers
+
+    counts = []
+    for rows in (5, 20):
+        await seed(db, customer.id, rows)
+        with count_queries() as statements:
+            response = await client.get(path, headers=headers)
+        assert response.status_code == 200, response.text
+        counts.append(len(statements))
+
+    assert counts[1] <= BUDGETS[path], statements
+    assert counts[0] == counts[1], statements
@@ -0,0 +1,117 @@
+"""
+Read replica routing: round-robin, failover, fallback to the primary and read-your-writes
+"""
+import os
+import tempfile
+
+import httpx
+import pytest
+from sqlalchemy import text
+
+from app.core import database
+from app.core.config import settings
+from app.core.database import create_instrumented_async_engine, open_read_session
+from app.core.replicas import PRIMARY_COOKIE, PrimaryStickinessMiddleware, ReplicaSet
+
+pytestmark = pytest.mark.anyio
+
+# The test database itself serves as a reachable replica
+UP = settings.DATABASE_URL
+DOWN = f"sqlite:///{os.path.join(tempfile.gettempdir(), 'dwc_missing_dir', 'replica.db')}"
+
+
+@pytest.fixture
+async def make_replicas():
+    """Create a ReplicaSet and dispose its engines after the test"""
+    created = []
+
+    def make(urls, retry_seconds: float = 30.0) -> ReplicaSet:
+        replicas = ReplicaSet(urls, create_instrumented_async_engine, retry_seconds=retry_seconds)
+        created.append(replicas)
+        return replicas
+
+    yield make
+    for replicas in created:
+        await replicas.dispose()
+
+
+async def read_one(replicas: ReplicaSet):
+    db = await replicas.session()
+    if db is None:
+        return None
+    async with db:
+        assert await db.scalar(text("SELECT 1")) == 1
+        return db.info["replica"]
+
+
+async def test_round_robin(make_replicas):
+    replicas = make_replicas([UP, UP])
+
+    used = [await read_one(replicas) for _ in range(4)]
+    assert used == replicas.replicas * 2
+    assert [replica.sessions for replica in replicas.replicas] == [2, 2]
+
+
+async def test_unreachable_replica_is_skipped_until_retry(make_replicas):
+    replicas = make_replicas([DOWN, UP], retry_seconds=30)
+    down, up = replicas.replicas
+
+    for _ in range(3):
+        assert await read_one(replicas) is up
+    assert not down.healthy
+    assert down.failures == 1
+    assert "OperationalError" in down.last_error
+
+    # Past the retry interval the replica is tried again when its turn comes
+    down.failed_at -= 30
+    for _ in range(2):
+        assert await read_one(replicas) is up
+    assert down.failures == 2
+
+
+async def test_all_replicas_down_falls_back_to_primary(db, monkeypatch, make_replicas):
+    replicas = make_replicas([DOWN], retry_seconds=0)
+    assert await replicas.session() is None
+    assert replicas.fallbacks == 1
+
+    monkeypatch.setattr(database, "replica_set", replicas)
+    async with await open_read_session() as session:
+        assert session.bind is database.async_engine
+        assert "replica" not in session.info
+    assert replicas.fallbacks == 2
+
+    async with await open_read_session(primary=True) as session:
+        assert session.bind is database.async_engine
+    assert replicas.primary_reads == 1
+
+
+async def test_client_reads_its_writes_from_primary(db, monkeypatch, make_replicas, make_user, make_product):
+    from app.main import app as application
+
+    replicas = make_replicas([UP])
+    monkeypatch.setattr(database, "replica_set", replicas)
+    replica = replicas.replicas[0]
+    _, headers = await make_user()
+    product = await make_product()
+
+    transport = httpx.ASGITransport(app=PrimaryStickinessMiddleware(application, sticky_seconds=10))
+    async with httpx.AsyncClient(transport=transport, base_url="http://test/api/v1") as client:
+        assert (await client.get("/pages/")).status_code == 200
+        assert (replica.sessions, replicas.primary_reads) == (1, 0)
+
+        # Failed writes do not make the client sticky
+        response = await client.post("/orders/", headers=headers, json={"items": [{"product_id": 0, "size": "Oki", "quantity": 1}]})
+        assert response.status_code == 404
+        assert PRIMARY_COOKIE not in client.cookies
+
+        response = await client.post("/orders/", headers=headers, json={"items": [{"product_id": product.id, "size": "Oki", "quantity": 1}]})
+        assert response.status_code == 201
+        assert PRIMARY_COOKIE in client.cookies
+
+        assert (await client.get("/pages/")).status_code == 200
+        assert (replica.sessions, replicas.primary_reads) == (1, 1)
+
+        client.cookies.clear()
+        assert (await client.get("/pages/")).status_code == 200
+        assert (replica.sessions, replicas.primary_reads) == (2, 1)
+    await database.async_engine.dispose()
@@ -0,0 +1,92 @@
+"""
+Daily analytics rollups: preorder waves, including items without a wave
+"""
+import uuid
+from datetime import datetime, timedelta
+
+import pytest
+from sqlalchemy import select
+from sqlalchemy.exc import IntegrityError
+
+from app.api.endpoints import analytics
+from app.models.analytics import DailyPreorderStats, NO_WAVE
+from app.models.order import Order, OrderItem
+from app.services.analytics_cache import analytics_cache
+from app.services.rollups import RollupService
+
+pytestmark = pytest.mark.anyio
+
+ORDER_TIME = (datetime.utcnow() - timedelta(days=3)).replace(hour=12, minute=0, second=0, microsecond=0)
+
+
+@pytest.fixture
+def rollups(monkeypatch):
+    """Fresh rollup service used by the analytics endpoints, responses not cached"""
+    service = RollupService()
+    monkeypatch.setattr(analytics, "rollup_service", service)
+    monkeypatch.setattr(analytics_cache, "ttl", 0)
+    return service
+
+
+@pytest.fixture
+async def preorders(db, make_user, make_product):
+    """Three days ago: two preorder items without a wave, one in wave 1 and a regular item"""
+    customer, _ = await make_user()
+    product = await make_product()
+    items = [
+        OrderItem(product_id=product.id, size="Oki", quantity=1, price=100, is_preorder=True),
+        OrderItem(product_id=product.id, size="Oki", quantity=1, price=100, is_preorder=True),
+        OrderItem(product_id=product.id, size="Oki", quantity=1, price=100, is_preorder=True, preorder_wave=1),
+        OrderItem(product_id=product.id, size="Oki", quantity=1, price=100),
+    ]
+    db.add(Order(
+        user_id=customer.id,
+        order_number=f"RU-{uuid.uuid4().hex[:12]}",
+        total_amount=400,
+        final_amount=400,
+        created_at=ORDER_TIME,
+        updated_at=ORDER_TIME,
+        items=items
+    ))
+    await db.commit()
+
+
+async def wave_rows(db) -> list:
+    result = await db.execute(
+        select(DailyPreorderStats.day, DailyPreorderStats.wave, DailyPreorderStats.preorders)
+        .order_by(DailyPreorderStats.wave)
+    )
+    return [tuple(row) for row in result.all()]
+
+
+async def test_items_without_wave_get_one_row_per_day(db, rollups, preorders):
+    day = ORDER_TIME.date()
+
+    await rollups.refresh()
+    assert await wave_rows(db) == [(day, NO_WAVE, 2), (day, 1, 1)]
+
+    # A second full refresh rewrites the same rows instead of adding more
+    rollups.watermark = None
+    await rollups.refresh()
+    assert await wave_rows(db) == [(day, NO_WAVE, 2), (day, 1, 1)]
+
+    db.add(DailyPreorderStats(day=day, wave=NO_WAVE, preorders=5))
+    with pytest.raises(IntegrityError):
+        await db.commit()
+    await db.rollback()
+
+
+async def test_preorders_by_wave_match_raw_rows(client, rollups, preorders, make_user):
+    _, headers = await make_user(is_admin=True)
+    params = {"start_date": (ORDER_TIME - timedelta(days=1)).isoformat()}
+
+    raw = (await client.get("/analytics/preorders", headers=headers, params=params)).json()
+    await rollups.refresh()
+    assert rollups.split(ORDER_TIME - timedelta(days=1), None)[0] is not None
+    rolled_up = (await client.get("/analytics/preorders", headers=headers, params=params)).json()
+
+    expected = {None: 2, 1: 1}
+    assert {wave["wave"]: wave["count"] for wave in raw["preorders_by_wave"]} == expected
+    assert {wave["wave"]: wave["count"] for wave in rolled_up["preorders_by_wave"]} == expected
+    assert len(rolled_up["preorders_by_wave"]) == 2
+    assert raw["total_preorders"] == rolled_up["total_preorders"] == 3
@@ -0,0 +1,112 @@
+"""
+Product search on the in-memory index used outside PostgreSQL
+"""
+import pytest
+
+from app.api.endpoints import products
+from app.models.product import OrderType
+from app.services.search import ProductSearchService, tokenize
+
+pytestmark = pytest.mark.anyio
+
+
+@pytest.fixture
+def search_service(monkeypatch):
+    """Fresh index for the search endpoint; product ids repeat between tests"""
+    service = ProductSearchService(index_ttl=60)
+    monkeypatch.setattr(products, "product_search_service", service)
+    return service
+
+
+@pytest.fixture
+async def catalog(make_product):
+    hoodie = await make_product(
+        name="Худи оверсайз", description="Черное худи из хлопка", article="HD-100", price=5000.0, sizes=["Oki", "Big"]
+    )
+    basic = await make_product(name="Худи базовое", article="HD-1001", price=3000.0, sizes=["Oki"])
+    tee = await make_product(
+        name="Футболка", description="Хлопок", article="TS-200", price=1500.0, sizes=["Big"],
+        order_type=OrderType.PREORDER
+    )
+    await make_product(name="Худи снятое", article="HD-OLD", is_active=False)
+    await make_product(name="Худи архивное", article="HD-ARC", is_archived=True)
+    return hoodie, basic, tee
+
+
+async def search(client, **params) -> dict:
+    response = await client.get("/products/search", params=params)
+    assert response.status_code == 200, response.text
+    return response.json()
+
+
+def ids(found: dict) -> list:
+    return [product["id"] for product in found["products"]]
+
+
+def test_tokenize():
+    assert tokenize("Худи-оверсайз, size_XL 2024!") == ["худи", "оверсайз", "size", "xl", "2024"]
+    assert tokenize(None) == []
+
+
+async def test_words_match_as_prefixes(client, search_service, catalog):
+    hoodie, basic, tee = catalog
+
+    # Inactive and archived products are never found
+    assert sorted(ids(await search(client, q="худ"))) == [hoodie.id, basic.id]
+    assert ids(await search(client, q="худи черн")) == [hoodie.id]
+    assert sorted(ids(await search(client, q="хлоп"))) == [hoodie.id, tee.id]
+    assert ids(await search(client, q="джинсы")) == []
+
+
+async def test_article_substring_and_exact_boost(client, search_service, catalog):
+    hoodie, basic, _ = catalog
+
+    # Exact article first, then the one it is a prefix of
+    assert ids(await search(client, q="hd-100")) == [hoodie.id, basic.id]
+    assert ids(await search(client, q="HD-1001")) == [basic.id]
+    assert ids(await search(client, q="1001")) == [basic.id]
+
+
+async def test_filters_and_disjunctive_facets(client, search_service, catalog):
+    hoodie, basic, tee = catalog
+
+    found = await search(client, sizes=["Big"])
+    assert sorted(ids(found)) == [hoodie.id, tee.id]
+    assert found["total"] == 2
+    # The sizes facet ignores the sizes filter, the others apply it
+    assert found["facets"]["sizes"] == {"Big": 2, "Oki": 2}
+    assert found["facets"]["order_types"] == {"order": 1, "preorder": 1}
+    assert (found["facets"]["price_min"], found["facets"]["price_max"]) == (1500.0, 5000.0)
+
+    found = await search(client, min_price=2000, max_price=4000, order_type="order")
+    assert ids(found) == [basic.id]
+    # The order type facet ignores order_type: the preorder is out by price
+    assert found["facets"]["order_types"] == {"order": 1}
+    assert (found["facets"]["price_min"], found["facets"]["price_max"]) == (3000.0, 5000.0)
+
+
+async def test_paging(client, search_service, catalog):
+    first = await search(client, q="худи", limit=1)
+    second = await search(client, q="худи", limit=1, skip=1)
+    assert first["total"] == second["total"] == 2
+    assert len(first["products"]) == len(second["products"]) == 1
+    assert ids(first) != ids(second)
+    assert second["page"] == 2
+
+
+async def test_changed_products_are_reindexed_without_rebuild(client, search_service, catalog, make_user):
+    hoodie, basic, _ = catalog
+    _, headers = await make_user(is_admin=True)
+
+    assert sorted(ids(await search(client, q="худи"))) == [hoodie.id, basic.id]
+    assert search_service.index.builds == 1
+
+    response = await client.put(f"/products/{basic.id}", headers=headers, json={"name": "Свитшот базовый"})
+    assert response.status_code == 200
+    response = await client.put(f"/products/{hoodie.id}", headers=headers, json={"is_active": False})
+    assert response.status_code == 200
+
+    assert ids(await search(client, q="худи")) == []
+    assert ids(await search(client, q="свитш")) == [basic.id]
+    stats = search_service.index.stats()
+    assert (stats["builds"], stats["product_loads"], stats["products"]) == (1, 2, 2)
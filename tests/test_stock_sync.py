@@ -0,0 +1,102 @@
+"""
+Batch stock and price sync: counts, delta clamping and the products it reports as changed
+"""
+import pytest
+from sqlalchemy import select
+
+from app.api.endpoints import products
+from app.models.product import Product
+
+pytestmark = pytest.mark.anyio
+
+
+@pytest.fixture
+def invalidated(monkeypatch):
+    """Product ids the endpoint drops from the catalog snapshot"""
+    dropped = []
+    monkeypatch.setattr(products.catalog_snapshot, "invalidate", lambda product_ids: dropped.extend(product_ids))
+    return dropped
+
+
+async def sync(client, headers, items, mode: str = "absolute") -> dict:
+    response = await client.patch("/products/stock", headers=headers, json={"mode": mode, "items": items})
+    assert response.status_code == 200, response.text
+    return response.json()
+
+
+async def stock(db, *items) -> list:
+    result = await db.execute(
+        select(Product.stock_count, Product.price)
+        .where(Product.id.in_([item.id for item in items]))
+        .order_by(Product.id)
+        .execution_options(populate_existing=True)
+    )
+    return [tuple(row) for row in result.all()]
+
+
+async def test_absolute_counts_only_changed_products(db, client, make_user, make_product, invalidated):
+    _, headers = await make_user(is_admin=True)
+    same = await make_product(stock_count=5, price=100.0)
+    restocked = await make_product(stock_count=5, price=100.0)
+    repriced = await make_product(stock_count=5, price=100.0)
+
+    result = await sync(client, headers, [
+        {"id": same.id, "stock_count": 5, "price": 100.0},
+        {"article": restocked.article, "stock_count": 8},
+        {"id": repriced.id, "price": 150.0},
+        {"id": 0, "stock_count": 1},
+        {"article": "NO-SUCH", "price": 10.0},
+    ])
+    assert {key: result[key] for key in ("changed", "unchanged", "unknown", "clamped")} == {
+        "changed": 2, "unchanged": 1, "unknown": 2, "clamped": 0
+    }
+    assert result["unknown_items"] == ["0", "NO-SUCH"]
+    assert await stock(db, same, restocked, repriced) == [(5, 100.0), (8, 100.0), (5, 150.0)]
+
+    # Only the products that changed leave the snapshot
+    assert sorted(invalidated) == [restocked.id, repriced.id]
+
+    result = await sync(client, headers, [{"id": restocked.id, "stock_count": 8}])
+    assert (result["changed"], result["unchanged"]) == (0, 1)
+    assert sorted(invalidated) == [restocked.id, repriced.id]
+
+
+async def test_delta_sums_repeats_and_reports_clamped_stock(db, client, make_user, make_product, invalidated):
+    _, headers = await make_user(is_admin=True)
+    repeated = await make_product(stock_count=10)
+    short = await make_product(stock_count=2)
+    empty = await make_product(stock_count=0)
+    zeroed = await make_product(stock_count=3)
+
+    result = await sync(client, headers, [
+        {"id": repeated.id, "stock_count": -3},
+        {"article": repeated.article, "stock_count": -4},
+        {"id": short.id, "stock_count": -5},
+        {"id": empty.id, "stock_count": -1},
+        {"id": zeroed.id, "stock_count": -3},
+    ], mode="delta")
+
+    assert await stock(db, repeated, short, empty, zeroed) == [(3, 100.0), (0, 100.0), (0, 100.0), (0, 100.0)]
+    # An exact zero is not a clamp; an empty product asked for less still is
+    assert (result["clamped"], sorted(result["clamped_ids"])) == (2, sorted([short.id, empty.id]))
+    assert (result["changed"], result["unchanged"]) == (3, 1)
+    assert sorted(invalidated) == sorted([repeated.id, short.id, zeroed.id])
+
+
+async def test_rejects_negative_absolute_stock(client, make_user, make_product):
+    _, headers = await make_user(is_admin=True)
+    product = await make_product()
+
+    response = await client.patch("/products/stock", headers=headers, json={"items": [{"id": product.id, "stock_count": -1}]})
+    assert response.status_code == 422
+
+
+async def test_products_are_locked_in_id_order(client, make_user, make_product, count_queries):
+    _, headers = await make_user(is_admin=True)
+    first = await make_product()
+    second = await make_product()
+
+    with count_queries() as statements:
+        await sync(client, headers, [{"id": second.id, "stock_count": 1}, {"article": first.article, "stock_count": 1}])
+    # Same lock order as checkout (inventory load_products)
+    assert any("FROM products" in statement and "ORDER BY products.id" in statement for statement in statements)